@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+"""
+Kathryn Egan
+
+Measures how fast the parser parses a corpus generated from the grammar and
+lexicon, e.g.
+
+    python bin/benchmark.py --count 500 --seed 1 --max-length 12
+
+Every generated sentence can be parsed, so any sentence the parser fails
+on is reported as a regression, as is importing the parser in a fresh
+interpreter taking longer than the target. The memory of the first few
+sentences is then profiled separately, since tracing allocations slows
+parsing down. The benchmark exits with status 1 if any check failed.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+# the repository, so the benchmark runs on this checkout from anywhere
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from chartparser.language import Grammar, Lexicon  # noqa: E402
+from chartparser.parser import Parser  # noqa: E402
+from chartparser.generate import Generator  # noqa: E402
+from chartparser.profiling import MemoryProfile  # noqa: E402
+
+DATA = os.path.join(ROOT, 'chartparser', 'data')
+
+# times the import of the parser in a fresh interpreter
+IMPORT = (
+    'import time; start = time.perf_counter(); import chartparser; '
+    'chartparser.Parser; print(time.perf_counter() - start)')
+
+
+def import_time(runs=5):
+    """ Returns the least time taken to import the parser over given
+    number of fresh interpreters.
+    Args:
+        runs (int) : number of interpreters to start
+    Returns:
+        float : seconds to import
+    """
+    times = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', IMPORT], check=True, cwd=ROOT,
+            capture_output=True, text=True).stdout
+        times.append(float(output))
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--grammar', default=os.path.join(DATA, 'sample_grammar.txt'))
+    parser.add_argument(
+        '--lexicon', default=os.path.join(DATA, 'sample_lexicon.txt'))
+    parser.add_argument('--count', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-depth', type=int, default=10)
+    parser.add_argument('--min-length', type=int, default=1)
+    parser.add_argument('--max-length', type=int, default=12)
+    parser.add_argument(
+        '--backend', choices=('arcs', 'python', 'native'), default='arcs')
+    parser.add_argument(
+        '--import-target', type=float, default=100.0,
+        help='milliseconds the import of the parser may take')
+    parser.add_argument(
+        '--memory', type=int, default=20,
+        help='number of sentences to profile memory on, 0 for none')
+    args = parser.parse_args()
+    grammar = Grammar()
+    with open(args.grammar) as f:
+        grammar.load(f)
+    lexicon = Lexicon()
+    with open(args.lexicon) as f:
+        lexicon.load(f)
+    generator = Generator(
+        grammar, lexicon, seed=args.seed, max_depth=args.max_depth,
+        min_length=args.min_length, max_length=args.max_length)
+    sentences = [generator.generate()[0] for _ in range(args.count)]
+    chart_parser = Parser(grammar, lexicon, backend=args.backend)
+    latencies = []
+    failures = []
+    start = time.perf_counter()
+    for sentence in sentences:
+        begin = time.perf_counter()
+        try:
+            chart_parser.parse(sentence)
+        except (KeyError, IndexError, ValueError):
+            failures.append(sentence)
+        latencies.append(time.perf_counter() - begin)
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    imported = import_time() * 1000
+    words = sum(len(sentence.split()) for sentence in sentences)
+    print('sentences:  {}'.format(len(sentences)))
+    print('words:      {}'.format(words))
+    print('failures:   {}'.format(len(failures)))
+    print('seconds:    {:.3f}'.format(elapsed))
+    print('throughput: {:.1f} parses/s'.format(len(sentences) / elapsed))
+    if latencies:
+        for name, q in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99)):
+            index = min(len(latencies) - 1, int(q * len(latencies)))
+            print('{}:        {:.1f} ms'.format(name, latencies[index] * 1000))
+    print('import:     {:.1f} ms'.format(imported))
+    if args.memory:
+        # profiled parses always run over arcs
+        print(MemoryProfile().run(chart_parser, sentences[:args.memory]))
+    for sentence in failures:
+        print('FAILED: {}'.format(sentence))
+    if imported > args.import_target:
+        print('FAILED: import took {:.1f} ms, target {:.1f} ms'.format(
+            imported, args.import_target))
+    if failures or imported > args.import_target:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+"""
+Kathryn Egan
+
+Measures the throughput of a running parse server by sending the sentences
+in a file (one per line) over several pipelined connections, e.g.
+
+    python -m chartparser serve --port 8765 &
+    python bin/loadtest.py sentences.txt --port 8765 --connections 8
+"""
+import argparse
+import asyncio
+import time
+from chartparser.server import ParseClient
+
+
+async def load(sentences, connections, host, port, path):
+    """ Sends every sentence once, spread over the given number of
+    connections, and returns the latency and response of each. """
+    clients = [
+        await ParseClient.connect(host=host, port=port, path=path)
+        for _ in range(connections)]
+
+    async def timed(client, sentence):
+        start = time.perf_counter()
+        response = await client.parse(sentence)
+        return time.perf_counter() - start, response
+
+    try:
+        return await asyncio.gather(*[
+            timed(clients[i % connections], sentence)
+            for i, sentence in enumerate(sentences)])
+    finally:
+        for client in clients:
+            await client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('sentences', help='file with one sentence per line')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', help='path of Unix socket')
+    parser.add_argument('--connections', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=1)
+    args = parser.parse_args()
+    with open(args.sentences) as f:
+        sentences = [line.strip() for line in f if line.strip()]
+    sentences *= args.repeat
+    start = time.perf_counter()
+    results = asyncio.run(load(
+        sentences, args.connections, args.host, args.port, args.unix))
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latency for latency, _ in results)
+    errors = sum(1 for _, response in results if 'error' in response)
+    print('requests:   {}'.format(len(results)))
+    print('errors:     {}'.format(errors))
+    print('seconds:    {:.3f}'.format(elapsed))
+    print('throughput: {:.1f} parses/s'.format(len(results) / elapsed))
+    if latencies:
+        for name, q in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99)):
+            index = min(len(latencies) - 1, int(q * len(latencies)))
+            print('{}:        {:.1f} ms'.format(name, latencies[index] * 1000))
+
+
+if __name__ == '__main__':
+    main()
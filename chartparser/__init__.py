@@ -0,0 +1,90 @@
+"""
+Kathryn Egan
+
+Chart parser for context-free grammars. The names below are imported from
+their modules the first time they are used, so importing the package does
+no work and never loads the GUI, tkinter or numpy, e.g.
+
+    import chartparser
+    parser = chartparser.Parser(
+        chartparser.load_grammar('grammar.txt'),
+        chartparser.load_lexicon('lexicon.txt'))
+"""
+import importlib
+
+# module each lazily imported name is defined in
+_modules = {
+    'Parser': 'chartparser.parser',
+    'ParseCancelled': 'chartparser.parser',
+    'Budget': 'chartparser.parser',
+    'Constraints': 'chartparser.constraints',
+    'Grammar': 'chartparser.language',
+    'Lexicon': 'chartparser.language',
+    'CompactLexicon': 'chartparser.language',
+    'NonTerminal': 'chartparser.rule',
+    'Terminal': 'chartparser.rule',
+    'KBest': 'chartparser.kbest',
+    'Ambiguity': 'chartparser.ambiguity',
+    'ChartWriter': 'chartparser.export',
+    'ChartReader': 'chartparser.export',
+    'Generator': 'chartparser.generate',
+}
+
+__all__ = sorted(_modules) + ['load_grammar', 'load_lexicon']
+
+
+def __getattr__(name):
+    """ Imports given name from its module on first use.
+    Args:
+        name (str) : name of class
+    Returns:
+        type : class of that name
+    """
+    if name not in _modules:
+        raise AttributeError(
+            "module 'chartparser' has no attribute '{}'".format(name))
+    value = getattr(importlib.import_module(_modules[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
+
+def _load(language, f):
+    """ Loads given language from given IO stream or path to a file.
+    Args:
+        language (Language) : empty grammar or lexicon
+        f (IOBase or str) : any IO stream, or path to file
+    Returns:
+        Language : given language, loaded
+    """
+    if hasattr(f, 'read'):
+        language.load(f)
+    else:
+        with open(f) as stream:
+            language.load(stream)
+    return language
+
+
+def load_grammar(f):
+    """ Returns a new grammar loaded from given IO stream or path.
+    Raises ValueError if any line is not a valid rule.
+    Args:
+        f (IOBase or str) : any IO stream, or path to grammar file
+    Returns:
+        Grammar : loaded grammar
+    """
+    return _load(__getattr__('Grammar')(), f)
+
+
+def load_lexicon(f):
+    """ Returns a new lexicon loaded from given IO stream or path.
+    Raises ValueError if any line is not a valid entry.
+    Args:
+        f (IOBase or str) : any IO stream, or path to lexicon file
+    Returns:
+        Lexicon : loaded lexicon
+    """
+    return _load(__getattr__('Lexicon')(), f)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+"""
+Kathryn Egan
+
+Command line entry point for the parse server and its client, and for
+generating sentences to test them with, e.g.
+
+    python -m chartparser serve --port 8765
+    python -m chartparser parse --port 8765 "the dog chased the cat"
+    python -m chartparser generate --count 1000 --seed 1 > sentences.txt
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from chartparser.server import ParseServer, ParseClient
+from chartparser.language import Grammar, Lexicon
+from chartparser.generate import Generator
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+def serve(args):
+    """ Runs the parse server until interrupted. """
+    server = ParseServer(
+        args.grammar, args.lexicon, workers=args.workers,
+        concurrency=args.concurrency, timeout=args.timeout)
+
+    async def run():
+        listener = await server.start(
+            host=args.host, port=args.port, path=args.unix)
+        try:
+            await listener.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+def parse(args):
+    """ Parses sentences given as arguments, or one per line of stdin,
+    and prints one JSON response per line. """
+    sentences = args.sentences or [line.strip() for line in sys.stdin]
+
+    async def run():
+        client = await ParseClient.connect(
+            host=args.host, port=args.port, path=args.unix)
+        try:
+            responses = await asyncio.gather(
+                *[client.parse(sentence) for sentence in sentences])
+        finally:
+            await client.close()
+        for sentence, response in zip(sentences, responses):
+            response['sentence'] = sentence
+            print(json.dumps(response))
+
+    asyncio.run(run())
+
+
+def generate(args):
+    """ Prints random sentences that the grammar and lexicon can parse,
+    one per line. """
+    grammar = Grammar()
+    with open(args.grammar) as f:
+        grammar.load(f)
+    lexicon = Lexicon()
+    with open(args.lexicon) as f:
+        lexicon.load(f)
+    generator = Generator(
+        grammar, lexicon, seed=args.seed, max_depth=args.max_depth,
+        min_length=args.min_length, max_length=args.max_length,
+        max_parses=args.max_parses)
+    generator.write(sys.stdout, args.count)
+
+
+def main(argv=None):
+    """ Parses command line arguments and runs the chosen command. """
+    parser = argparse.ArgumentParser(prog='python -m chartparser')
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name in ('serve', 'parse'):
+        command = commands.add_parser(name)
+        command.add_argument('--host', default='127.0.0.1')
+        command.add_argument('--port', type=int, default=8765)
+        command.add_argument('--unix', help='path of Unix socket')
+    generator = commands.add_parser('generate')
+    for command in commands.choices['serve'], generator:
+        command.add_argument(
+            '--grammar', default=os.path.join(DATA, 'sample_grammar.txt'))
+        command.add_argument(
+            '--lexicon', default=os.path.join(DATA, 'sample_lexicon.txt'))
+    generator.add_argument('--count', type=int, default=100)
+    generator.add_argument('--seed', type=int, default=None)
+    generator.add_argument('--max-depth', type=int, default=10)
+    generator.add_argument('--min-length', type=int, default=1)
+    generator.add_argument('--max-length', type=int, default=20)
+    generator.add_argument('--max-parses', type=int, default=None)
+    generator.set_defaults(run=generate)
+    server = commands.choices['serve']
+    server.add_argument('--workers', type=int, default=None)
+    server.add_argument('--concurrency', type=int, default=64)
+    server.add_argument('--timeout', type=float, default=10.0)
+    server.set_defaults(run=serve)
+    client = commands.choices['parse']
+    client.add_argument('sentences', nargs='*')
+    client.set_defaults(run=parse)
+    args = parser.parse_args(argv)
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+
+"""
+Kathryn Egan
+
+Compiled version of the Core in chartparser.core, built when Cython is
+installed. It runs the same algorithm over the same integer arcs and finds
+the same parse, with the loops and arc fields given C types.
+"""
+from collections import deque
+from chartparser.agenda import Agenda
+from chartparser.language import LRUCache
+from chartparser.parser import ParseCancelled, _stopper
+
+
+cdef class _Arcs:
+    """ Arcs of one parse as parallel lists, with the agenda and the
+    indices into it and into the chart. """
+
+    cdef list parents, children, words, remaining
+    cdef long size
+    cdef list rule, start, end, dot, symbol, need, base, child, order
+    cdef long tick
+    cdef object agenda
+    cdef dict waiting, starting
+
+    def __init__(self, list parents, list children, list remaining, long size):
+        self.parents = parents
+        self.children = children
+        self.remaining = remaining
+        self.size = size
+        self.words = []
+        self.rule = []
+        self.start = []
+        self.end = []
+        self.dot = []
+        self.symbol = []
+        self.need = []
+        self.base = []
+        self.child = []
+        self.order = []
+        self.tick = 0
+        self.agenda = deque()
+        self.waiting = {}
+        self.starting = {}
+
+    cdef long add(self, long r, long s, long e, long d, long b, long c):
+        # adds a new arc to the end of the agenda unless it cannot
+        # finish before the sentence ends
+        cdef long arc = len(self.rule)
+        cdef long needed = -1
+        cdef tuple rest
+        if r >= 0 and e + self.remaining[r][d] > self.size:
+            return -1
+        self.rule.append(r)
+        self.start.append(s)
+        self.end.append(e)
+        self.dot.append(d)
+        self.base.append(b)
+        self.child.append(c)
+        if r < 0:
+            self.symbol.append(self.words[-r - 1][0])
+        else:
+            self.symbol.append(self.parents[r])
+            rest = self.children[r]
+            if d < len(rest):
+                needed = rest[d]
+        self.need.append(needed)
+        self.order.append(self.tick)
+        self.tick += 1
+        self.agenda.append(arc)
+        if needed >= 0:
+            self.waiting.setdefault((e, needed), []).append(arc)
+        return arc
+
+    cdef void complete(self, long arc):
+        # extends arc with the chart arcs where it ends, and so on
+        cdef list stack = [arc]
+        cdef long key, extended
+        while stack:
+            arc = stack.pop()
+            if <long>self.need[arc] < 0:
+                continue
+            for key in self.starting.get((self.end[arc], self.need[arc]), ()):
+                extended = self.add(
+                    self.rule[arc], self.start[arc], self.end[key],
+                    <long>self.dot[arc] + 1, arc, key)
+                if extended >= 0:
+                    stack.append(extended)
+
+
+cdef class Core:
+
+    cdef dict _symbols, _predicted
+    cdef list _names, _parents, _children
+    cdef frozenset _heads
+    cdef object _grammar, _remaining
+    cdef readonly long start
+
+    def __init__(self, grammar, start='S'):
+        """ Initializes core by numbering the rules and symbols of given
+        grammar, in the same order as chartparser.core.Core.
+        Args:
+            grammar (Grammar) : grammar for this language, a snapshot
+            start (str) : symbol representing a sentence
+        """
+        cdef list rules
+        self._symbols = {}
+        self._names = []
+        self._parents = []
+        self._children = []
+        self._predicted = {}
+        self.start = self._id(start)
+        for first in grammar:
+            rules = []
+            for rule in grammar[first]:
+                rules.append(len(self._parents))
+                self._parents.append(self._id(rule.parent))
+                self._children.append(
+                    tuple([self._id(child) for child in rule.children]))
+            self._predicted[self._id(first)] = tuple(rules)
+        self._grammar = grammar
+        self._heads = frozenset(
+            self._names[parent] for parent in self._parents)
+        self._remaining = LRUCache(grammar.YIELDS_CACHED)
+
+    cdef list _suffixes(self, frozenset parts):
+        # only parts of speech that are also parents change the yields
+        parts = parts & self._heads
+        return self._remaining.get(parts, lambda: self._build_suffixes(parts))
+
+    def _build_suffixes(self, frozenset parts):
+        cdef list yields, remaining, lengths
+        yields = [1] * len(self._names)
+        for parent, length in self._grammar.min_yields(parts).items():
+            yields[self._symbols[parent]] = length
+        remaining = []
+        for rest in self._children:
+            lengths = [0]
+            for child in reversed(rest):
+                lengths.append(lengths[len(lengths) - 1] + yields[child])
+            remaining.append(tuple(reversed(lengths)))
+        return remaining
+
+    cdef long _id(self, symbol):
+        if symbol not in self._symbols:
+            self._symbols[symbol] = len(self._names)
+            self._names.append(symbol)
+        return self._symbols[symbol]
+
+    def parse(self, tokens, lexicon, tags=None, cancel=None):
+        """ Chart parses given tokenized sentence and returns exactly one
+        parse, the same one the Parser's loop over arcs finds. Raises
+        KeyError for unknown words, ValueError if the sentence cannot be
+        parsed and ParseCancelled if the given cancel flag is set.
+        Args:
+            tokens (list of str) : tokenized sentence
+            lexicon (Lexicon) : lexicon for this language, a snapshot
+            tags (list of sets of str) : parts of speech allowed per token
+            cancel (threading.Event) : flag to stop parsing early
+        Returns:
+            str : parse for given sentence
+        """
+        cdef long size = len(tokens)
+        cdef _Arcs arcs = _Arcs(self._parents, self._children, None, size)
+        cdef dict found = {}
+        cdef long sentence = -1
+        cdef bint complete_from_chart = False
+        cdef long index, iterations, iteration, count, current, arc, r
+        cdef long current_symbol, current_start, current_end
+        cdef list extendable
+        cdef object agenda = arcs.agenda
+        cdef list need = arcs.need
+        cdef list order = arcs.order
+        cdef object stop = _stopper(cancel)
+        if tags is None:
+            tags = [None] * size
+        for index, (token, allowed) in enumerate(zip(tokens, tags)):
+            if allowed is None:
+                terminals = lexicon.terminals(token)
+            else:
+                terminals = Agenda._tagged(lexicon, token, allowed)
+            for terminal in terminals:
+                arcs.words.append(
+                    (self._symbols.get(terminal.pos, -1), terminal))
+                arcs.add(-len(arcs.words), index, index + 1, 1, -1, -1)
+        # a part of speech the lexicon or tags can assign is one word
+        arcs.remaining = self._suffixes(frozenset(
+            lexicon.parts_of_speech |
+            {terminal.pos for _, terminal in arcs.words}))
+        while True:
+            if stop is not None and stop():
+                raise ParseCancelled('Parse cancelled.')
+            try:
+                # choose the first complete arc, moving incomplete arcs
+                # from the front of the agenda to its end
+                iterations = len(agenda)
+                iteration = 0
+                while True:
+                    current = agenda.popleft()
+                    if <long>need[current] < 0:
+                        break
+                    order[current] = arcs.tick
+                    arcs.tick += 1
+                    agenda.append(current)
+                    iteration += 1
+                    if iteration > iterations:
+                        raise ValueError('Agenda exhausted, no parse found.')
+            except (IndexError, ValueError):
+                # arcs that missed chart arcs found before them are
+                # caught up once before the parse gives up
+                if not complete_from_chart:
+                    complete_from_chart = True
+                    count = len(agenda)
+                    for arc in list(agenda):
+                        if arcs.dot[arc]:
+                            arcs.complete(arc)
+                    if len(agenda) > count:
+                        continue
+                raise
+            key = (arcs.rule[current], arcs.start[current], arcs.end[current])
+            if key in found:
+                continue
+            found[key] = current
+            current_symbol = arcs.symbol[current]
+            current_start = arcs.start[current]
+            current_end = arcs.end[current]
+            arcs.starting.setdefault(
+                (current_start, current_symbol), []).append(current)
+            if current_symbol == self.start and current_start == 0 and \
+                    current_end == size:
+                sentence = current
+            for r in self._predicted.get(current_symbol, ()):
+                arcs.add(r, current_start, current_start, 0, -1, -1)
+            # extend waiting arcs in the order they stand in the agenda
+            extendable = sorted(
+                arcs.waiting.get((current_start, current_symbol), ()),
+                key=order.__getitem__)
+            for arc in extendable:
+                arc = arcs.add(
+                    arcs.rule[arc], arcs.start[arc], current_end,
+                    <long>arcs.dot[arc] + 1, arc, current)
+                if complete_from_chart and arc >= 0:
+                    arcs.complete(arc)
+            if sentence >= 0:
+                return self._tree(sentence, arcs)
+
+    cdef str _tree(self, long arc, _Arcs arcs):
+        cdef long node
+        cdef list parts
+        if <long>arcs.rule[arc] < 0:
+            terminal = arcs.words[-<long>arcs.rule[arc] - 1][1]
+            return '[.{} {}]'.format(terminal.pos, terminal.token)
+        parts = []
+        node = arc
+        while <long>arcs.base[node] >= 0:
+            parts.append(self._tree(arcs.child[node], arcs))
+            node = arcs.base[node]
+        name = self._names[self._parents[arcs.rule[arc]]]
+        return '[.{} {}]'.format(name, ''.join(reversed(parts)))
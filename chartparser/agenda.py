@@ -6,26 +6,94 @@ Kathryn Egan
 The Agenda keeps a running list of all the arcs eligible for
 adding to the chart or extending during parsing.
 """
+import heapq
+import itertools
 from chartparser.arc import Arc
+from chartparser.rule import Terminal
 
 
 class Agenda:
 
-    def __init__(self, tokens, lexicon):
+    def __init__(
+            self, tokens, lexicon, scored=False, profile=None, closure=False,
+            tags=None, chart=None, constraints=None, grammar=None):
         """ Initializes Agenda object with all the terminal
         arcs associated with the given tokens and according
-        to the rules defined in the given lexicon.
+        to the rules defined in the given lexicon. If tags are
+        given for a token, only those parts of speech are used
+        for it, whether or not the lexicon lists them.
         Args:
             tokens (list of str) : list of words in sentence
             lexicon (Lexicon) : lexicon for this language
+            scored (bool) :
+                if True, the cheapest complete arc is always chosen next
+                so that arcs reach each chart cell in order of cost;
+                complete arcs are then kept in a heap by cost and the
+                order they were added in
+            profile (RuleProfile) :
+                profile to record every predicted and extended arc in
+            closure (bool) :
+                if True, unary rules are applied through the unary closure
+                of the grammar instead of being predicted
+            tags (list of sets of str) :
+                parts of speech allowed for each token, or None for
+                a token to use all of its parts of speech in the lexicon
+            chart (Chart) :
+                chart being parsed into, whose arcs are used to extend
+                arcs that reach them only after they were chosen
+            constraints (Constraints) :
+                brackets that every arc added to this agenda must keep
+            grammar (Grammar) :
+                grammar whose fewest words per parent are used to never
+                add arcs that cannot finish before the sentence ends
         """
         self.agenda = []
-        for index, token in enumerate(tokens):
-            for terminal in lexicon[token]:
+        self.heap = []
+        self._order = itertools.count()
+        self.scored = scored
+        self.profile = profile
+        self.closure = closure
+        self.chart = chart
+        self.constraints = constraints
+        if tags is None:
+            tags = [None] * len(tokens)
+        for index, (token, allowed) in enumerate(zip(tokens, tags)):
+            if allowed is None:
+                terminals = lexicon.terminals(token)
+            else:
+                terminals = self._tagged(lexicon, token, allowed)
+            for terminal in terminals:
                 arc = Arc(
                     terminal, start=index,
                     end=index + 1, dot=1, history=None)
-                self.agenda.append(arc)
+                self._push(arc)
+        self.size = len(tokens)
+        self.yields = None
+        if grammar is not None:
+            # a part of speech the lexicon or tags can assign is one word
+            self.yields = grammar.min_yields(
+                lexicon.parts_of_speech |
+                {arc.rule.parent for arc in self})
+            self._remaining = {}
+
+    @staticmethod
+    def _tagged(lexicon, token, tags):
+        """ Returns a terminal for each of the given parts of speech of
+        given token, taken from the lexicon where it has one.
+        Args:
+            lexicon (Lexicon) : lexicon for this language
+            token (str) : word in sentence
+            tags (set of str) : parts of speech allowed for word
+        Returns:
+            list of Terminals : terminals for word, sorted
+        """
+        try:
+            known = {
+                terminal.pos: terminal
+                for terminal in lexicon.terminals(token)}
+        except KeyError:
+            known = {}
+        return sorted(known.get(tag) or Terminal(tag, token) for tag in tags)
 
     def choose_next(self):
         """ Chooses the next complete arc to use as the key
@@ -34,6 +102,10 @@ class Agenda:
         Returns:
             Arc : next complete Arc in current agenda
         """
+        if self.scored:
+            if not self.heap:
+                raise ValueError('Agenda exhausted, no parse found.')
+            return heapq.heappop(self.heap)[2]
         index = self._choice_protocol()
         iterations = len(self)
         iteration = 0
@@ -49,8 +121,9 @@ class Agenda:
     def _choice_protocol(self):
         """ Choice protocol can be any rule-based or stochastic
         system for choosing the next arc to use to extend other
-        arcs in the agenda. The current protocol is simply
-        to choose the first one off the list.
+        arcs in the agenda. The default protocol is simply
+        to choose the first one off the list. A scored agenda
+        takes the cheapest complete arc off its heap instead.
         Returns:
             int : index of chosen arc
         """
@@ -60,13 +133,17 @@ class Agenda:
     def predict(self, grammar, current):
         """ Adds all nonterminal rules that could be
         extended by the current arc to the agenda according
-        to the given grammar.
+        to the given grammar. With the unary closure, unary rules
+        are not predicted; instead the complete arcs of every chain
+        of unary rules above the current arc are added at once.
         Args:
             grammar (Grammar) : grammar for this language
             current (Arc) : current arc to look up in grammar
         """
         if not current.is_complete():
             return
+        if self.closure:
+            self._close(grammar, current)
         try:
             predicted = grammar[current.rule.parent]
         except KeyError:  # no rules for this key
@@ -74,8 +151,31 @@ class Agenda:
         else:
             # create an arc for each rule for current key
             for i, rule in enumerate(predicted):
+                if self.closure and len(rule.children) == 1:
+                    continue
                 arc = Arc(rule, current.start, current.start, 0)
-                self.agenda.append(arc)
+                self._add(arc)
+
+    def _close(self, grammar, current):
+        """ Adds a complete arc for every chain of unary rules above
+        the current arc, each extended by the arc below it so the whole
+        chain can be traced back.
+        Args:
+            grammar (Grammar) : grammar for this language
+            current (Arc) : complete arc at the bottom of the chains
+        """
+        # arcs made here were already closed from the bottom of their chain
+        if not current.rule.is_terminal and len(current.rule.children) == 1:
+            return
+        built = {(): current}
+        for chain in grammar.unary_closure.get(current.rule.parent, ()):
+            below = built.get(chain[:-1])
+            if below is None:
+                continue
+            arc = Arc(chain[-1], below.start, below.start, 0)
+            arc = arc.get_extended(below)
+            if self._add(arc):
+                built[chain] = arc
 
     def extend(self, current):
         """ Uses current arc to extend any extendable arcs
@@ -87,25 +187,110 @@ class Agenda:
         """
         for arc in self.agenda:
             try:
-                self.agenda.append(arc.get_extended(current))
+                extended = arc.get_extended(current)
             except ValueError:
                 continue
+            if self._add(extended) and self.chart is not None:
+                self._complete(extended)
+
+    def complete(self, chart):
+        """ Starts extending newly extended arcs with the arcs already in
+        given chart, first catching up every partly extended arc in this
+        agenda with the chart arcs where it ends.
+        Args:
+            chart (Chart) : chart being parsed into
+        Returns:
+            bool : True if any arcs were added, False otherwise
+        """
+        self.chart = chart
+        size = len(self)
+        for arc in self.agenda[:]:
+            if arc.dot:
+                self._complete(arc)
+        return len(self) > size
+
+    def _complete(self, arc):
+        """ Extends given newly extended arc with the arcs already in the
+        chart where it now ends, which were chosen before the arc reached
+        them and so never extended it, and so on for each of those.
+        Args:
+            arc (Arc) : newly extended arc
+        """
+        stack = [arc]
+        while stack:
+            arc = stack.pop()
+            if arc.is_complete():
+                continue
+            need = arc.rule.children[arc.dot]
+            for key in self.chart.starting(arc.end, need):
+                extended = arc.get_extended(key)
+                if self._add(extended):
+                    stack.append(extended)
+
+    def _add(self, arc):
+        """ Adds given newly created arc to this agenda and records it
+        in the profile, if any, unless the arc breaks the constraints or
+        cannot finish before the sentence ends.
+        Args:
+            arc (Arc) : arc to add
+        Returns:
+            bool : True if arc was added, False if it was refused
+        """
+        if self.yields is not None and not self._finishes(arc):
+            return False
+        if self.constraints is not None and \
+                not self.constraints.allows(arc):
+            return False
+        self._push(arc)
+        if self.profile is not None:
+            self.profile.created(arc)
+        return True
+
+    def _push(self, arc):
+        """ Puts given arc at the end of this agenda, or on the heap of
+        complete arcs if this agenda is scored.
+        Args:
+            arc (Arc) : arc to put on agenda
+        """
+        if self.scored and arc.is_complete():
+            heapq.heappush(self.heap, (arc.cost, next(self._order), arc))
+        else:
+            self.agenda.append(arc)
+
+    def _finishes(self, arc):
+        """ Returns whether the children left to given arc can yield
+        few enough words to fit in the rest of the sentence.
+        Args:
+            arc (Arc) : arc to check
+        Returns:
+            bool : True if arc may still complete, False otherwise
+        """
+        if arc.is_complete():
+            return True
+        key = (arc.rule, arc.dot)
+        if key not in self._remaining:
+            self._remaining[key] = sum(
+                self.yields.get(child, 1)
+                for child in arc.rule.children[arc.dot:])
+        return arc.end + self._remaining[key] <= self.size
 
     def __iter__(self):
         """ Provides iterator on this agenda. """
         for arc in self.agenda:
             yield arc
+        for _, _, arc in self.heap:
+            yield arc
 
     def __str__(self):
         """ Returns this agenda as a string.
         Returns:
             str : agenda as string
         """
-        return '\n'.join([str(arc) for arc in self.agenda])
+        return '\n'.join([str(arc) for arc in self])
 
     def __len__(self):
         """ Returns the number of arcs in this agenda.
         Returns:
             int : number of arcs in agenda
         """
-        return len(self.agenda)
+        return len(self.agenda) + len(self.heap)
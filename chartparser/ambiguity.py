@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+"""
+Kathryn Egan
+
+The Ambiguity counts how many parses an exhaustively parsed chart holds
+without building any of them. Every arc has as many parses as the sum, over
+its derivations, of the product of the parses of its children, so one pass
+over the arcs with children before parents counts them all. Counts are
+Python integers and never overflow, however ambiguous the sentence.
+"""
+from chartparser.kbest import derivations
+
+
+class Ambiguity:
+
+    def __init__(self, chart):
+        """ Counts the parses of every arc in given chart. Raises ValueError
+        if an arc can derive itself, e.g. through a cycle of unary rules,
+        since it then has endlessly many parses.
+        Args:
+            chart (Chart) : exhaustively parsed chart, or Forest read back
+        """
+        self.tokens = chart.tokens
+        self.counts = {}
+        for key, (_, edges) in derivations(chart, chart).items():
+            count = 0
+            for children in edges:
+                product = 1
+                for child in children:
+                    product *= self.counts[child]
+                count += product
+            self.counts[key] = count
+        self.count = 0
+        if chart.is_sentence:
+            arc = chart.sentence
+            self.count = self.counts[(arc.rule, arc.start, arc.end)]
+
+    def spans(self):
+        """ Returns how ambiguous each span of the sentence is, as the
+        number of complete arcs over the span and the number of parses
+        of those arcs together.
+        Returns:
+            dict of tuple to tuple : (arcs, parses) by (start, end) of span
+        """
+        spans = {}
+        for (_, start, end), count in self.counts.items():
+            arcs, parses = spans.get((start, end), (0, 0))
+            spans[(start, end)] = (arcs + 1, parses + count)
+        return spans
+
+    def __str__(self):
+        """ Returns this count as a report listing the spans with more
+        than one parse, widest first.
+        Returns:
+            str : ambiguity as string
+        """
+        output = ['{} parses'.format(self.count)]
+        spans = sorted(
+            self.spans().items(),
+            key=lambda item: (item[0][0] - item[0][1], item[0]))
+        for (start, end), (arcs, parses) in spans:
+            if parses > 1:
+                output.append('    {}-{} {}: {} arcs, {} parses'.format(
+                    start, end, ' '.join(self.tokens[start:end]),
+                    arcs, parses))
+        return '\n'.join(output)
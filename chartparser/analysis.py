@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+"""
+Kathryn Egan
+
+The Analysis finds the rules of a grammar that can never be part of a parse:
+rules whose children cannot all be rewritten down to parts of speech in the
+lexicon (non-productive) and rules whose parent cannot be reached from the
+sentence symbol (unreachable). It also finds cycles of unary rules, such as
+NP --> NBAR and NBAR --> NP, which make the agenda predict the same arcs over
+and over. A pruned grammar keeps only the rules that can be used.
+"""
+from chartparser.language import Grammar
+
+
+class Analysis:
+
+    def __init__(self, grammar, lexicon, start='S'):
+        """ Analyzes given grammar against given lexicon.
+        Args:
+            grammar (Grammar) : grammar to analyze
+            lexicon (Lexicon) : lexicon providing the parts of speech
+            start (str) : symbol representing a sentence
+        """
+        self.start = start
+        self.rules = {
+            rule for child in grammar for rule in grammar[child]}
+        self.productive = self._productive(lexicon.parts_of_speech)
+        self.reachable = self._reachable()
+        self.nonproductive = {
+            rule for rule in self.rules
+            if not all(child in self.productive for child in rule.children)}
+        self.unreachable = {
+            rule for rule in self.rules - self.nonproductive
+            if rule.parent not in self.reachable}
+        self.cycles = self._cycles()
+
+    @property
+    def useless(self):
+        """ Returns the rules that can never be part of a parse.
+        Returns:
+            set of NonTerminals : non-productive and unreachable rules
+        """
+        return self.nonproductive | self.unreachable
+
+    @property
+    def useful(self):
+        """ Returns the rules that can be part of a parse.
+        Returns:
+            set of NonTerminals : productive and reachable rules
+        """
+        return self.rules - self.useless
+
+    def prune(self):
+        """ Returns a new grammar with only the useful rules.
+        Returns:
+            Grammar : grammar without useless rules
+        """
+        grammar = Grammar()
+        grammar._replace(self.useful)
+        return grammar
+
+    def _productive(self, tags):
+        """ Returns every symbol that can be rewritten as a sequence of
+        the given parts of speech.
+        Args:
+            tags (set of str) : parts of speech in the lexicon
+        Returns:
+            set of str : productive symbols
+        """
+        productive = set(tags)
+        changed = True
+        while changed:
+            changed = False
+            for rule in self.rules:
+                if rule.parent in productive:
+                    continue
+                if all(child in productive for child in rule.children):
+                    productive.add(rule.parent)
+                    changed = True
+        return productive
+
+    def _reachable(self):
+        """ Returns every symbol that can be reached from the sentence
+        symbol through productive rules.
+        Returns:
+            set of str : reachable symbols
+        """
+        byparent = {}
+        for rule in self.rules:
+            if all(child in self.productive for child in rule.children):
+                byparent.setdefault(rule.parent, []).append(rule)
+        reachable = {self.start}
+        stack = [self.start]
+        while stack:
+            for rule in byparent.get(stack.pop(), ()):
+                for child in rule.children:
+                    if child not in reachable:
+                        reachable.add(child)
+                        stack.append(child)
+        return reachable
+
+    def _cycles(self):
+        """ Returns the groups of symbols that can rewrite to each other
+        through unary rules alone.
+        Returns:
+            list of lists of str : sorted symbols of each cycle
+        """
+        edges = {}
+        for rule in self.rules:
+            if len(rule.children) == 1:
+                edges.setdefault(rule.parent, set()).add(rule.first)
+        descendants = {}
+        for symbol in edges:
+            seen = set()
+            stack = [symbol]
+            while stack:
+                for child in edges.get(stack.pop(), ()):
+                    if child not in seen:
+                        seen.add(child)
+                        stack.append(child)
+            descendants[symbol] = seen
+        cycles = set()
+        for symbol, seen in descendants.items():
+            if symbol in seen:
+                cycles.add(tuple(sorted(
+                    other for other in seen
+                    if symbol in descendants.get(other, ()))))
+        return [list(cycle) for cycle in sorted(cycles)]
+
+    def __str__(self):
+        """ Returns this analysis as a report listing the useless rules
+        and unary cycles.
+        Returns:
+            str : analysis as string
+        """
+        output = ['{} rules, {} useful'.format(
+            len(self.rules), len(self.useful))]
+        for name, rules in (
+                ('Non-productive', self.nonproductive),
+                ('Unreachable', self.unreachable)):
+            output.append('{} rules: {}'.format(name, len(rules)))
+            output.extend('    {}'.format(rule) for rule in sorted(rules))
+        output.append('Unary cycles: {}'.format(len(self.cycles)))
+        output.extend(
+            '    {}'.format(' --> '.join(cycle + cycle[:1]))
+            for cycle in self.cycles)
+        return '\n'.join(output)
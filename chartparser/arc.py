@@ -10,7 +10,7 @@ position in the sentence, and which subrules/nodes they originated from.
 
 class Arc:
 
-    def __init__(self, rule, start, end, dot, history=None):
+    def __init__(self, rule, start, end, dot, history=None, cost=None):
         """ Initializes Arc with given rule, its start index, end index,
         the "dot", and history of extensions.
         Args:
@@ -23,12 +23,16 @@ class Arc:
             dot (int) :
                 index indicating progress of extending this rule with subrules
             history (list of Rules) : list of the rules that extended this rule
+            cost (float) :
+                accumulated cost of this arc and the arcs in its history,
+                defaults to the weight of the rule
         """
         self.rule = rule
         self.start = start
         self.end = end
         self.dot = dot
         self.history = history if history else [None] * (len(rule) - 1)
+        self.cost = rule.weight if cost is None else cost
 
     @property
     def identity(self):
@@ -46,7 +50,7 @@ class Arc:
             raise ValueError('Cannot extend {} with {}'.format(self, key))
         extended = Arc(
             self.rule, self.start, key.end,
-            self.dot + 1, self.history[::])
+            self.dot + 1, self.history[::], self.cost + key.cost)
         extended.history[self.dot] = key
         return extended
 
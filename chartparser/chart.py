@@ -4,20 +4,62 @@
 Kathryn Egan
 
 The Chart keeps track of all possible parses for the given tokenized
-sentence.
+sentence. An arc that is found again through different children is not
+added twice. In a packed chart its children are kept as another derivation
+of the first arc, so the chart is a packed forest of every parse it has
+found; a chart for the first parse only keeps each arc's own history.
 """
+from chartparser.arc import Arc
 
 
 class Chart:
 
-    def __init__(self, tokens):
-        """ Initializes empty chart with given tokens.
+    def __init__(
+            self, tokens, beam=None, threshold=None, writer=None,
+            packed=False):
+        """ Initializes empty chart with given tokens. Each span
+        (start, end) of the sentence is a cell of the chart, which
+        can optionally be limited to a beam of the best arcs.
         Args:
             tokens (list of str) : tokenized sentence
+            beam (int) : maximum number of arcs kept per cell
+            threshold (float) :
+                maximum cost above the best arc in a cell for an arc
+                to be kept in that cell
+            writer (ChartWriter) :
+                writer to stream every arc and derivation to as it is
+                added; a chart with a writer is always packed
+            packed (bool) :
+                whether to keep every derivation of each arc, as counting
+                and ranking parses need
         """
         self._chart = []
+        self._cells = {}
+        self._arcs = {}
+        self._derivations = {}
+        self._starts = {}
         self._tokens = tokens
         self._sentence = None
+        self.beam = beam
+        self.threshold = threshold
+        # distinct arcs pruned per span, counted once however often
+        # they are derived again
+        self.pruned = {}
+        self._pruned = set()
+        # cost of the cheapest arc in each cell
+        self._best = {}
+        self.writer = writer
+        self.packed = packed or writer is not None
+        if writer is not None:
+            writer.begin(tokens)
+
+    @property
+    def tokens(self):
+        """ Tokenized sentence for this chart.
+        Returns:
+            list of str : tokens in sentence
+        """
+        return self._tokens
 
     @property
     def sentence(self):
@@ -43,17 +85,177 @@ class Chart:
         """
         return self.sentence is not None
 
+    @property
+    def is_beamed(self):
+        """ Returns whether this chart prunes arcs per cell.
+        Returns:
+            bool : True if a beam or threshold is set, False otherwise
+        """
+        return self.beam is not None or self.threshold is not None
+
+    @property
+    def num_pruned(self):
+        """ Returns the total number of distinct arcs pruned from this
+        chart.
+        Returns:
+            int : number of pruned arcs
+        """
+        return sum(self.pruned.values())
+
     def add(self, arc):
-        """ Adds given arc to the chart. If the given arc represents
+        """ Adds given arc to the chart unless it is already in the chart
+        or falls outside the beam of its cell. If the arc is already in the
+        chart with different children, its children are kept as another
+        derivation of the arc in the chart. If the given arc represents
         a complete parsed sentence, updates sentence variable.
         Args:
             arc (Arc) : arc to add to chart
+        Returns:
+            bool : True if arc was added, False otherwise
         """
-        if arc in self:
-            return
+        span = (arc.start, arc.end)
+        cell = self._cells.setdefault(span, [])
+        key = self._key(arc)
+        if key in self._arcs:
+            if self.packed:
+                derivations = self._derivations[key]
+                children = self._children(arc)
+                if children not in derivations:
+                    derivations[children] = None
+                    if self.writer is not None:
+                        self.writer.derived(arc, children)
+            return False
+        if self._prunes(span, cell, arc):
+            if key not in self._pruned:
+                self._pruned.add(key)
+                self.pruned[span] = self.pruned.get(span, 0) + 1
+            return False
+        cell.append(arc)
+        self._best[span] = min(self._best.get(span, arc.cost), arc.cost)
         self._chart.append(arc)
-        if arc.rule.parent == 'S' and (arc.start, arc.end) == (0, len(self)):
+        self._arcs[key] = arc
+        if self.packed:
+            children = self._children(arc)
+            # derivations in the order found, as keys for quick lookup
+            self._derivations[key] = {children: None}
+            if self.writer is not None:
+                self.writer.added(arc, children)
+        self._starts.setdefault(
+            (arc.start, arc.rule.parent), []).append(arc)
+        if arc.rule.parent == 'S' and span == (0, len(self)) and \
+                self.sentence is None:
             self.sentence = arc
+        return True
+
+    def cover(self):
+        """ Returns the fewest complete arcs that together span the whole
+        sentence, end to end, found as a shortest path from the first to
+        the last index where each arc is an edge. Each span offers only
+        its last added arc, which is the highest of any unary chain over
+        it. Ties are broken by the lowest total cost. Raises ValueError if
+        the arcs in the chart leave part of the sentence uncovered.
+        Returns:
+            list of Arcs : arcs covering the sentence, in order
+        """
+        tops = {}
+        for span, cell in self._cells.items():
+            complete = [arc for arc in cell if arc.is_complete()]
+            if complete:
+                tops[span] = complete[-1]
+        # best[end] is (number of arcs, cost, arc) of the best path to end
+        best = {0: (0, 0.0, None)}
+        for end in range(1, len(self) + 1):
+            for start in range(end):
+                if start not in best or (start, end) not in tops:
+                    continue
+                arc = tops[(start, end)]
+                count, cost, _ = best[start]
+                path = (count + 1, cost + arc.cost, arc)
+                if end not in best or path[:2] < best[end][:2]:
+                    best[end] = path
+        if len(self) not in best:
+            raise ValueError('Chart does not cover the sentence.')
+        arcs = []
+        end = len(self)
+        while end:
+            arc = best[end][2]
+            arcs.append(arc)
+            end = arc.start
+        return arcs[::-1]
+
+    def starting(self, start, parent):
+        """ Returns the arcs in this chart with given start and parent.
+        Args:
+            start (int) : start index of arcs
+            parent (str) : parent of the rule of arcs
+        Returns:
+            list of Arcs : arcs in the order they were added
+        """
+        return self._starts.get((start, parent), [])
+
+    def derivations(self, arc):
+        """ Returns every way of deriving given arc found so far, the
+        first being the arc's own history; a chart that is not packed only
+        has that one. Terminal arcs have a single empty derivation. Raises
+        KeyError if the arc is not in the chart.
+        Args:
+            arc (Arc) : complete arc in this chart
+        Returns:
+            list of tuples of Arcs : children of arc in each derivation
+        """
+        key = self._key(arc)
+        if self.packed:
+            keys = self._derivations[key]
+        else:
+            keys = [self._children(self._arcs[key])]
+        derivations = []
+        for children in keys:
+            try:
+                derivations.append(
+                    tuple(self._arcs[child] for child in children))
+            except KeyError:  # child was pruned from the chart
+                continue
+        return derivations
+
+    @staticmethod
+    def _key(arc):
+        """ Returns the key identifying given arc regardless of its history.
+        Args:
+            arc (Arc) : arc to identify
+        Returns:
+            tuple : rule, start and end of arc
+        """
+        return arc.rule, arc.start, arc.end
+
+    def _children(self, arc):
+        """ Returns the keys of the children in the history of given arc.
+        Args:
+            arc (Arc) : arc to look at
+        Returns:
+            tuple of tuples : key of each child arc
+        """
+        return tuple(
+            self._key(child) for child in arc.history
+            if isinstance(child, Arc))
+
+    def _prunes(self, span, cell, arc):
+        """ Returns whether given arc falls outside the beam of the
+        given cell, i.e. the cell is full or the arc costs more than
+        the threshold above the best arc in the cell.
+        Args:
+            span (tuple of int) : (start, end) of the cell
+            cell (list of Arcs) : arcs already in the cell
+            arc (Arc) : arc to check
+        Returns:
+            bool : True if arc should be pruned, False otherwise
+        """
+        if not cell:
+            return False
+        if self.beam is not None and len(cell) >= self.beam:
+            return True
+        if self.threshold is not None:
+            return arc.cost > self._best[span] + self.threshold
+        return False
 
     def __contains__(self, arc):
         """ Returns whether given arc is in this chart.
@@ -62,7 +264,7 @@ class Chart:
         Returns:
             bool : True if given arc is in this chart, False otherwise
         """
-        return arc in self._chart
+        return arc in self._cells.get((arc.start, arc.end), ())
 
     def __iter__(self):
         """ Provides iterator on this chart. """
@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+
+"""
+Kathryn Egan
+
+The Recognizer answers whether a sentence is grammatical without building
+any arcs. The grammar is binarized and each cell of the chart is a vector
+of costs over nonterminal ids, so binary rules are applied to a whole cell
+at once with NumPy. NumPy is optional and only required by this module.
+"""
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+
+class Recognizer:
+
+    def __init__(self, grammar, lexicon, start='S'):
+        """ Initializes recognizer by binarizing the given grammar and
+        indexing the given lexicon by symbol id. Raises ImportError if
+        NumPy is not installed.
+        Args:
+            grammar (Grammar) : grammar for this language
+            lexicon (Lexicon) : lexicon for this language
+            start (str) : symbol representing a sentence
+        """
+        if numpy is None:
+            raise ImportError('Recognizer requires numpy.')
+        self._symbols = {}
+        binary = []
+        unary = []
+        for child in grammar:
+            for rule in grammar[child]:
+                parent = self._id(rule.parent)
+                children = [self._id(node) for node in rule.children]
+                if len(children) == 1:
+                    unary.append((parent, children[0], rule.weight))
+                    continue
+                # fold n-ary rules into binary rules over shared prefixes
+                left = children[0]
+                for i, right in enumerate(children[1:-1], 2):
+                    prefix = self._id(rule.children[:i])
+                    binary.append((prefix, left, right, 0.0))
+                    left = prefix
+                binary.append((parent, left, children[-1], rule.weight))
+        self._words = {}
+        for word in lexicon:
+            for terminal in lexicon[word]:
+                pos = self._id(terminal.pos)
+                self._words.setdefault(word, []).append(
+                    (pos, terminal.weight))
+        self.start = self._symbols.setdefault(start, len(self._symbols))
+        self._compile_binary(binary)
+        self._compile_unary(unary)
+
+    def _id(self, symbol):
+        """ Returns the integer id for the given symbol, assigning a new
+        one if the symbol has not been seen.
+        Args:
+            symbol (str or tuple of str) : category or binarized prefix
+        Returns:
+            int : id of symbol
+        """
+        return self._symbols.setdefault(symbol, len(self._symbols))
+
+    def _compile_binary(self, binary):
+        """ Stores binary rules as parallel arrays sorted by parent,
+        keeping only the cheapest of any duplicate rules.
+        Args:
+            binary (list of tuples) : (parent, left, right, weight) rules
+        """
+        best = {}
+        for parent, left, right, weight in binary:
+            key = (parent, left, right)
+            best[key] = min(weight, best.get(key, weight))
+        rules = sorted(best.items())
+        self._parent = numpy.array(
+            [key[0] for key, _ in rules], dtype=numpy.intp)
+        self._left = numpy.array(
+            [key[1] for key, _ in rules], dtype=numpy.intp)
+        self._right = numpy.array(
+            [key[2] for key, _ in rules], dtype=numpy.intp)
+        self._weight = numpy.array(
+            [weight for _, weight in rules], dtype=float)
+        # offsets of each run of rules sharing a parent, for reduceat
+        self._parents, self._offsets = numpy.unique(
+            self._parent, return_index=True)
+
+    def _compile_unary(self, unary):
+        """ Stores the transitive closure of the unary rules as a matrix
+        where entry [child, parent] is the cheapest cost of rewriting child
+        as parent through a chain of unary rules.
+        Args:
+            unary (list of tuples) : (parent, child, weight) rules
+        """
+        size = len(self._symbols)
+        closure = numpy.full((size, size), numpy.inf)
+        numpy.fill_diagonal(closure, 0.0)
+        parents = {}
+        for parent, child, weight in unary:
+            parents.setdefault(child, []).append((parent, weight))
+        # relax chains outward from every symbol with a unary parent
+        for source in parents:
+            row = closure[source]
+            frontier = [source]
+            while frontier:
+                child = frontier.pop()
+                for parent, weight in parents.get(child, ()):
+                    cost = row[child] + weight
+                    if cost < row[parent]:
+                        row[parent] = cost
+                        frontier.append(parent)
+        self._closure = closure
+        self._unary = numpy.array(sorted(parents), dtype=numpy.intp)
+
+    def __len__(self):
+        """ Returns the number of symbols, including binarized prefixes.
+        Returns:
+            int : number of symbols
+        """
+        return len(self._symbols)
+
+    def recognize(self, tokens):
+        """ Returns whether the given tokenized sentence is grammatical.
+        Args:
+            tokens (list of str) : tokenized sentence
+        Returns:
+            bool : True if sentence has a parse, False otherwise
+        """
+        return bool(numpy.isfinite(self.score(tokens)))
+
+    def recognize_batch(self, sentences):
+        """ Returns whether each of the given tokenized sentences
+        is grammatical.
+        Args:
+            sentences (list of list of str) : tokenized sentences
+        Returns:
+            list of bool : True for each sentence that has a parse
+        """
+        return [bool(numpy.isfinite(score))
+                for score in self.score_batch(sentences)]
+
+    def score(self, tokens):
+        """ Returns the cost of the cheapest parse of the given tokenized
+        sentence, which is infinite if the sentence has no parse or
+        contains unknown words.
+        Args:
+            tokens (list of str) : tokenized sentence
+        Returns:
+            float : cost of cheapest parse
+        """
+        return self.score_batch([tokens])[0]
+
+    def score_batch(self, sentences):
+        """ Returns the cost of the cheapest parse of each of the given
+        tokenized sentences. The sentences share one chart, so every rule
+        application covers the whole batch; shorter sentences leave the
+        cells past their last token empty, so batches of similar length
+        waste the least work.
+        Args:
+            sentences (list of list of str) : tokenized sentences
+        Returns:
+            list of float : cost of cheapest parse for each sentence
+        """
+        if not sentences:
+            return []
+        length = max(len(tokens) for tokens in sentences)
+        # chart is indexed by [sentence, start, end, symbol]
+        chart = numpy.full(
+            (len(sentences), length + 1, length + 1, len(self)), numpy.inf)
+        known = []
+        for row, tokens in enumerate(sentences):
+            try:
+                entries = [self._words[token] for token in tokens]
+            except KeyError:
+                continue
+            known.append(row)
+            for i, entry in enumerate(entries):
+                cell = chart[row, i, i + 1]
+                for pos, weight in entry:
+                    cell[pos] = min(cell[pos], weight)
+        if known:
+            for i in range(length):
+                self._close(chart[:, i, i + 1])
+            for width in range(2, length + 1):
+                for i in range(length - width + 1):
+                    j = i + width
+                    self._combine(chart, i, j)
+                    self._close(chart[:, i, j])
+        scores = chart[numpy.arange(len(sentences)), 0,
+                       [len(tokens) for tokens in sentences], self.start]
+        return [float(score) for score in scores]
+
+    def _combine(self, chart, i, j):
+        """ Applies every binary rule to every split of span (i, j) at once,
+        for every sentence in the chart.
+        Args:
+            chart (numpy.ndarray) : chart being filled
+            i (int) : start of span
+            j (int) : end of span
+        """
+        if not len(self._parent):
+            return
+        left = chart[:, i, i + 1:j][:, :, self._left]
+        right = chart[:, i + 1:j, j][:, :, self._right]
+        best = (left + right).min(axis=1) + self._weight
+        best = numpy.minimum.reduceat(best, self._offsets, axis=1)
+        cells = chart[:, i, j]
+        cells[:, self._parents] = numpy.minimum(
+            cells[:, self._parents], best)
+
+    def _close(self, cells):
+        """ Applies the unary closure to the given cells in place.
+        Args:
+            cells (numpy.ndarray) : costs of one cell per sentence, by symbol
+        """
+        # only symbols found in some sentence of the batch can be rewritten
+        found = self._unary[
+            numpy.isfinite(cells[:, self._unary]).any(axis=0)]
+        if len(found):
+            closed = (cells[:, found, None] + self._closure[found]).min(
+                axis=1)
+            numpy.minimum(cells, closed, out=cells)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+"""
+Kathryn Egan
+
+Constraints are brackets over a sentence that are already known, e.g. from a
+named entity tagger or from quotation marks, that the parser must respect.
+A required bracket must be a constituent of the parse, optionally with a
+fixed label, and no constituent may cross it. A plain bracket only may not
+be crossed. The agenda refuses every arc that breaks a constraint as soon
+as it is made, so the parser never explores constituents that cannot be in
+a parse and the work left scales with what is actually uncertain.
+"""
+
+
+class Constraints:
+
+    def __init__(self, required=(), brackets=()):
+        """ Initializes constraints over the tokens of a sentence, where
+        a span (start, end) covers the tokens from start up to end. Raises
+        ValueError if a span is empty or two of the spans cross.
+        Args:
+            required (iterable of tuples) :
+                (start, end) of spans that must be constituents of the
+                parse, or (start, end, label) to also fix the label of the
+                constituents over the span; giving a span more than one
+                label allows a chain of unary rules over it
+            brackets (iterable of tuples) :
+                (start, end) of spans no constituent may cross
+        """
+        self.required = set()
+        self.labels = {}
+        for span in required:
+            start, end, *label = span
+            self.required.add((start, end))
+            if label:
+                self.labels.setdefault((start, end), set()).add(
+                    label[0].upper())
+        self.brackets = self.required | {
+            (start, end) for start, end in brackets}
+        for start, end in self.brackets:
+            if not 0 <= start < end:
+                raise ValueError('Span {}-{} is empty.'.format(start, end))
+            for other in self.brackets:
+                if self._crosses((start, end), *other):
+                    raise ValueError('Spans {}-{} and {}-{} cross.'.format(
+                        start, end, *other))
+
+    @staticmethod
+    def _crosses(span, start, end):
+        """ Returns whether the given spans overlap without one holding
+        the other.
+        Args:
+            span (tuple of int) : (start, end) of one span
+            start (int) : start of the other span
+            end (int) : end of the other span
+        Returns:
+            bool : True if the spans cross, False otherwise
+        """
+        return span[0] < start < span[1] < end or \
+            start < span[0] < end < span[1]
+
+    def check(self, size):
+        """ Raises ValueError if a span does not fit in a sentence of the
+        given number of tokens.
+        Args:
+            size (int) : number of tokens in sentence
+        """
+        for start, end in self.brackets:
+            if end > size:
+                raise ValueError('Span {}-{} is past the end of {}.'.format(
+                    start, end, size))
+
+    def allows(self, arc):
+        """ Returns whether given newly made arc can be part of a parse
+        that keeps these constraints. A complete arc may not cross any
+        bracket. An arc may not cross a required span even while it is
+        incomplete, nor hold it unless one of its children does, and a
+        complete arc over a labelled span must have one of its labels.
+        Args:
+            arc (Arc) : arc to check
+        Returns:
+            bool : True if arc is allowed, False otherwise
+        """
+        if arc.rule.is_terminal or not arc.dot:
+            return True
+        span = (arc.start, arc.end)
+        complete = arc.is_complete()
+        for start, end in self.brackets:
+            required = (start, end) in self.required
+            if (complete or required) and self._crosses(span, start, end):
+                return False
+            if required and span[0] <= start and end <= span[1] and \
+                    span != (start, end) and any(
+                        start < child.start < end
+                        for child in arc.history[1:arc.dot]):
+                return False
+        if complete and span in self.labels:
+            return arc.rule.parent in self.labels[span]
+        return True
@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+
+"""
+Kathryn Egan
+
+The Core runs the same chart parse as the Parser's own loop over Arc
+objects and finds exactly the same parse, but over integers: the rules and
+symbols of a grammar are numbered once per version, and an arc is a row of
+parallel lists holding its rule, span, dot and the two arcs it was made
+from. Arcs waiting on the agenda are indexed by where they end and the
+symbol they need next, so extending the agenda with a complete arc only
+visits the arcs it can extend. The compiled Core in chartparser._speedups,
+built from _speedups.pyx when Cython is installed, is the same algorithm
+with C types.
+"""
+import itertools
+from collections import deque
+from chartparser.agenda import Agenda
+from chartparser.language import LRUCache
+from chartparser.parser import ParseCancelled, _stopper
+
+try:
+    from chartparser import _speedups
+except ImportError:  # pragma: no cover
+    _speedups = None
+
+
+class Core:
+
+    def __init__(self, grammar, start='S'):
+        """ Initializes core by numbering the rules and symbols of given
+        grammar. Rules are numbered in the order the grammar gives them
+        for each first child, which is the order they are predicted in.
+        Args:
+            grammar (Grammar) : grammar for this language, a snapshot
+            start (str) : symbol representing a sentence
+        """
+        self._symbols = {}
+        self._names = []
+        self._parents = []
+        self._children = []
+        self._predicted = {}
+        self.start = self._id(start)
+        for first in grammar:
+            rules = []
+            for rule in grammar[first]:
+                rules.append(len(self._parents))
+                self._parents.append(self._id(rule.parent))
+                self._children.append(
+                    tuple(self._id(child) for child in rule.children))
+            self._predicted[self._id(first)] = tuple(rules)
+        self._grammar = grammar
+        self._heads = frozenset(
+            self._names[parent] for parent in self._parents)
+        self._remaining = LRUCache(grammar.YIELDS_CACHED)
+
+    def _suffixes(self, parts):
+        """ Returns the fewest words the children from each dot on of
+        every rule can yield, where each given part of speech yields one
+        word, building them once for each set of parts of speech.
+        Args:
+            parts (frozenset of str) : parts of speech the lexicon or the
+                sentence can assign
+        Returns:
+            list of tuples of int : fewest words by dot, by rule
+        """
+        # only parts of speech that are also parents change the yields
+        parts = parts & self._heads
+
+        def build():
+            yields = [1] * len(self._names)
+            for parent, length in self._grammar.min_yields(parts).items():
+                yields[self._symbols[parent]] = length
+            remaining = []
+            for rest in self._children:
+                lengths = [0]
+                for child in reversed(rest):
+                    lengths.append(lengths[-1] + yields[child])
+                remaining.append(tuple(reversed(lengths)))
+            return remaining
+
+        return self._remaining.get(parts, build)
+
+    def _id(self, symbol):
+        """ Returns the integer id for the given symbol, assigning a new
+        one if the symbol has not been seen.
+        Args:
+            symbol (str) : category
+        Returns:
+            int : id of symbol
+        """
+        if symbol not in self._symbols:
+            self._symbols[symbol] = len(self._names)
+            self._names.append(symbol)
+        return self._symbols[symbol]
+
+    def parse(self, tokens, lexicon, tags=None, cancel=None):
+        """ Chart parses given tokenized sentence and returns exactly one
+        parse, the same one the Parser's loop over arcs finds. Raises
+        KeyError for unknown words, ValueError if the sentence cannot be
+        parsed and ParseCancelled if the given cancel flag is set.
+        Args:
+            tokens (list of str) : tokenized sentence
+            lexicon (Lexicon) : lexicon for this language, a snapshot
+            tags (list of sets of str) : parts of speech allowed per token
+            cancel (threading.Event) : flag to stop parsing early
+        Returns:
+            str : parse for given sentence
+        """
+        parents = self._parents
+        children = self._children
+        predicted = self._predicted
+        remaining = None
+        # arcs as parallel lists; terminal arcs have negative rules
+        rule = []
+        start = []
+        end = []
+        dot = []
+        symbol = []
+        need = []
+        base = []
+        child = []
+        order = []
+        tick = itertools.count().__next__
+        words = []
+        agenda = deque()
+        waiting = {}
+        found = {}
+        starting = {}
+        sentence = -1
+        size = len(tokens)
+        stop = _stopper(cancel)
+        complete_from_chart = False
+
+        def add(r, s, e, d, b, c):
+            # adds a new arc to the end of the agenda unless it cannot
+            # finish before the sentence ends
+            if r >= 0 and e + remaining[r][d] > size:
+                return -1
+            arc = len(rule)
+            rule.append(r)
+            start.append(s)
+            end.append(e)
+            dot.append(d)
+            base.append(b)
+            child.append(c)
+            if r < 0:
+                symbol.append(words[-r - 1][0])
+                need.append(-1)
+            else:
+                symbol.append(parents[r])
+                rest = children[r]
+                need.append(rest[d] if d < len(rest) else -1)
+            order.append(tick())
+            agenda.append(arc)
+            if need[arc] >= 0:
+                waiting.setdefault((e, need[arc]), []).append(arc)
+            return arc
+
+        def complete(arc):
+            # extends arc with the chart arcs where it ends, and so on
+            stack = [arc]
+            while stack:
+                arc = stack.pop()
+                if need[arc] < 0:
+                    continue
+                for key in starting.get((end[arc], need[arc]), ()):
+                    extended = add(
+                        rule[arc], start[arc], end[key], dot[arc] + 1,
+                        arc, key)
+                    if extended >= 0:
+                        stack.append(extended)
+
+        if tags is None:
+            tags = [None] * size
+        for index, (token, allowed) in enumerate(zip(tokens, tags)):
+            if allowed is None:
+                terminals = lexicon.terminals(token)
+            else:
+                terminals = Agenda._tagged(lexicon, token, allowed)
+            for terminal in terminals:
+                words.append((self._symbols.get(terminal.pos, -1), terminal))
+                add(-len(words), index, index + 1, 1, -1, -1)
+        # a part of speech the lexicon or tags can assign is one word
+        remaining = self._suffixes(frozenset(
+            lexicon.parts_of_speech |
+            {terminal.pos for _, terminal in words}))
+        while True:
+            if stop is not None and stop():
+                raise ParseCancelled('Parse cancelled.')
+            try:
+                # choose the first complete arc, moving incomplete arcs
+                # from the front of the agenda to its end
+                iterations = len(agenda)
+                iteration = 0
+                while True:
+                    current = agenda.popleft()
+                    if need[current] < 0:
+                        break
+                    order[current] = tick()
+                    agenda.append(current)
+                    iteration += 1
+                    if iteration > iterations:
+                        raise ValueError('Agenda exhausted, no parse found.')
+            except (IndexError, ValueError):
+                # arcs that missed chart arcs found before them are
+                # caught up once before the parse gives up
+                if not complete_from_chart:
+                    complete_from_chart = True
+                    count = len(agenda)
+                    for arc in list(agenda):
+                        if dot[arc]:
+                            complete(arc)
+                    if len(agenda) > count:
+                        continue
+                raise
+            key = (rule[current], start[current], end[current])
+            if key in found:
+                continue
+            found[key] = current
+            current_symbol = symbol[current]
+            current_start = start[current]
+            current_end = end[current]
+            starting.setdefault(
+                (current_start, current_symbol), []).append(current)
+            if current_symbol == self.start and current_start == 0 and \
+                    current_end == size:
+                sentence = current
+            for r in predicted.get(current_symbol, ()):
+                add(r, current_start, current_start, 0, -1, -1)
+            # extend waiting arcs in the order they stand in the agenda
+            extendable = waiting.get((current_start, current_symbol), ())
+            for arc in sorted(extendable, key=order.__getitem__):
+                extended = add(
+                    rule[arc], start[arc], current_end, dot[arc] + 1,
+                    arc, current)
+                if complete_from_chart and extended >= 0:
+                    complete(extended)
+            if sentence >= 0:
+                return self._tree(sentence, rule, base, child, words)
+
+    def _tree(self, arc, rule, base, child, words):
+        """ Returns the parse under given arc as a string.
+        Args:
+            arc (int) : arc to start from
+            rule (list of int) : rule of each arc
+            base (list of int) : arc each arc was extended from
+            child (list of int) : arc each arc was extended with
+            words (list of tuples) : symbol and terminal of terminal rules
+        Returns:
+            str : parse under arc
+        """
+        if rule[arc] < 0:
+            terminal = words[-rule[arc] - 1][1]
+            return '[.{} {}]'.format(terminal.pos, terminal.token)
+        parts = []
+        node = arc
+        while base[node] >= 0:
+            parts.append(self._tree(child[node], rule, base, child, words))
+            node = base[node]
+        name = self._names[self._parents[rule[arc]]]
+        return '[.{} {}]'.format(name, ''.join(reversed(parts)))
+
+
+def compiled():
+    """ Returns the compiled Core class, or None if the _speedups
+    extension was not built.
+    Returns:
+        type : compiled Core class, or None
+    """
+    return None if _speedups is None else _speedups.Core
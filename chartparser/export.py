@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+
+"""
+Kathryn Egan
+
+The ChartWriter streams every complete arc of a chart to a file of JSON
+lines as the arc is added, so the charts of a whole corpus never have to be
+held in memory at once. Each sentence is written as a header, one line per
+arc or further derivation of an arc, and a footer naming the arc of the
+parse, if any:
+
+    {"sentence":0,"tokens":["I","SLEEP"]}
+    {"rule":0,"text":"I : PN","weight":1.0}
+    {"arc":0,"rule":0,"start":0,"end":1,"cost":1.0,"children":[]}
+    ...
+    {"arc":4,"children":[2,3]}
+    {"parse":4}
+
+Rules are written once per file and referred to by id. Arcs are numbered
+from 0 in each sentence and refer to their children by number. The
+ChartReader reads a file back one sentence at a time as a Forest, which
+builds arcs from the file only as they are asked for.
+"""
+import json
+from chartparser.arc import Arc
+from chartparser.rule import NonTerminal, Terminal
+
+
+def _key(arc):
+    """ Returns the key identifying given arc regardless of its history.
+    Args:
+        arc (Arc) : arc to identify
+    Returns:
+        tuple : rule, start and end of arc
+    """
+    return arc.rule, arc.start, arc.end
+
+
+class ChartWriter:
+
+    def __init__(self, f):
+        """ Initializes writer onto given IO stream.
+        Args:
+            f (IOBase) : any writable text IO stream
+        """
+        self._f = f
+        self._rules = {}
+        self._ids = {}
+        self.sentences = 0
+        self.parsed = 0
+        self.failed = 0
+
+    def run(self, parser, sentences):
+        """ Parses every given sentence with given parser, writing the
+        whole chart of each. Sentences that cannot be parsed are counted
+        as failed; their charts are still written.
+        Args:
+            parser (Parser) : parser to parse with
+            sentences (iterable of str) : corpus to parse
+        Returns:
+            ChartWriter : this writer
+        """
+        for sentence in sentences:
+            try:
+                parser.parse_chart(sentence, writer=self)
+            except (KeyError, IndexError, ValueError):
+                self.failed += 1
+            else:
+                self.parsed += 1
+        return self
+
+    def begin(self, tokens):
+        """ Writes the header of a new sentence.
+        Args:
+            tokens (list of str) : tokenized sentence
+        """
+        self._ids = {}
+        self._write({'sentence': self.sentences, 'tokens': list(tokens)})
+
+    def added(self, arc, children):
+        """ Writes an arc newly added to the chart.
+        Args:
+            arc (Arc) : complete arc
+            children (tuple of tuples) : keys of the children of arc
+        """
+        rule = self._rule(arc.rule)
+        self._write({
+            'arc': self._id(_key(arc)), 'rule': rule,
+            'start': arc.start, 'end': arc.end, 'cost': arc.cost,
+            'children': [self._id(child) for child in children]})
+
+    def derived(self, arc, children):
+        """ Writes a further derivation of an arc already in the chart.
+        Args:
+            arc (Arc) : complete arc found again
+            children (tuple of tuples) : keys of the children of arc
+        """
+        self._write({
+            'arc': self._id(_key(arc)),
+            'children': [self._id(child) for child in children]})
+
+    def end(self, chart):
+        """ Writes the footer of the current sentence.
+        Args:
+            chart (Chart) : chart of the sentence
+        """
+        parse = None
+        if chart.is_sentence:
+            parse = self._id(_key(chart.sentence))
+        self._write({'parse': parse})
+        self.sentences += 1
+
+    def _id(self, key):
+        """ Returns the number of the arc with given key in the current
+        sentence, numbering it if it has not been seen.
+        Args:
+            key (tuple) : rule, start and end of arc
+        Returns:
+            int : number of arc
+        """
+        return self._ids.setdefault(key, len(self._ids))
+
+    def _rule(self, rule):
+        """ Returns the id of given rule, writing the rule the first time
+        it is seen.
+        Args:
+            rule (Rule) : rule of an arc
+        Returns:
+            int : id of rule
+        """
+        if rule not in self._rules:
+            self._rules[rule] = len(self._rules)
+            self._write({
+                'rule': self._rules[rule], 'text': str(rule),
+                'weight': rule.weight})
+        return self._rules[rule]
+
+    def _write(self, record):
+        """ Writes given record as one line of JSON.
+        Args:
+            record (dict) : record to write
+        """
+        self._f.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+
+class ChartReader:
+
+    def __init__(self, f):
+        """ Initializes reader on given IO stream written by a ChartWriter.
+        Args:
+            f (IOBase) : any IO stream
+        """
+        self._f = f
+        self._rules = {}
+
+    def __iter__(self):
+        """ Provides iterator over the sentences in the stream, reading
+        each only when it is reached. Raises ValueError if a line is not
+        a record written by a ChartWriter.
+        Yields:
+            Forest : chart of one sentence
+        """
+        forest = None
+        for line in self._f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                if 'sentence' in record:
+                    forest = Forest(record['tokens'])
+                elif 'arc' in record:
+                    forest._record(record, self._rules)
+                elif 'rule' in record:
+                    self._rules[record['rule']] = self._read_rule(record)
+                elif 'parse' in record:
+                    forest._root = record['parse']
+                    yield forest
+                    forest = None
+                else:
+                    raise ValueError
+            except (AttributeError, KeyError, ValueError):
+                raise ValueError('Failed on {}.'.format(line.strip()))
+
+    @staticmethod
+    def _read_rule(record):
+        """ Returns the rule written in given record.
+        Args:
+            record (dict) : rule record
+        Returns:
+            Rule : NonTerminal or Terminal
+        """
+        text = record['text']
+        if '-->' in text:
+            rule = NonTerminal.from_string(text)
+        else:
+            rule = Terminal.from_string(text)
+        rule.weight = record['weight']
+        return rule
+
+
+class Forest:
+
+    def __init__(self, tokens):
+        """ Initializes empty forest for given tokens. Forests are filled
+        by a ChartReader. Like a Chart, a forest holds the complete arcs of
+        a sentence and every derivation of each.
+        Args:
+            tokens (list of str) : tokenized sentence
+        """
+        self._tokens = tokens
+        self._nodes = {}
+        self._arcs = {}
+        self._ids = {}
+        self._root = None
+
+    @property
+    def tokens(self):
+        """ Tokenized sentence for this forest.
+        Returns:
+            list of str : tokens in sentence
+        """
+        return self._tokens
+
+    @property
+    def sentence(self):
+        """ Arc representing a parsed sentence for this forest.
+        Returns:
+            Arc : arc representing a parsed sentence, or None
+        """
+        if self._root is None:
+            return None
+        return self._arc(self._root)
+
+    @property
+    def is_sentence(self):
+        """ Returns whether this forest contains a complete sentence.
+        Returns:
+            bool : True if forest contains complete sentence, False otherwise
+        """
+        return self._root is not None
+
+    def derivations(self, arc):
+        """ Returns every way of deriving given arc, the first being the
+        arc's own history. Raises KeyError if the arc is not in the forest.
+        Args:
+            arc (Arc) : arc in this forest
+        Returns:
+            list of tuples of Arcs : children of arc in each derivation
+        """
+        node = self._ids[_key(arc)]
+        return [
+            tuple(self._arc(child) for child in children)
+            for children in self._nodes[node][4]
+            if all(child in self._nodes for child in children)]
+
+    def tree(self, arc=None):
+        """ Returns the parse under given arc as a string, following the
+        history of every arc.
+        Args:
+            arc (Arc) : arc to start from, by default the sentence
+        Returns:
+            str : parse under arc
+        """
+        arc = self.sentence if arc is None else arc
+        if arc.rule.is_terminal:
+            return '[.{} {}]'.format(arc.rule.parent, arc.rule.first)
+        children = ''.join(self.tree(child) for child in arc.history)
+        return '[.{} {}]'.format(arc.rule.parent, children)
+
+    def _record(self, record, rules):
+        """ Stores an arc or derivation record from the stream.
+        Args:
+            record (dict) : arc record
+            rules (dict of int to Rule) : rules read so far
+        """
+        children = tuple(record['children'])
+        if 'rule' in record:
+            self._nodes[record['arc']] = [
+                rules[record['rule']], record['start'], record['end'],
+                record['cost'], [children]]
+        else:
+            self._nodes[record['arc']][4].append(children)
+
+    def _arc(self, node):
+        """ Returns the arc with given number, building it and the arcs
+        of its history the first time it is asked for.
+        Args:
+            node (int) : number of arc
+        Returns:
+            Arc : complete arc
+        """
+        if node in self._arcs:
+            return self._arcs[node]
+        rule, start, end, cost, derivations = self._nodes[node]
+        arc = Arc(rule, start, end, len(rule) - 1, cost=cost)
+        self._arcs[node] = arc
+        self._ids[_key(arc)] = node
+        if not rule.is_terminal:
+            arc.history = [self._arc(child) for child in derivations[0]]
+        return arc
+
+    def __iter__(self):
+        """ Provides iterator on the arcs of this forest in the order
+        they were added to the chart. """
+        for node in self._nodes:
+            yield self._arc(node)
+
+    def __len__(self):
+        """ Returns the number of tokens in the sentence for this forest. """
+        return len(self._tokens)
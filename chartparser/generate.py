@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+
+"""
+Kathryn Egan
+
+The Generator samples sentences that a grammar and lexicon can parse, e.g.
+to build corpora for load testing or to check that the parser finds a parse
+for every sentence it should. Rules are chosen with probability in
+proportion to exp(-weight), so a grammar whose weights are negative log
+probabilities is sampled by those probabilities and a grammar with default
+weights is sampled uniformly. Rules are only chosen if they can finish
+within the depth bound, and sentences outside the length bounds, or with
+more parses than the ambiguity bound, are drawn again. The same seed always
+gives the same sentences.
+"""
+import math
+import random
+
+
+class Generator:
+
+    def __init__(
+            self, grammar, lexicon, start='S', seed=None, max_depth=10,
+            min_length=1, max_length=20, max_parses=None):
+        """ Initializes generator for given grammar and lexicon. Raises
+        ValueError if no sentence can be generated within the depth bound.
+        Args:
+            grammar (Grammar) : grammar to generate from
+            lexicon (Lexicon) : lexicon to choose words from
+            start (str) : symbol representing a sentence
+            seed (int) : seed of the random generator, None for any
+            max_depth (int) : maximum depth of the tree of a sentence
+            min_length (int) : minimum number of words per sentence
+            max_length (int) : maximum number of words per sentence
+            max_parses (int) :
+                maximum number of parses per sentence, None for any;
+                sentences are parsed exhaustively to count them
+        """
+        grammar = grammar.snapshot()
+        self.start = start
+        self.max_depth = max_depth
+        self.min_length = min_length
+        self.max_length = max_length
+        self.max_parses = max_parses
+        self._parser = None
+        if max_parses is not None:
+            # imported here so generating without the bound parses nothing
+            from chartparser.parser import Parser
+            self._parser = Parser(grammar, lexicon.snapshot())
+        self._random = random.Random(seed)
+        # sorted so that a seed gives the same sentences in every process
+        self._rules = {
+            parent: sorted(rules)
+            for parent, rules in grammar._byparent.items()}
+        self._words = {}
+        for word in sorted(lexicon):
+            for terminal in lexicon.terminals(word):
+                self._words.setdefault(terminal.pos, []).append(terminal)
+        self._depths = self._min_depths()
+        if self._depths.get(start, math.inf) > max_depth:
+            raise ValueError(
+                'No sentence within depth {}.'.format(max_depth))
+
+    def _min_depths(self):
+        """ Returns the least depth of tree under which each symbol can
+        be rewritten as words; parts of speech have depth 0.
+        Returns:
+            dict of str to int : least depth by symbol
+        """
+        depths = dict.fromkeys(self._words, 0)
+        changed = True
+        while changed:
+            changed = False
+            for parent, rules in self._rules.items():
+                for rule in rules:
+                    depth = 1 + max(
+                        depths.get(child, math.inf) for child in rule.children)
+                    if depth < depths.get(parent, math.inf):
+                        depths[parent] = depth
+                        changed = True
+        return depths
+
+    def _choose(self, options):
+        """ Returns one of the given rules, with probability in proportion
+        to exp(-weight).
+        Args:
+            options (list of Rules) : rules to choose from
+        Returns:
+            Rule : chosen rule
+        """
+        best = min(rule.weight for rule in options)
+        weights = [math.exp(best - rule.weight) for rule in options]
+        return self._random.choices(options, weights)[0]
+
+    def _expand(self, symbol, depth):
+        """ Returns a random tree under given symbol that can be no deeper
+        than the given depth.
+        Args:
+            symbol (str) : category to expand
+            depth (int) : maximum depth of tree
+        Returns:
+            tuple : (words, parse) of the tree
+        """
+        options = [
+            rule for rule in self._rules.get(symbol, ())
+            if all(self._depths.get(child, math.inf) < depth
+                   for child in rule.children)]
+        if symbol in self._words:
+            options.extend(self._words[symbol])
+        rule = self._choose(options)
+        if rule.is_terminal:
+            return [rule.token], '[.{} {}]'.format(rule.pos, rule.token)
+        words = []
+        parses = []
+        for child in rule.children:
+            child_words, parse = self._expand(child, depth - 1)
+            words.extend(child_words)
+            parses.append(parse)
+        return words, '[.{} {}]'.format(symbol, ''.join(parses))
+
+    def generate(self, attempts=1000):
+        """ Returns a random sentence within the length and ambiguity
+        bounds along with the parse it was generated from. Raises
+        ValueError if no sentence within the bounds is drawn in the given
+        number of attempts.
+        Args:
+            attempts (int) : maximum number of sentences to draw
+        Returns:
+            tuple of (str, str) : sentence and its parse
+        """
+        for _ in range(attempts):
+            words, parse = self._expand(self.start, self.max_depth)
+            if not self.min_length <= len(words) <= self.max_length:
+                continue
+            sentence = ' '.join(words).lower()
+            if self._parser is not None and not self._parses_within(sentence):
+                continue
+            return sentence, parse
+        raise ValueError(
+            'No sentence of {} to {} words in {} attempts.'.format(
+                self.min_length, self.max_length, attempts))
+
+    def _parses_within(self, sentence):
+        """ Returns whether given sentence has no more parses than the
+        ambiguity bound.
+        Args:
+            sentence (str) : generated sentence
+        Returns:
+            bool : True if sentence is within bound, False otherwise
+        """
+        try:
+            count = self._parser.count_parses(sentence)
+        except ValueError:
+            # endlessly many parses
+            return False
+        return count <= self.max_parses
+
+    def write(self, f, count):
+        """ Writes the given number of random sentences to given IO stream,
+        one per line, without keeping them.
+        Args:
+            f (IOBase) : any writable text IO stream
+            count (int) : number of sentences
+        """
+        for _ in range(count):
+            sentence, _ = self.generate()
+            f.write(sentence + '\n')
+
+    def __iter__(self):
+        """ Provides endless iterator over random sentences. """
+        while True:
+            yield self.generate()[0]
@@ -5,14 +5,17 @@ Kathryn Egan
 
 The GUI uses tkinter to provide a user interface for the parser, grammar,
 and lexicon. User can import lexica and grammars or add rules one at a time.
-Sentences can be parsed on the fly.
+Sentences can be parsed on the fly on a background thread, so the window
+stays responsive and a slow parse can be cancelled.
 """
+import queue
+import threading
 from tkinter import *
 from tkinter import ttk
 from tkinter import messagebox
 from tkinter import simpledialog
 from tkinter import filedialog
-from chartparser.parser import Parser
+from chartparser.parser import Parser, ParseCancelled
 from chartparser.language import Grammar, Lexicon
 
 
@@ -23,6 +26,12 @@ class GUI:
         self.root = root
         self.grammar = Grammar()
         self.lexicon = Lexicon()
+        # parses snapshots of the current grammar and lexicon, so the
+        # same parser serves every click
+        self.parser = Parser(self.grammar, self.lexicon)
+        self._results = queue.Queue()
+        self._cancel = None
+        self._chart = None
         self.root.title("Interactive Chart Parser")
         self.mainframe = ttk.Frame(self.root, padding='3 3 12 12')
         self.mainframe.grid(column=0, row=0, sticky=(N, W, E, S))
@@ -51,9 +60,21 @@ class GUI:
             command=self.search).grid(column=1, row=8, sticky=W)
         self.sentence = ttk.Entry(self.mainframe, width=15)
         self.sentence.grid(column=2, row=5, columnspan=2, sticky=(W, E))
-        ttk.Button(
+        self.parse_button = ttk.Button(
             self.mainframe, text='Parse', width=15,
-            command=self.parse_sentence).grid(column=3, row=6, sticky=E)
+            command=self.parse_sentence)
+        self.parse_button.grid(column=3, row=6, sticky=E)
+        self.chart_button = ttk.Button(
+            self.mainframe, text='Show Chart', width=15,
+            command=self.show_chart, state='disabled')
+        self.chart_button.grid(column=2, row=6, sticky=E)
+        self.progress = ttk.Progressbar(
+            self.mainframe, mode='indeterminate')
+        self.progress.grid(column=1, row=7, columnspan=2, sticky=(W, E))
+        self.cancel_button = ttk.Button(
+            self.mainframe, text='Cancel', width=15,
+            command=self.cancel_parse, state='disabled')
+        self.cancel_button.grid(column=3, row=7, sticky=E)
         ttk.Button(
             self.mainframe, text='Exit', width=10,
             command=exit).grid(column=3, row=8, sticky=E)
@@ -62,8 +83,6 @@ class GUI:
             column=1, row=5, sticky=E)
         ttk.Label(
             self.mainframe, text='').grid(column=1, row=3, sticky=E)
-        ttk.Label(
-            self.mainframe, text='').grid(column=1, row=7, sticky=E)
         # add padding around every widget
         for child in self.mainframe.winfo_children():
             child.grid_configure(padx=5, pady=5)
@@ -93,27 +112,73 @@ class GUI:
         return '\n'.join(items[:20] + ['...'] + [items[-1]])
 
     def parse_sentence(self):
-        """ Parse sentence that is currently in sentence textbox.
+        """ Parse sentence that is currently in sentence textbox on a
+        background thread. Only one sentence is parsed at a time.
+        """
+        if not self.sentence or self._cancel is not None:
+            return
+        sentence = self.sentence.get()
+        self._cancel = threading.Event()
+        threading.Thread(
+            target=self._parse_worker, args=(sentence, self._cancel),
+            daemon=True).start()
+        self.parse_button.state(['disabled'])
+        self.cancel_button.state(['!disabled'])
+        self.progress.start()
+        self.root.after(50, self._check_parse)
+
+    def _parse_worker(self, sentence, cancel):
+        """ Parses given sentence and puts the outcome on the results
+        queue for the main thread. Runs on a background thread, so it
+        must not touch any widgets. """
+        try:
+            parse, chart = self.parser.parse_chart(sentence, cancel=cancel)
+        except Exception as e:
+            self._results.put((sentence, None, None, e))
+        else:
+            self._results.put((sentence, parse, chart, None))
+
+    def _check_parse(self):
+        """ Polls the results queue until the parse is finished.
         Displays a single possible parse in message window.
         Displays error message if there are words in the sentence
         that are not in the lexicon, or if there is no grammar imported,
         or if no parse is found.
         """
-        if not self.sentence:
-            return
-        sentence = self.sentence.get()
-        parser = Parser(self.grammar, self.lexicon)
         try:
-            parse = parser.parse(sentence)
-        except KeyError:
+            sentence, parse, chart, error = self._results.get_nowait()
+        except queue.Empty:
+            self.root.after(50, self._check_parse)
+            return
+        self.progress.stop()
+        self.parse_button.state(['!disabled'])
+        self.cancel_button.state(['disabled'])
+        self._cancel = None
+        if isinstance(error, ParseCancelled):
+            return
+        elif isinstance(error, KeyError):
             messagebox.showerror('ERROR', 'Unknown words or punctuation.')
-        except IndexError:
+        elif isinstance(error, IndexError):
             messagebox.showerror('ERROR', 'No grammar.')
-        except ValueError:
+        elif isinstance(error, ValueError):
             messagebox.showerror('ERROR', 'No parse.')
+        elif error is not None:
+            messagebox.showerror('ERROR', str(error))
         else:
+            self._chart = chart
+            self.chart_button.state(['!disabled'])
             messagebox.showinfo(sentence, parse)
 
+    def show_chart(self):
+        """ Show the chart of the last parsed sentence in a new window. """
+        if self._chart is not None:
+            ChartViewer(self.root, self._chart)
+
+    def cancel_parse(self):
+        """ Asks the parse in progress to stop. """
+        if self._cancel is not None:
+            self._cancel.set()
+
     def import_lexicon(self):
         """ Import a lexicon. """
         self._import(self.lexicon)
@@ -143,9 +208,11 @@ class GUI:
             pos = self._prompt('a part of speech')
         except ValueError:
             return
-        word = word.strip().upper()
-        pos = pos.strip().upper()
-        self.lexicon.add(word, pos)
+        try:
+            self.lexicon.extend([(word, pos)])
+        except ValueError as e:
+            messagebox.showerror(
+                'ERROR', 'Failed to add given entry to lexicon.\n{}'.format(e))
 
     def add_grammar_rule(self):
         """ Prompts user to add a rule to the grammar. """
@@ -155,10 +222,10 @@ class GUI:
         except ValueError:
             return
         try:
-            self.grammar.add(parent, children)
-        except ValueError:
+            self.grammar.extend([(parent, children)])
+        except ValueError as e:
             messagebox.showerror(
-                'ERROR', 'Failed to add given rule to grammar.')
+                'ERROR', 'Failed to add given rule to grammar.\n{}'.format(e))
 
     def _prompt(self, name):
         """ Generic looped prompt to get user to give input.
@@ -182,12 +249,12 @@ class GUI:
         if not word:
             return
         try:
-            pos = self.lexicon[word]
+            pos = self.lexicon.tags(word.strip().upper())
         except KeyError:
             messagebox.showerror('ERROR', '{} not found.'.format(word))
         else:
             messagebox.showinfo(
-                'POS for {}'.format(word.upper()), ', '.join(sorted(pos)))
+                'POS for {}'.format(word.upper()), ', '.join(pos))
 
     def exit(self):
         """ Exits program after prompting user to save
@@ -201,6 +268,140 @@ class GUI:
         mainframe.quit()
 
 
+class ChartViewer:
+
+    ROW = 18
+    COLUMN = 60
+    MARGIN = 10
+
+    def __init__(self, root, chart):
+        """ Initialize a window showing the arcs of the given chart, one arc
+        per row. Only the rows in view are drawn, so large charts stay
+        responsive. Arcs can be filtered by category and by span. """
+        self.chart = chart
+        self.arcs = list(chart)
+        self.window = Toplevel(root)
+        self.window.title('Chart ({} arcs)'.format(len(self.arcs)))
+        self.window.columnconfigure(0, weight=1)
+        self.window.rowconfigure(2, weight=1)
+        controls = ttk.Frame(self.window, padding='3 3 3 3')
+        controls.grid(column=0, row=0, columnspan=2, sticky=(W, E))
+        ttk.Label(controls, text='Category:').grid(column=0, row=0)
+        self.category = ttk.Entry(controls, width=8)
+        self.category.grid(column=1, row=0)
+        ttk.Label(controls, text='From:').grid(column=2, row=0)
+        self.start = ttk.Entry(controls, width=4)
+        self.start.grid(column=3, row=0)
+        ttk.Label(controls, text='To:').grid(column=4, row=0)
+        self.end = ttk.Entry(controls, width=4)
+        self.end.grid(column=5, row=0)
+        ttk.Button(
+            controls, text='Filter', command=self.filter).grid(
+            column=6, row=0)
+        self.count = ttk.Label(controls, text='')
+        self.count.grid(column=7, row=0, sticky=W)
+        for child in controls.winfo_children():
+            child.grid_configure(padx=3)
+        width = 2 * self.MARGIN + self.COLUMN * len(chart) + 200
+        self.header = Canvas(
+            self.window, height=self.ROW, background='white',
+            highlightthickness=0)
+        self.header.grid(column=0, row=1, sticky=(W, E))
+        self.canvas = Canvas(
+            self.window, width=min(width, 800), height=400,
+            background='white', highlightthickness=0,
+            yscrollincrement=self.ROW)
+        self.canvas.grid(column=0, row=2, sticky=(N, W, E, S))
+        yscroll = ttk.Scrollbar(
+            self.window, orient=VERTICAL, command=self.canvas.yview)
+        yscroll.grid(column=1, row=2, sticky=(N, S))
+        xscroll = ttk.Scrollbar(
+            self.window, orient=HORIZONTAL, command=self._xview)
+        xscroll.grid(column=0, row=3, sticky=(W, E))
+        self._yscroll = yscroll
+        self.canvas.configure(
+            yscrollcommand=self._on_yscroll, xscrollcommand=xscroll.set)
+        self.canvas.bind('<Configure>', lambda event: self._redraw())
+        self.canvas.bind('<MouseWheel>', self._on_wheel)
+        self.canvas.bind('<Button-4>', lambda event: self._scroll(-1))
+        self.canvas.bind('<Button-5>', lambda event: self._scroll(1))
+        self._width = width
+        for i, token in enumerate(chart.tokens):
+            x = self._x(i)
+            self.header.create_text(x, self.ROW // 2, text=str(i))
+            self.header.create_text(
+                x + self.COLUMN // 2, self.ROW // 2, text=token)
+        self.header.create_text(
+            self._x(len(chart)), self.ROW // 2, text=str(len(chart)))
+        self.header.configure(scrollregion=(0, 0, width, self.ROW))
+        self._layout()
+
+    def filter(self):
+        """ Keep only the arcs whose parent matches the category and which
+        lie within the span given in the filter boxes. Empty boxes match
+        every arc. """
+        category = self.category.get().strip().upper()
+        try:
+            start = int(self.start.get()) if self.start.get().strip() else 0
+            end = (int(self.end.get()) if self.end.get().strip()
+                   else len(self.chart))
+        except ValueError:
+            messagebox.showerror('ERROR', 'Span must be whole numbers.')
+            return
+        self.arcs = [
+            arc for arc in self.chart
+            if (not category or arc.rule.parent == category) and
+            start <= arc.start and arc.end <= end]
+        self.canvas.yview_moveto(0)
+        self._layout()
+
+    def _layout(self):
+        """ Size the scrollable area for the current arcs and redraw. """
+        self.count.configure(text='{} arcs'.format(len(self.arcs)))
+        height = max(1, len(self.arcs)) * self.ROW
+        self.canvas.configure(scrollregion=(0, 0, self._width, height))
+        self._redraw()
+
+    def _redraw(self):
+        """ Draw only the arcs in the rows currently in view. """
+        self.canvas.delete('arc')
+        top = self.canvas.canvasy(0)
+        bottom = self.canvas.canvasy(self.canvas.winfo_height())
+        first = max(0, int(top // self.ROW))
+        last = min(len(self.arcs), int(bottom // self.ROW) + 1)
+        for row in range(first, last):
+            arc = self.arcs[row]
+            y = row * self.ROW + self.ROW // 2
+            self.canvas.create_line(
+                self._x(arc.start), y, self._x(arc.end), y,
+                width=3, tags='arc')
+            self.canvas.create_text(
+                self._x(arc.end) + 6, y, text=str(arc.rule),
+                anchor=W, tags='arc')
+
+    def _x(self, index):
+        """ Returns the horizontal position of given token boundary. """
+        return self.MARGIN + index * self.COLUMN
+
+    def _xview(self, *args):
+        """ Scroll the chart and its header horizontally together. """
+        self.canvas.xview(*args)
+        self.header.xview(*args)
+
+    def _on_yscroll(self, first, last):
+        """ Update the scrollbar and draw the rows now in view. """
+        self._yscroll.set(first, last)
+        self._redraw()
+
+    def _on_wheel(self, event):
+        """ Scroll with the mouse wheel. """
+        self._scroll(-1 if event.delta > 0 else 1)
+
+    def _scroll(self, units):
+        """ Scroll by given number of rows. """
+        self.canvas.yview_scroll(units * 3, 'units')
+
+
 def main():
     """ Main loop for user interface. """
     root = Tk()
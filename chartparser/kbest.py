@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+
+"""
+Kathryn Egan
+
+KBest enumerates the parses of an exhaustively parsed chart in order of cost
+without building every parse first. It follows the lazy algorithm of Huang
+and Chiang (2005): the best derivation of every arc is found bottom-up, and
+the next best derivation of an arc is only worked out when it is asked for,
+from the neighbors of the derivations already found. Asking for k parses
+costs little more than asking for one.
+"""
+import heapq
+
+
+def _key(arc):
+    """ Returns the key identifying given arc regardless of its history.
+    Args:
+        arc (Arc) : arc to identify
+    Returns:
+        tuple : rule, start and end of arc
+    """
+    return arc.rule, arc.start, arc.end
+
+
+def derivations(chart, arcs):
+    """ Returns the rule and derivations of every arc under the given arcs
+    in given chart, children before parents. Raises ValueError if an arc
+    can derive itself, e.g. through a cycle of unary rules.
+    Args:
+        chart (Chart) : chart to read derivations from, or Forest
+        arcs (iterable of Arcs) : arcs to start from
+    Returns:
+        dict of tuple to tuple :
+            rule of arc and keys of the children in each derivation of arc,
+            by key of arc in order
+    """
+    found = {}
+    active = set()
+    for arc in arcs:
+        stack = [(arc, None)]
+        while stack:
+            arc, edges = stack.pop()
+            key = _key(arc)
+            if edges is not None:
+                active.discard(key)
+                found[key] = (arc.rule, edges)
+                continue
+            if key in found:
+                continue
+            if key in active:
+                raise ValueError('Chart has a cycle at {}.'.format(arc.rule))
+            active.add(key)
+            edges = [
+                tuple(_key(child) for child in children)
+                for children in chart.derivations(arc)]
+            stack.append((arc, edges))
+            for children in chart.derivations(arc):
+                for child in children:
+                    if _key(child) in active:
+                        raise ValueError(
+                            'Chart has a cycle at {}.'.format(child.rule))
+                    if _key(child) not in found:
+                        stack.append((child, None))
+    return found
+
+
+class KBest:
+
+    def __init__(self, chart):
+        """ Initializes k-best enumeration over given chart, finding the
+        best derivation of every arc under the sentence. Raises ValueError
+        if the chart has no parse or if an arc can derive itself, e.g.
+        through a cycle of unary rules, since its parses are then endless.
+        Args:
+            chart (Chart) : exhaustively parsed chart, or Forest read back
+        """
+        if not chart.is_sentence:
+            raise ValueError('Chart has no parse.')
+        self._root = _key(chart.sentence)
+        self._rules = {}
+        self._edges = {}
+        self._found = {}
+        self._candidates = {}
+        self._seen = {}
+        for key, (rule, edges) in derivations(chart, [chart.sentence]).items():
+            self._rules[key] = rule
+            self._edges[key] = edges
+            self._found[key] = []
+            self._seen[key] = set()
+            self._candidates[key] = []
+            for edge, children in enumerate(self._edges[key]):
+                ranks = (0,) * len(children)
+                self._push(key, edge, ranks)
+            self._next(key)
+
+    def _push(self, key, edge, ranks):
+        """ Adds the derivation of given arc through given edge, using the
+        child derivations of given ranks, to the arc's candidates if every
+        child has a derivation of that rank.
+        Args:
+            key (tuple) : key of arc
+            edge (int) : index of derivation of arc
+            ranks (tuple of int) : rank of derivation used for each child
+        """
+        if (edge, ranks) in self._seen[key]:
+            return
+        self._seen[key].add((edge, ranks))
+        cost = self._rules[key].weight
+        for child, rank in zip(self._edges[key][edge], ranks):
+            found = self._kth(child, rank)
+            if found is None:
+                return
+            cost += found[0]
+        heapq.heappush(self._candidates[key], (cost, edge, ranks))
+
+    def _next(self, key):
+        """ Moves the best candidate of given arc to its found derivations.
+        Args:
+            key (tuple) : key of arc
+        Returns:
+            bool : True if a derivation was found, False if none are left
+        """
+        if not self._candidates[key]:
+            return False
+        self._found[key].append(heapq.heappop(self._candidates[key]))
+        return True
+
+    def _kth(self, key, k):
+        """ Returns the derivation of given arc of given rank, working out
+        derivations up to it as needed.
+        Args:
+            key (tuple) : key of arc
+            k (int) : rank of derivation, 0 for the best
+        Returns:
+            tuple : (cost, edge, ranks) of derivation, or None if the arc
+            has fewer derivations
+        """
+        found = self._found[key]
+        if not found:
+            return None
+        while len(found) <= k:
+            # the next best is a candidate or a neighbor of the last found
+            _, edge, ranks = found[-1]
+            for i in range(len(ranks)):
+                self._push(
+                    key, edge, ranks[:i] + (ranks[i] + 1,) + ranks[i + 1:])
+            if not self._next(key):
+                return None
+        return found[k]
+
+    def _tree(self, key, k):
+        """ Returns the parse of the derivation of given arc of given rank.
+        Args:
+            key (tuple) : key of arc
+            k (int) : rank of derivation
+        Returns:
+            str : parse as a string
+        """
+        rule = self._rules[key]
+        if rule.is_terminal:
+            return '[.{} {}]'.format(rule.parent, rule.first)
+        _, edge, ranks = self._found[key][k]
+        return '[.{} {}]'.format(rule.parent, ''.join(
+            self._tree(child, rank)
+            for child, rank in zip(self._edges[key][edge], ranks)))
+
+    def __iter__(self):
+        """ Provides iterator over the parses of the chart, cheapest first.
+        Yields:
+            tuple of (str, float) : parse and its cost
+        """
+        k = 0
+        while True:
+            found = self._kth(self._root, k)
+            if found is None:
+                return
+            yield self._tree(self._root, k), found[0]
+            k += 1
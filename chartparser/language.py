@@ -6,11 +6,187 @@ Kathryn Egan
 Language is a super class that provides some standard functionality to
 Grammar and Lexicon, which are two similar but distinct aspects of language:
 grammar consists of nonterminal rules, while the lexicon of terminal rules.
+
+Both dictionaries are immutable and are published together as a single
+version, so a language can be read from many threads while it is updated:
+every update copies what it changes and swaps in the new version at once,
+and a snapshot keeps reading the version it was taken from. Indexes derived
+from a version, such as the unary closure of a grammar, are cached with it.
 """
+import heapq
+import io
+import math
+import threading
+from array import array
+from collections import OrderedDict
+from types import MappingProxyType
 from chartparser.rule import Terminal, NonTerminal
 
 
-class Language:
+class LRUCache:
+    """ Keeps the most recently used values built for a bounded number of
+    keys, for indexes such as the fewest words of each parent that are
+    derived once for each set of parts of speech. Safe to share between
+    threads. """
+
+    def __init__(self, size):
+        """ Initializes an empty cache.
+        Args:
+            size (int) : most keys kept before the least recently used goes
+        """
+        if size < 1:
+            raise ValueError('Cache size must be positive, got {}.'.format(
+                size))
+        self.size = size
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._values)
+
+    def __contains__(self, key):
+        return key in self._values
+
+    def get(self, key, build):
+        """ Returns the value for given key, building and keeping it if it
+        is not kept, and dropping the least recently used key if the cache
+        is then over its size.
+        Args:
+            key (hashable) : key of value
+            build (callable) : function building the value
+        Returns:
+            object : value for key
+        """
+        with self._lock:
+            if key in self._values:
+                self._values.move_to_end(key)
+                return self._values[key]
+        value = build()
+        with self._lock:
+            value = self._values.setdefault(key, value)
+            self._values.move_to_end(key)
+            while len(self._values) > self.size:
+                self._values.popitem(last=False)
+        return value
+
+
+class LanguageMixin:
+    """ Behaviour shared by every language however it stores its rules:
+    building one from given rules, reloading it from its file, and
+    refusing changes once frozen. A language using it provides _rule,
+    _replace, snapshot, name and _frozen. """
+
+    @property
+    def frozen(self):
+        """ Returns whether this language is a read-only snapshot.
+        Returns:
+            bool : True if language cannot be changed, False otherwise
+        """
+        return self._frozen
+
+    def _check_mutable(self):
+        """ Raises TypeError if this language is frozen. """
+        if self._frozen:
+            raise TypeError('Cannot change a frozen {}.'.format(self.name))
+
+    @classmethod
+    def from_rules(cls, items):
+        """ Returns a frozen language of the given rules, built in one
+        pass without reading a file. Raises ValueError if a rule is
+        invalid or given twice.
+        Args:
+            items (iterable) : rules as Rules, strings or tuples, see _rule
+        Returns:
+            Language : frozen language of this class
+        """
+        language = cls()
+        language._replace(language._rules(items))
+        return language.snapshot()
+
+    def _rules(self, items):
+        """ Returns the given items as rules of this language. Raises
+        ValueError if an item is invalid or given twice.
+        Args:
+            items (iterable) : rules as Rules, strings or tuples
+        Returns:
+            list of Rules : rules in the order given
+        """
+        rules = []
+        seen = set()
+        for item in items:
+            try:
+                rule = self._rule(item)
+            except (TypeError, ValueError):
+                raise ValueError('Failed on {!r}.'.format(item))
+            if rule in seen:
+                raise ValueError('{} is given twice.'.format(rule))
+            seen.add(rule)
+            rules.append(rule)
+        return rules
+
+    def watch(self, path, interval=1.0):
+        """ Loads this language from the file at the given path and starts
+        a thread that reloads it whenever the file changes.
+        Args:
+            path (str) : path to grammar or lexicon file
+            interval (float) : seconds between checks of the file
+        Returns:
+            Watcher : started watcher, stop it with Watcher.stop
+        """
+        # imported here so hashing and polling are only loaded when used
+        from chartparser.watch import Watcher
+        watcher = Watcher(self, path, interval)
+        watcher.poll()
+        watcher.start()
+        return watcher
+
+
+class LexiconMixin:
+    """ Reading and converting the entries of a lexicon, shared by
+    Lexicon and CompactLexicon. """
+
+    @staticmethod
+    def read(f):
+        """ Reads entries from given IO stream without loading them.
+        Raises ValueError if any line is not a valid entry.
+        Args:
+            f (IOBase) : any IO stream
+        Returns:
+            list of Terminals : entries in stream
+        """
+        rules = []
+        for line in f.readlines():
+            if not line.strip():
+                continue
+            try:
+                rule = Terminal.from_string(line)
+            except ValueError:
+                raise ValueError('Failed on {}.'.format(line.strip()))
+            else:
+                rules.append(rule)
+        return rules
+
+    @staticmethod
+    def _rule(item):
+        """ Returns given item as an entry of this lexicon. Items are
+        Terminals, strings such as 'dog : N' or tuples of the word, the
+        part of speech and optionally the weight, e.g. ('dog', 'N').
+        Raises ValueError or TypeError if item is not a valid entry.
+        Args:
+            item (Terminal, str or tuple) : entry to convert
+        Returns:
+            Terminal : entry
+        """
+        if isinstance(item, Terminal):
+            return item
+        if isinstance(item, str):
+            return Terminal.from_string(item)
+        token, pos, *weight = item
+        return Terminal(
+            pos.strip(), token.strip(), weight=(weight or [1.0])[0])
+
+
+class Language(LanguageMixin):
     """ Super class for grammar and lexicon. """
 
     def __init__(self):
@@ -18,16 +194,161 @@ class Language:
         parsing and code handling, one organized by the first
         child mapped to rule, another organized by parent
         mapped to rule. """
-        self._bychild = {}
-        self._byparent = {}
+        self._lock = threading.Lock()
+        self._frozen = False
+        self._index = (MappingProxyType({}), MappingProxyType({}), 0, {})
+
+    @property
+    def _bychild(self):
+        return self._index[0]
+
+    @property
+    def _byparent(self):
+        return self._index[1]
+
+    @property
+    def version(self):
+        """ Returns the version of this language, which increases
+        every time a change is published.
+        Returns:
+            int : version of language
+        """
+        return self._index[2]
+
+    def _cached(self, name, build):
+        """ Returns the index of given name derived from the current
+        version of this language, building it on first use. The cache is
+        shared with every snapshot of the same version.
+        Args:
+            name (hashable) : name of derived index
+            build (callable) : function building the index from this language
+        Returns:
+            object : derived index
+        """
+        cache = self._index[3]
+        if name not in cache:
+            cache[name] = build()
+        return cache[name]
+
+    def snapshot(self):
+        """ Returns a frozen copy of the current version of this language.
+        The copy shares the immutable dictionaries of this language and is
+        not affected by later changes, so it is cheap and safe to share.
+        Returns:
+            Language : frozen language of the same class
+        """
+        if self._frozen:
+            return self
+        snapshot = self.__class__()
+        snapshot._index = self._index
+        snapshot._frozen = True
+        return snapshot
 
     def add(self, item):
-        """ Adds item to both dictionaries.
+        """ Adds item to both dictionaries by copying the entries it
+        changes and publishing them as a new version. Raises TypeError
+        if this language is frozen.
         Args:
             item (Rule) : rule to add
         """
-        self._bychild.setdefault(item.first, set()).add(item)
-        self._byparent.setdefault(item.parent, set()).add(item)
+        self.update(added=(item,))
+
+    def update(self, added=(), removed=()):
+        """ Adds and removes the given rules in one new version. Only
+        the entries for the first children and parents of the given rules
+        are copied and rebuilt, and nothing is published if no rule
+        changes. Raises TypeError if this language is frozen.
+        Args:
+            added (iterable of Rules) : rules to add
+            removed (iterable of Rules) : rules to remove
+        """
+        added = set(added)
+        removed = set(removed) - added
+        with self._lock:
+            self._check_mutable()
+            bychild, byparent, version, _ = self._index
+            added = {
+                rule for rule in added
+                if rule not in bychild.get(rule.first, ())}
+            removed = {
+                rule for rule in removed
+                if rule in bychild.get(rule.first, ())}
+            if not added and not removed:
+                return
+            self._index = (
+                self._updated(bychild, 'first', added, removed),
+                self._updated(byparent, 'parent', added, removed),
+                version + 1, {})
+
+    def extend(self, items):
+        """ Adds the given rules in one new version, building the entries
+        they change in one pass. Rules may be given as Rules, as strings
+        in the format of the file or as tuples, see _rule. Raises
+        ValueError if a rule is invalid, given twice or already in this
+        language, and TypeError if this language is frozen.
+        Args:
+            items (iterable) : rules to add
+        """
+        rules = self._rules(items)
+        with self._lock:
+            self._check_mutable()
+            bychild, byparent, version, _ = self._index
+            for rule in rules:
+                if rule in bychild.get(rule.first, ()):
+                    raise ValueError('{} is already in {}.'.format(
+                        rule, self.name))
+            if not rules:
+                return
+            self._index = (
+                self._updated(bychild, 'first', rules, ()),
+                self._updated(byparent, 'parent', rules, ()),
+                version + 1, {})
+
+    @staticmethod
+    def _updated(mapping, key, added, removed):
+        """ Returns a copy of given mapping with the sets under the keys
+        of the given rules rebuilt. Keys left with no rules are dropped.
+        Args:
+            mapping (MappingProxyType) : mapping of key to frozenset of Rules
+            key (str) : name of the rule attribute the mapping is keyed on
+            added (set of Rules) : rules to add
+            removed (set of Rules) : rules to remove
+        Returns:
+            MappingProxyType : updated copy of mapping
+        """
+        changes = {}
+        for rule in added:
+            changes.setdefault(getattr(rule, key), (set(), set()))[0].add(rule)
+        for rule in removed:
+            changes.setdefault(getattr(rule, key), (set(), set()))[1].add(rule)
+        copy = dict(mapping)
+        for value, (adds, removes) in changes.items():
+            rules = (copy.get(value, frozenset()) - removes) | adds
+            if rules:
+                copy[value] = rules
+            else:
+                del copy[value]
+        return MappingProxyType(copy)
+
+    def _replace(self, rules):
+        """ Replaces every rule in this language with given rules,
+        building both dictionaries before publishing them as a new
+        version. Raises TypeError if this language is frozen.
+        Args:
+            rules (iterable of Rules) : rules for this language
+        """
+        bychild = {}
+        byparent = {}
+        for rule in rules:
+            bychild.setdefault(rule.first, set()).add(rule)
+            byparent.setdefault(rule.parent, set()).add(rule)
+        bychild = {key: frozenset(value) for key, value in bychild.items()}
+        byparent = {key: frozenset(value) for key, value in byparent.items()}
+        with self._lock:
+            self._check_mutable()
+            self._index = (
+                MappingProxyType(bychild), MappingProxyType(byparent),
+                self._index[2] + 1, {})
 
     def __getitem__(self, child):
         """ Returns rule where given child is the first, e.g.
@@ -48,6 +369,9 @@ class Language:
 class Grammar(Language):
     """ Stores nonterminal rules in this language. """
 
+    # most sets of parts of speech whose min_yields are kept per version
+    YIELDS_CACHED = 32
+
     def __init__(self):
         """ Initializes grammar according to super class RuleDict. """
         Language.__init__(self)
@@ -57,22 +381,138 @@ class Grammar(Language):
     def grammar(self):
         return self._bychild
 
+    @property
+    def unary_closure(self):
+        """ Returns every chain of unary rules above each symbol, e.g.
+        (NBAR --> NS,) and (NP --> NS,) above NS. Chains never repeat a
+        symbol, and every chain follows the chains it extends.
+        Returns:
+            dict of str to tuple of tuples of NonTerminals :
+                chains of unary rules by the symbol at their bottom
+        """
+        return self._cached('unary_closure', self._unary_closure)
+
+    def min_yields(self, parts_of_speech=()):
+        """ Returns the fewest words each parent in this grammar can be
+        rewritten as, counting every symbol that is not a parent and every
+        given part of speech as one word. A parent that can never be
+        rewritten as words, e.g. one only found in cycles, yields math.inf.
+        Args:
+            parts_of_speech (iterable of str) :
+                parts of speech a lexicon or sentence can assign, which
+                yield one word even where they are also parents
+        Returns:
+            dict of str to int : fewest words by parent
+        """
+        # only parts of speech that are also parents change the yields,
+        # so the few sets of those are kept however many sets are given
+        parts = frozenset(
+            part for part in parts_of_speech if part in self._byparent)
+        cache = self._cached(
+            'min_yields', lambda: LRUCache(self.YIELDS_CACHED))
+        return cache.get(parts, lambda: self._min_yields(parts))
+
+    def _min_yields(self, parts):
+        """ Builds the fewest words of each parent by relaxing the rules
+        until no parent gets any shorter.
+        Args:
+            parts (frozenset of str) : parts of speech yielding one word
+        Returns:
+            dict of str to int : fewest words by parent
+        """
+        yields = dict.fromkeys(self._byparent, math.inf)
+        for part in parts & yields.keys():
+            yields[part] = 1
+        changed = True
+        while changed:
+            changed = False
+            for parent, rules in self._byparent.items():
+                for rule in rules:
+                    length = sum(
+                        yields.get(child, 1) for child in rule.children)
+                    if length < yields[parent]:
+                        yields[parent] = length
+                        changed = True
+        return yields
+
+    def _unary_closure(self):
+        """ Builds the unary closure of this grammar.
+        Returns:
+            dict of str to tuple of tuples of NonTerminals :
+                chains of unary rules by the symbol at their bottom
+        """
+        parents = {}
+        for rules in self._bychild.values():
+            for rule in rules:
+                if len(rule.children) == 1:
+                    parents.setdefault(rule.first, []).append(rule)
+        for rules in parents.values():
+            rules.sort()
+        closure = {}
+        for symbol in parents:
+            chains = []
+            stack = [((), (symbol,))]
+            while stack:
+                chain, seen = stack.pop()
+                # reversed so that chains come out in sorted order
+                for rule in reversed(parents.get(seen[-1], ())):
+                    if rule.parent not in seen:
+                        stack.append((chain + (rule,), seen + (rule.parent,)))
+                if chain:
+                    chains.append(chain)
+            closure[symbol] = tuple(chains)
+        return closure
+
     def load(self, f):
-        """ Loads grammar from given IO stream.
+        """ Loads grammar from given IO stream, replacing any rules
+        already in this grammar.
         Args:
             f (IOBase) : any IO stream
         """
-        self._bychild = {}
-        self._byparent = {}
+        self._replace(self.read(f))
+
+    @staticmethod
+    def read(f):
+        """ Reads rules from given IO stream without loading them.
+        Raises ValueError if any line is not a valid rule.
+        Args:
+            f (IOBase) : any IO stream
+        Returns:
+            list of NonTerminals : rules in stream
+        """
+        rules = []
         for line in f.readlines():
             if not line.strip():
                 continue
             try:
                 rule = NonTerminal.from_string(line)
             except ValueError:
-                raise ValueError('Failed on {}.'.format(rule))
+                raise ValueError('Failed on {}.'.format(line.strip()))
             else:
-                self.add(rule)
+                rules.append(rule)
+        return rules
+
+    @staticmethod
+    def _rule(item):
+        """ Returns given item as a rule of this grammar. Items are
+        NonTerminals, strings such as 'NP --> DT N' or tuples of the
+        parent, the children as a sequence or a string separated by
+        spaces, and optionally the weight, e.g. ('NP', ['DT', 'N'], 1.0).
+        Raises ValueError or TypeError if item is not a valid rule.
+        Args:
+            item (NonTerminal, str or tuple) : rule to convert
+        Returns:
+            NonTerminal : rule
+        """
+        if isinstance(item, NonTerminal):
+            return item
+        if isinstance(item, str):
+            return NonTerminal.from_string(item)
+        parent, children, *weight = item
+        if isinstance(children, str):
+            children = children.split()
+        return NonTerminal(
+            parent.strip(), *children, weight=(weight or [1.0])[0])
 
     def __len__(self):
         """ Returns the number of total rules in this RuleDict.
@@ -94,7 +534,7 @@ class Grammar(Language):
         return '\n'.join(output)
 
 
-class Lexicon(Language):
+class Lexicon(LexiconMixin, Language):
     """ Stores terminal rules in this language. """
 
     def __init__(self):
@@ -106,22 +546,53 @@ class Lexicon(Language):
     def lexicon(self):
         return self._bychild
 
+    def terminals(self, token):
+        """ Returns the terminals for given word in a fixed order, from a
+        table built once per version of this lexicon, so that the agenda
+        seeds the arcs of a word in the same order in every parse. The
+        arcs themselves are still made per parse, since each needs its
+        own span. Raises KeyError if the word is not in the lexicon.
+        Args:
+            token (str) : word to look up
+        Returns:
+            tuple of Terminals : terminals for word, sorted
+        """
+        return self._cached('terminals', self._terminals)[token]
+
+    def _terminals(self):
+        """ Builds the table of sorted terminals for every word.
+        Returns:
+            dict of str to tuple of Terminals : terminals by word
+        """
+        return {
+            token: tuple(sorted(terminals))
+            for token, terminals in self._bychild.items()}
+
+    def tags(self, token):
+        """ Returns the parts of speech of given word. Raises KeyError
+        if the word is not in the lexicon.
+        Args:
+            token (str) : word to look up
+        Returns:
+            tuple of str : parts of speech of word, sorted
+        """
+        return tuple(terminal.pos for terminal in self.terminals(token))
+
+    @property
+    def parts_of_speech(self):
+        """ Returns every part of speech in this lexicon.
+        Returns:
+            set of str : parts of speech
+        """
+        return set(self._byparent)
+
     def load(self, f):
-        """ Loads lexicon from given IO stream.
+        """ Loads lexicon from given IO stream, replacing any entries
+        already in this lexicon.
         Args:
             f (IOBase) : any IO stream
         """
-        self._bychild = {}
-        self._byparent = {}
-        for line in f.readlines():
-            if not line.strip():
-                continue
-            try:
-                rule = Terminal.from_string(line)
-            except ValueError:
-                raise ValueError('Failed on {}.'.format(rule))
-            else:
-                self.add(rule)
+        self._replace(self.read(f))
 
     def __len__(self):
         """ Returns the number of unique words in this lexicon.
@@ -141,3 +612,326 @@ class Lexicon(Language):
             for terminal in sorted(self.lexicon[token]):
                 output.append('{} : {}'.format(token, terminal.pos))
         return '\n'.join(output)
+
+
+class CompactLexicon(LexiconMixin, LanguageMixin):
+    """ Stores terminal rules in this language compactly, for vocabularies
+    too large to keep a set of Terminal objects per word. Words are kept
+    sorted in a single string with an array of offsets, and the parts of
+    speech of each word as a run of integer ids in a second array, with
+    the weight of each entry in a third. Looking up a word is a binary
+    search that compares O(log n) words rather than the O(len(word)) walk
+    of a trie, which would keep a node per character instead of one offset
+    per word. Terminal objects are only made for the words that are looked
+    up. The arrays of a version are never changed once built, so the same
+    snapshot and update rules as Language apply: any change builds new
+    arrays, merging the sorted changes into the old ones, and publishes
+    them at once. """
+
+    def __init__(self):
+        """ Initializes an empty compact lexicon. """
+        self.name = 'lexicon'
+        self._lock = threading.Lock()
+        self._frozen = False
+        # words, word offsets, tag ids, tag offsets, tag names, weights,
+        # version
+        self._table = (
+            '', array('L', [0]), array('H'), array('L', [0]), (),
+            array('d'), 0)
+
+    @property
+    def version(self):
+        """ Returns the version of this lexicon, which increases
+        every time a change is published.
+        Returns:
+            int : version of lexicon
+        """
+        return self._table[6]
+
+    def snapshot(self):
+        """ Returns a frozen copy of the current version of this lexicon,
+        sharing its arrays.
+        Returns:
+            CompactLexicon : frozen lexicon
+        """
+        if self._frozen:
+            return self
+        snapshot = CompactLexicon()
+        snapshot._table = self._table
+        snapshot._frozen = True
+        return snapshot
+
+    def load(self, f):
+        """ Loads lexicon from given IO stream, replacing any entries
+        already in this lexicon. Raises ValueError if any line is not
+        a valid entry.
+        Args:
+            f (IOBase) : any IO stream
+        """
+        entries = {}
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                terminal = Terminal.from_string(line)
+            except ValueError:
+                raise ValueError('Failed on {}.'.format(line.strip()))
+            entries.setdefault(
+                (terminal.token, terminal.pos), terminal.weight)
+        self._build(entries)
+
+    def add(self, item):
+        """ Adds given terminal in a new version. Each call copies the
+        arrays of the whole lexicon, so adding n words one at a time takes
+        O(n^2) time; add many words with extend instead.
+        Args:
+            item (Terminal) : terminal to add
+        """
+        self.update(added=(item,))
+
+    def update(self, added=(), removed=()):
+        """ Adds and removes the given terminals in one new version,
+        merging them into a copy of the arrays. Terminals already in the
+        lexicon keep their weight. Raises TypeError if this lexicon is
+        frozen.
+        Args:
+            added (iterable of Terminals) : terminals to add
+            removed (iterable of Terminals) : terminals to remove
+        """
+        added = {(rule.token, rule.pos): rule.weight for rule in added}
+        removed = {(rule.token, rule.pos) for rule in removed}
+        removed -= added.keys()
+        with self._lock:
+            self._check_mutable()
+            added = {
+                key: weight for key, weight in added.items()
+                if not self._has(*key)}
+            removed = {key for key in removed if self._has(*key)}
+            if added or removed:
+                self._merge(added, removed)
+
+    def extend(self, items):
+        """ Adds the given entries in one new version, merging them into a
+        copy of the arrays. Entries may be given as Terminals, strings or
+        tuples, see LexiconMixin._rule. Raises ValueError if an entry is
+        invalid, given twice or already in this lexicon, and TypeError if
+        this lexicon is frozen.
+        Args:
+            items (iterable) : entries to add
+        """
+        added = {
+            (rule.token, rule.pos): rule.weight
+            for rule in self._rules(items)}
+        with self._lock:
+            self._check_mutable()
+            for token, pos in added:
+                if self._has(token, pos):
+                    raise ValueError('{} : {} is already in {}.'.format(
+                        token, pos, self.name))
+            if added:
+                self._merge(added, ())
+
+    def _replace(self, rules):
+        """ Replaces every entry in this lexicon with given terminals.
+        Args:
+            rules (iterable of Terminals) : terminals for this lexicon
+        """
+        entries = {}
+        for rule in rules:
+            entries.setdefault((rule.token, rule.pos), rule.weight)
+        self._build(entries)
+
+    def _build(self, entries):
+        """ Builds the arrays for given entries and publishes them as a
+        new version. Raises TypeError if this lexicon is frozen.
+        Args:
+            entries (dict of tuples to float) :
+                weight by (word, part of speech)
+        """
+        names = {pos for _, pos in entries}
+        arrays = self._arrays(sorted(entries.items()), names)
+        with self._lock:
+            self._check_mutable()
+            self._table = arrays + (self._table[6] + 1,)
+
+    def _merge(self, added, removed):
+        """ Publishes a new version with the given entries merged into the
+        sorted entries of this version and the removed ones left out,
+        without holding every entry at once. Must be called holding the
+        lock.
+        Args:
+            added (dict of tuples to float) :
+                weight by (word, part of speech) of new entries
+            removed (set of tuples) :
+                (word, part of speech) of entries in this lexicon
+        """
+        entries = heapq.merge(self._entries(), sorted(added.items()))
+        if removed:
+            entries = (entry for entry in entries if entry[0] not in removed)
+        names = set(self._table[4]) | {pos for _, pos in added}
+        self._table = self._arrays(entries, names) + (self._table[6] + 1,)
+
+    @staticmethod
+    def _arrays(entries, names):
+        """ Builds the arrays for given entries in one pass.
+        Args:
+            entries (iterable of tuples) :
+                ((word, part of speech), weight) sorted by word and part
+                of speech
+            names (set of str) : every part of speech among the entries
+        Returns:
+            tuple : words, word offsets, tag ids, tag offsets, tag names,
+                weights
+        """
+        names = sorted(names)
+        ids = {pos: i for i, pos in enumerate(names)}
+        words = io.StringIO()
+        offsets = array('L', [0])
+        tags = array('H' if len(names) <= 0xFFFF else 'L')
+        starts = array('L', [0])
+        weights = array('d')
+        last = None
+        for (token, pos), weight in entries:
+            if token != last:
+                if last is not None:
+                    starts.append(len(tags))
+                words.write(token)
+                offsets.append(offsets[-1] + len(token))
+                last = token
+            tags.append(ids[pos])
+            weights.append(weight)
+        if last is not None:
+            starts.append(len(tags))
+        # parts of speech left without entries are dropped
+        used = sorted(set(tags))
+        if len(used) < len(names):
+            ids = {tag: i for i, tag in enumerate(used)}
+            tags = array(tags.typecode, (ids[tag] for tag in tags))
+            names = [names[tag] for tag in used]
+        return words.getvalue(), offsets, tags, starts, tuple(names), weights
+
+    def _entries(self):
+        """ Yields every ((word, part of speech), weight) in sorted
+        order. """
+        words, offsets, tags, starts, names, weights, _ = self._table
+        for i in range(len(offsets) - 1):
+            token = words[offsets[i]:offsets[i + 1]]
+            for j in range(starts[i], starts[i + 1]):
+                yield (token, names[tags[j]]), weights[j]
+
+    def _has(self, token, pos):
+        """ Returns whether given word has given part of speech in this
+        lexicon.
+        Args:
+            token (str) : word to look up
+            pos (str) : part of speech
+        Returns:
+            bool : True if the entry is in the lexicon, False otherwise
+        """
+        try:
+            return pos in self.tags(token)
+        except KeyError:
+            return False
+
+    def _find(self, token):
+        """ Returns the index of given word. Raises KeyError if the word
+        is not in the lexicon.
+        Args:
+            token (str) : word to look up
+        Returns:
+            int : index of word
+        """
+        words, offsets = self._table[:2]
+        low = 0
+        high = len(offsets) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if words[offsets[middle]:offsets[middle + 1]] < token:
+                low = middle + 1
+            else:
+                high = middle
+        if low == len(offsets) - 1 or \
+                words[offsets[low]:offsets[low + 1]] != token:
+            raise KeyError(token)
+        return low
+
+    def tags(self, token):
+        """ Returns the parts of speech of given word. Raises KeyError
+        if the word is not in the lexicon.
+        Args:
+            token (str) : word to look up
+        Returns:
+            tuple of str : parts of speech of word, sorted
+        """
+        _, _, tags, starts, names, _, _ = self._table
+        index = self._find(token)
+        return tuple(
+            names[tag] for tag in tags[starts[index]:starts[index + 1]])
+
+    def terminals(self, token):
+        """ Returns the terminals for given word. Raises KeyError if the
+        word is not in the lexicon.
+        Args:
+            token (str) : word to look up
+        Returns:
+            tuple of Terminals : terminals for word, sorted
+        """
+        _, _, tags, starts, names, weights, _ = self._table
+        index = self._find(token)
+        return tuple(
+            Terminal(names[tags[i]], token, weight=weights[i])
+            for i in range(starts[index], starts[index + 1]))
+
+    @property
+    def parts_of_speech(self):
+        """ Returns every part of speech in this lexicon.
+        Returns:
+            set of str : parts of speech
+        """
+        return set(self._table[4])
+
+    def __getitem__(self, token):
+        """ Returns the terminals for given word as a set. Raises KeyError
+        if the word is not in the lexicon.
+        Args:
+            token (str) : word to look up
+        Returns:
+            frozenset of Terminals : terminals for word
+        """
+        return frozenset(self.terminals(token))
+
+    def __contains__(self, token):
+        """ Returns whether given word is in this lexicon.
+        Args:
+            token (str) : word to look up
+        Returns:
+            bool : True if word is in lexicon, False otherwise
+        """
+        try:
+            self._find(token)
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        """ Provides iterator over the words in this lexicon, sorted. """
+        words, offsets = self._table[:2]
+        for i in range(len(offsets) - 1):
+            yield words[offsets[i]:offsets[i + 1]]
+
+    def __len__(self):
+        """ Returns the number of unique words in this lexicon.
+        Returns:
+            int : number of unique words
+        """
+        return len(self._table[1]) - 1
+
+    def __str__(self):
+        """ Returns lexicon as string, sorted by word and then
+        by part of speech, one word-pos pair per line.
+        Returns:
+            str : lexicon as string
+        """
+        return '\n'.join(
+            '{} : {}'.format(token, pos)
+            for (token, pos), _ in self._entries())
@@ -7,81 +7,573 @@ The Parser stores the grammar and lexicon of the language, applies the
 rules in those systems to a given sentence, and returns a single possible parse
 for the sentence if one is found.
 """
+import itertools
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from chartparser.language import Grammar, Lexicon
 from chartparser.chart import Chart
 from chartparser.agenda import Agenda
+from chartparser.kbest import KBest
+from chartparser.ambiguity import Ambiguity
+
+
+class ParseCancelled(Exception):
+    """ Raised when a parse is cancelled before it finishes. """
+
+
+class Budget:
+    """ Cancel flag for the parse methods that is set once the parse has
+    taken a given number of steps or seconds, or once it is set by hand,
+    e.g. from another thread. Parses take one step of their budget per arc
+    they choose. The monotonic clock is shared by all processes on a
+    machine, so a budget made in one process holds in another. A budget
+    counts the steps of one parse at a time. """
+
+    def __init__(self, steps=None, seconds=None):
+        """ Initializes budget, which starts counting time at once.
+        Args:
+            steps (int) : number of steps allowed, or None for any
+            seconds (float) : number of seconds allowed, or None for any
+        """
+        self.steps = steps
+        self.taken = 0
+        self._end = None if seconds is None else time.monotonic() + seconds
+        self._set = False
+
+    def set(self):
+        """ Cancels the parse using this budget at its next step. """
+        self._set = True
+
+    def is_set(self):
+        """ Returns whether the budget is spent, without taking a step.
+        Returns:
+            bool : True if the parse should stop, False otherwise
+        """
+        return self._set or \
+            self.steps is not None and self.taken > self.steps or \
+            self._end is not None and time.monotonic() > self._end
+
+    def tick(self):
+        """ Takes one step and returns whether the budget is spent.
+        Returns:
+            bool : True if the parse should stop, False otherwise
+        """
+        self.taken += 1
+        return self.is_set()
+
+
+def _stopper(cancel):
+    """ Returns the function a parse calls before each step to learn
+    whether to stop: the tick of a Budget, which counts the step, or the
+    is_set of any other flag, e.g. a threading.Event.
+    Args:
+        cancel (threading.Event or Budget) : flag to stop parsing early
+    Returns:
+        callable : function returning True once the parse should stop,
+            or None for no flag
+    """
+    if cancel is None:
+        return None
+    return getattr(cancel, 'tick', cancel.is_set)
+
+
+async def _aiter(items):
+    """ Yields the items of given iterable or asynchronous iterable. """
+    if hasattr(items, '__aiter__'):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
 
 
 class Parser:
 
-    def __init__(self, grammar=Grammar(), lexicon=Lexicon()):
-        """ Initializes parser with grammar and lexicon.
+    def __init__(
+            self, grammar=None, lexicon=None, beam=None, threshold=None,
+            closure=False, backend='arcs'):
+        """ Initializes parser with grammar and lexicon. Setting a beam
+        or threshold prunes each cell of the chart to its best arcs,
+        trading accuracy for speed on large grammars. With the unary
+        closure, chains of unary rules are applied in a single step
+        rather than one predicted arc at a time. The parser itself
+        cannot be changed once created; changes to its grammar or lexicon
+        take effect from the next parse, since each parse works on a
+        snapshot of both, so a parser can be shared between threads.
+        The backend runs parse and parse_lattice either as a loop over
+        Arc objects ('arcs'), or over integer ids in chartparser.core in
+        pure Python ('python') or compiled ('native'), finding the same
+        parse; the integer backends support neither a beam, a threshold
+        nor the closure, and parses that are profiled or return their
+        chart always use arcs. Raises ValueError for an unknown backend
+        or unsupported options and ImportError if the native backend
+        was not built.
         Args:
             grammar (Grammar) : Grammar object for parser
             lexicon (Lexicon) : Lexicon object for parser
+            beam (int) : maximum number of arcs kept per chart cell
+            threshold (float) :
+                maximum cost above the best arc in a chart cell for an
+                arc to be kept in that cell
+            closure (bool) : whether to apply the unary closure
+            backend (str) : 'arcs', 'python' or 'native'
         """
-        self._grammar = grammar
-        self._lexicon = lexicon
+        if backend not in ('arcs', 'python', 'native'):
+            raise ValueError('Unknown backend {}.'.format(backend))
+        if backend != 'arcs' and (
+                beam is not None or threshold is not None or closure):
+            raise ValueError(
+                'Backend {} has no beam, threshold or closure.'.format(
+                    backend))
+        self._grammar = Grammar() if grammar is None else grammar
+        self._lexicon = Lexicon() if lexicon is None else lexicon
+        self._beam = beam
+        self._threshold = threshold
+        self._closure = closure
+        self._backend = backend
+        self._core_class = None
+        if backend != 'arcs':
+            # imported here so the core is only loaded when used
+            from chartparser import core
+            self._core_class = core.Core
+            if backend == 'native':
+                self._core_class = core.compiled()
+                if self._core_class is None:
+                    raise ImportError('Native backend was not built.')
+        self._core = (None, None)
+        self._recognizer = (None, None)
 
     @property
     def grammar(self):
         return self._grammar
 
-    @grammar.setter
-    def grammar(self, value):
-        self._grammar = value
-
     @property
     def lexicon(self):
         return self._lexicon
 
-    @lexicon.setter
-    def lexicon(self, value):
-        self._lexicon = value
+    @property
+    def beam(self):
+        return self._beam
+
+    @property
+    def threshold(self):
+        return self._threshold
 
-    def parse(self, sentence):
+    @property
+    def closure(self):
+        return self._closure
+
+    @property
+    def backend(self):
+        return self._backend
+
+    def _coreparse(self, tokens, cancel=None, tags=None):
+        """ Parses given tokenized sentence with the integer core compiled
+        from the current version of the grammar.
+        Args:
+            tokens (list of str) : tokenized sentence
+            cancel (threading.Event) : flag to stop parsing early
+            tags (list of sets of str) : parts of speech allowed per token
+        Returns:
+            str : parse for given sentence
+        """
+        grammar = self.grammar.snapshot()
+        lexicon = self.lexicon.snapshot()
+        built, core = self._core
+        if built != grammar.version:
+            core = self._core_class(grammar)
+            self._core = (grammar.version, core)
+        return core.parse(tokens, lexicon, tags=tags, cancel=cancel)
+
+    @property
+    def recognizer(self):
+        """ Recognizer compiled from the current versions of this parser's
+        grammar and lexicon, rebuilt on first use after either changes.
+        Requires NumPy.
+        Returns:
+            Recognizer : vectorized recognizer for this language
+        """
+        grammar = self.grammar.snapshot()
+        lexicon = self.lexicon.snapshot()
+        versions = (grammar.version, lexicon.version)
+        built, recognizer = self._recognizer
+        if built != versions:
+            # imported here so NumPy is only loaded when recognizing
+            from chartparser.cky import Recognizer
+            recognizer = Recognizer(grammar, lexicon)
+            self._recognizer = (versions, recognizer)
+        return recognizer
+
+    def parse(self, sentence, cancel=None, profile=None, constraints=None):
         """ Chart parses and backtrackes given sentence and returns exactly one
-        parse. Throws ValueError if sentence cannot be parsed.
+        parse. Throws ValueError if sentence cannot be parsed and
+        ParseCancelled if the given cancel flag is set during the parse.
         Args:
             sentence (str) : sentence to parse
+            cancel (threading.Event) : flag to stop parsing early
+            profile (RuleProfile) : profile to record rule usage in
+            constraints (Constraints) : brackets the parse must keep
         Returns:
             str : parse for given sentence
         """
+        if self._core_class is not None and profile is None and \
+                constraints is None:
+            return self._coreparse(self.tokenize(sentence), cancel=cancel)
+        parse, _ = self.parse_chart(
+            sentence, cancel=cancel, profile=profile, constraints=constraints)
+        return parse
+
+    def parse_chart(
+            self, sentence, cancel=None, profile=None, writer=None,
+            constraints=None):
+        """ Chart parses and backtraces given sentence and returns exactly
+        one parse along with the chart it was found in, e.g. to inspect
+        how many arcs were pruned. With a writer, the sentence is parsed
+        until the agenda is exhausted so that the whole chart is written,
+        not only the arcs found before the first parse. Throws ValueError
+        if sentence cannot be parsed and ParseCancelled if the given cancel
+        flag is set during the parse.
+        Args:
+            sentence (str) : sentence to parse
+            cancel (threading.Event) : flag to stop parsing early
+            profile (RuleProfile) : profile to record rule usage in
+            writer (ChartWriter) : writer to stream the chart to
+            constraints (Constraints) : brackets the parse must keep
+        Returns:
+            tuple of (str, Chart) : parse for given sentence and its chart
+        """
         tokens = self.tokenize(sentence)
-        chart = self._chartparse(*tokens)
-        parse = self._backtrace(chart)
+        return self._parse_tokens(
+            tokens, cancel=cancel, profile=profile, writer=writer,
+            exhaustive=writer is not None, constraints=constraints)
+
+    def parse_kbest(self, sentence, k=None, cancel=None, constraints=None):
+        """ Chart parses given sentence to exhaustion and returns its
+        parses in order of cost, best first. Each parse is only built when
+        it is reached, so taking the first few of many parses is cheap.
+        Throws ValueError if sentence cannot be parsed or has endlessly
+        many parses, and ParseCancelled if the given cancel flag is set
+        during the parse.
+        Args:
+            sentence (str) : sentence to parse
+            k (int) : maximum number of parses, or None for all of them
+            cancel (threading.Event) : flag to stop parsing early
+            constraints (Constraints) : brackets the parse must keep
+        Returns:
+            iterator of (str, float) : each parse and its cost
+        """
+        tokens = self.tokenize(sentence)
+        chart = self._chartparse(
+            *tokens, cancel=cancel, exhaustive=True, constraints=constraints)
+        return itertools.islice(KBest(chart), k)
+
+    def count_parses(self, sentence, cancel=None, constraints=None):
+        """ Returns the number of parses of given sentence, counted without
+        building them. Throws ValueError if sentence has endlessly many
+        parses and ParseCancelled if the given cancel flag is set during
+        the parse.
+        Args:
+            sentence (str) : sentence to parse
+            cancel (threading.Event) : flag to stop parsing early
+            constraints (Constraints) : brackets the parse must keep
+        Returns:
+            int : number of parses, 0 if sentence cannot be parsed
+        """
+        return self.ambiguity(
+            sentence, cancel=cancel, constraints=constraints).count
+
+    def ambiguity(self, sentence, cancel=None, constraints=None):
+        """ Chart parses given sentence to exhaustion and counts the parses
+        of the sentence and of each span of it, e.g. to route very
+        ambiguous sentences elsewhere. Throws ValueError if sentence has
+        endlessly many parses and ParseCancelled if the given cancel flag
+        is set during the parse.
+        Args:
+            sentence (str) : sentence to parse
+            cancel (threading.Event) : flag to stop parsing early
+            constraints (Constraints) : brackets the parse must keep
+        Returns:
+            Ambiguity : parse counts for sentence
+        """
+        tokens = self.tokenize(sentence)
+        chart = self._chartparse(
+            *tokens, cancel=cancel, exhaustive=True, partial=True,
+            constraints=constraints)
+        return Ambiguity(chart)
+
+    def parse_partial(self, sentence, cancel=None, profile=None):
+        """ Chart parses given sentence and returns its parse as the only
+        chunk if it has one. Otherwise, rather than failing, returns the
+        parses of the fewest complete constituents in the chart that
+        together cover the sentence, e.g. for noisy text. Throws KeyError
+        if the sentence has unknown words and ParseCancelled if the given
+        cancel flag is set during the parse.
+        Args:
+            sentence (str) : sentence to parse
+            cancel (threading.Event) : flag to stop parsing early
+            profile (RuleProfile) : profile to record rule usage in
+        Returns:
+            list of str : parse of each chunk of the sentence, in order
+        """
+        tokens = self.tokenize(sentence)
+        chart = self._chartparse(
+            *tokens, cancel=cancel, profile=profile, partial=True)
+        if not chart.is_sentence:
+            if profile is not None:
+                profile.failed += 1
+            return [self._recurse('', arc) for arc in chart.cover()]
+        if profile is not None:
+            profile.used(chart.sentence)
+        return [self._backtrace(chart)]
+
+    def parse_lattice(self, lattice, cancel=None, profile=None):
+        """ Chart parses and backtraces a pre-tagged sentence and returns
+        exactly one parse. Each position of the lattice pairs a word with
+        the parts of speech it may take, e.g. as pruned by a tagger, or
+        with None to use every part of speech in the lexicon. Tags need
+        not be in the lexicon, so tagged words may be unknown. Throws
+        ValueError if sentence cannot be parsed.
+        Args:
+            lattice (list of tuples) : (word, tags or None) per position
+            cancel (threading.Event) : flag to stop parsing early
+            profile (RuleProfile) : profile to record rule usage in
+        Returns:
+            str : parse for given sentence
+        """
+        tokens = []
+        tags = []
+        for token, allowed in lattice:
+            tokens.extend(self.tokenize(token))
+            if allowed is not None:
+                allowed = {tag.strip().upper() for tag in allowed}
+            tags.append(allowed)
+        if len(tokens) != len(tags):
+            raise ValueError('Each lattice position must be one word.')
+        if self._core_class is not None and profile is None:
+            return self._coreparse(tokens, cancel=cancel, tags=tags)
+        parse, _ = self._parse_tokens(
+            tokens, cancel=cancel, profile=profile, tags=tags)
         return parse
 
+    async def parse_async(self, sentence, cancel=None, executor=None):
+        """ Chart parses given sentence in an executor without blocking
+        the event loop and returns its parse. If the awaiting task is
+        cancelled the cancel flag is set, so the parse stops at its next
+        step instead of holding its thread. Throws the same errors as
+        parse, and TypeError if the cancel flag cannot be set.
+        Args:
+            sentence (str) : sentence to parse
+            cancel (Budget) : flag to stop parsing early, e.g. a Budget or
+                a threading.Event, or None for a flag of its own
+            executor (Executor) :
+                thread pool to parse in, or None for the default executor
+                of the running loop, shared with everything else it runs
+        Returns:
+            str : parse for given sentence
+        """
+        # imported here so the parser loads without asyncio
+        import asyncio
+        cancel = Budget() if cancel is None else cancel
+        if not callable(getattr(cancel, 'set', None)):
+            raise TypeError('Cancel flag has no set method.')
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                executor, lambda: self.parse(sentence, cancel=cancel))
+        except asyncio.CancelledError:
+            # the thread cannot be interrupted, so stop it at its next step
+            cancel.set()
+            raise
+
+    async def parse_stream(
+            self, sentences, concurrency=4, ordered=True, steps=None,
+            seconds=None, executor=None):
+        """ Chart parses the given sentences in an executor, no more than
+        the given number at a time, and yields each with its parse, in
+        the order given or as soon as each is parsed. A sentence that
+        cannot be parsed is yielded with the error it raised instead.
+        Each parse has its own Budget of the given steps and seconds, and
+        parses still running are stopped if the stream is closed.
+        Args:
+            sentences (iterable or async iterable of str) : sentences
+            concurrency (int) : maximum number of parses at a time
+            ordered (bool) : whether to yield in the order given
+            steps (int) : steps allowed per parse, or None for any
+            seconds (float) : seconds allowed per parse, or None for any
+            executor (Executor) :
+                thread pool to parse in, or None for a pool of its own of
+                the given concurrency, shut down when the stream ends
+        Yields:
+            tuple of (str, str or Exception) : sentence and its parse
+        """
+        import asyncio
+        if concurrency < 1:
+            raise ValueError('Concurrency must be at least 1.')
+        pool = None
+        if executor is None:
+            pool = executor = ThreadPoolExecutor(max_workers=concurrency)
+
+        async def run(sentence):
+            budget = Budget(steps=steps, seconds=seconds)
+            try:
+                parse = await self.parse_async(
+                    sentence, cancel=budget, executor=executor)
+            except (KeyError, IndexError, ValueError, ParseCancelled) as e:
+                return sentence, e
+            return sentence, parse
+
+        async def finished():
+            if ordered:
+                return [await tasks.popleft()]
+            done, _ = await asyncio.wait(
+                tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                tasks.remove(task)
+            return [task.result() for task in done]
+
+        tasks = deque()
+        try:
+            async for sentence in _aiter(sentences):
+                tasks.append(asyncio.ensure_future(run(sentence)))
+                if len(tasks) >= concurrency:
+                    for result in await finished():
+                        yield result
+            while tasks:
+                for result in await finished():
+                    yield result
+        finally:
+            for task in tasks:
+                task.cancel()
+            if pool is not None:
+                # cancelled parses stop at their next step, so do not wait
+                pool.shutdown(wait=False)
+
+    def _parse_tokens(self, tokens, profile=None, **options):
+        """ Chart parses and backtraces given tokenized sentence.
+        Args:
+            tokens (list of str) : tokenized sentence
+            profile (RuleProfile) : profile to record rule usage in
+            options (dict) : further keyword arguments for _chartparse
+        Returns:
+            tuple of (str, Chart) : parse for given sentence and its chart
+        """
+        chart = self._chartparse(*tokens, profile=profile, **options)
+        parse = self._backtrace(chart)
+        if profile is not None:
+            profile.used(chart.sentence)
+        return parse, chart
+
+    def recognize(self, sentence):
+        """ Returns whether given sentence is grammatical, without
+        building a chart of arcs. Requires NumPy.
+        Args:
+            sentence (str) : sentence to recognize
+        Returns:
+            bool : True if sentence has a parse, False otherwise
+        """
+        return self.recognizer.recognize(self.tokenize(sentence))
+
+    def recognize_batch(self, sentences, size=256):
+        """ Returns whether each of the given sentences is grammatical.
+        Sentences are grouped by length into batches of the given size
+        that are recognized together. Requires NumPy.
+        Args:
+            sentences (iterable of str) : sentences to recognize
+            size (int) : maximum number of sentences per batch
+        Returns:
+            list of bool : True for each sentence that has a parse
+        """
+        tokenized = [self.tokenize(sentence) for sentence in sentences]
+        order = sorted(
+            range(len(tokenized)), key=lambda i: len(tokenized[i]))
+        results = [None] * len(tokenized)
+        for offset in range(0, len(order), size):
+            batch = order[offset:offset + size]
+            found = self.recognizer.recognize_batch(
+                [tokenized[i] for i in batch])
+            for i, result in zip(batch, found):
+                results[i] = result
+        return results
+
     @staticmethod
     def tokenize(sentence):
         sentence = sentence.strip().upper().split()
         # space to perform more complex tokenization, if desired
         return sentence
 
-    def _chartparse(self, *tokens):
+    def _chartparse(
+            self, *tokens, cancel=None, profile=None, tags=None, writer=None,
+            exhaustive=False, partial=False, constraints=None):
         """ Chart parses given tokenized sentence. Returns chart if
         tokenized sentence is parseable, otherwise a ValueError is raised.
         The first parse that is successfully completed is returned as the only
         parse for this sentence. Which parse is returned depends on the
-        prediction protocol for the agenda.
+        prediction protocol for the agenda. An exhaustive parse carries on
+        until the agenda is exhausted, so the chart holds every parse. A
+        partial parse returns the chart even if it has no parse, keeping
+        the constituents found for the parts of the sentence.
+        The given cancel flag is checked before each arc is chosen and
+        ParseCancelled is raised once it is set.
         Args:
             tokens (list of str) : tokenized sentence
+            cancel (threading.Event) : flag to stop parsing early
+            profile (RuleProfile) :
+                profile to record created arcs and the end of the parse in
+            tags (list of sets of str) : parts of speech allowed per token
+            writer (ChartWriter) : writer to stream the chart to
+            exhaustive (bool) : whether to parse until the agenda is empty
+            partial (bool) : whether to return a chart without a parse
+            constraints (Constraints) :
+                brackets every arc must keep; raises ValueError if a span
+                is past the end of the sentence
         Returns:
             Chart : Chart for parsed sentence
         """
+        if constraints is not None:
+            constraints.check(len(tokens))
+        # parse against one version of the language throughout
+        grammar = self.grammar.snapshot()
+        lexicon = self.lexicon.snapshot()
         # initialize chart and agenda with tokenized sentence
-        chart = Chart(tokens)
-        agenda = Agenda(tokens, self.lexicon)
-        while True:
-            current = agenda.choose_next()
-            agenda.predict(self.grammar, current)
-            agenda.extend(current)
-            if current.is_complete():
-                chart.add(current)
-            else:
-                agenda.queue(current)
-            if chart.is_sentence:
-                return chart
+        stop = _stopper(cancel)
+        chart = Chart(
+            tokens, beam=self.beam, threshold=self.threshold, writer=writer,
+            packed=exhaustive)
+        agenda = None
+        try:
+            # arcs are only completed from the chart when every parse is
+            # wanted, so the first parse found stays the same
+            agenda = Agenda(
+                tokens, lexicon, scored=chart.is_beamed, profile=profile,
+                closure=self.closure, tags=tags,
+                chart=chart if exhaustive else None, constraints=constraints,
+                grammar=grammar)
+            while True:
+                if stop is not None and stop():
+                    raise ParseCancelled('Parse cancelled.')
+                try:
+                    current = agenda.choose_next()
+                except (IndexError, ValueError):
+                    # arcs that missed chart arcs found before them are
+                    # caught up once before the parse gives up
+                    if agenda.chart is None and agenda.complete(chart):
+                        continue
+                    if partial or exhaustive and chart.is_sentence:
+                        return chart
+                    raise
+                # arcs already in the chart or pruned from it are not expanded
+                if not chart.add(current):
+                    continue
+                agenda.predict(grammar, current)
+                agenda.extend(current)
+                if chart.is_sentence and not exhaustive:
+                    return chart
+        finally:
+            if writer is not None:
+                writer.end(chart)
+            if profile is not None:
+                profile.finished(agenda, chart)
 
     def _backtrace(self, chart):
         """ Finds the parse in the given chart. Assumes chart
@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+
+"""
+Kathryn Egan
+
+The RuleProfile counts, for every nonterminal rule, how many arcs the agenda
+created for it, how many of those were complete and how many ended up in a
+final parse. Accumulated over a corpus, it shows grammar authors which rules
+make the parser do work that is never used.
+
+The MemoryProfile also measures where the memory of a parse goes, for
+finding what makes long sentences expensive. It traces allocations with
+tracemalloc and, at the end of every parse, sizes the agenda, the chart,
+the arcs and their history lists, counting each object once. It also
+counts the garbage arcs of a parse: arcs whose rule never completes from
+where they start, which are kept on the agenda until the parse ends.
+"""
+import os
+import sys
+import tracemalloc
+from chartparser.arc import Arc
+
+# directory of the parser's modules, whose allocations are traced
+_PACKAGE = os.path.dirname(os.path.abspath(__file__))
+
+
+class RuleProfile:
+
+    def __init__(self):
+        """ Initializes an empty profile. """
+        self._created = {}
+        self._completed = {}
+        self._used = {}
+        self.parsed = 0
+        self.failed = 0
+
+    def created(self, arc):
+        """ Records an arc created by the agenda.
+        Args:
+            arc (Arc) : predicted or extended arc
+        """
+        rule = arc.rule
+        if rule.is_terminal:
+            return
+        self._created[rule] = self._created.get(rule, 0) + 1
+        if arc.is_complete():
+            self._completed[rule] = self._completed.get(rule, 0) + 1
+
+    def used(self, arc):
+        """ Records every nonterminal arc in the parse under given arc.
+        Args:
+            arc (Arc) : arc of a parsed sentence
+        """
+        self.parsed += 1
+        stack = [arc]
+        while stack:
+            arc = stack.pop()
+            if arc.rule.is_terminal:
+                continue
+            self._used[arc.rule] = self._used.get(arc.rule, 0) + 1
+            stack.extend(arc.history)
+
+    def finished(self, agenda, chart):
+        """ Records the end of a parse, whether or not it found a parse.
+        Nothing is recorded per parse here.
+        Args:
+            agenda (Agenda) : agenda of the parse, or None if it failed
+                before the agenda was made
+            chart (Chart) : chart of the parse
+        """
+
+    def run(self, parser, sentences):
+        """ Parses every given sentence with given parser, recording
+        into this profile. Sentences that cannot be parsed are counted
+        as failed.
+        Args:
+            parser (Parser) : parser to profile
+            sentences (iterable of str) : corpus to parse
+        Returns:
+            RuleProfile : this profile
+        """
+        for sentence in sentences:
+            try:
+                parser.parse(sentence, profile=self)
+            except (KeyError, IndexError, ValueError):
+                self.failed += 1
+        return self
+
+    def rows(self):
+        """ Returns the counts for every rule that had an arc created,
+        most created arcs first.
+        Returns:
+            list of tuples : (rule, created, completed, used) per rule
+        """
+        rows = [
+            (rule, created, self._completed.get(rule, 0),
+             self._used.get(rule, 0))
+            for rule, created in self._created.items()]
+        rows.sort(key=lambda row: (-row[1], row[0]))
+        return rows
+
+    def __str__(self):
+        """ Returns this profile as a report, one rule per line with the
+        rules that created the most arcs first.
+        Returns:
+            str : profile as string
+        """
+        output = ['{:>10} {:>10} {:>10}  {}'.format(
+            'created', 'completed', 'used', 'rule')]
+        for rule, created, completed, used in self.rows():
+            output.append('{:>10} {:>10} {:>10}  {}'.format(
+                created, completed, used, rule))
+        output.append('{} parsed, {} failed'.format(self.parsed, self.failed))
+        return '\n'.join(output)
+
+
+class MemoryProfile(RuleProfile):
+
+    def __init__(self):
+        """ Initializes an empty profile. """
+        RuleProfile.__init__(self)
+        # bytes by component at the end of the parse where each was largest
+        self.components = {}
+        # bytes traced by module at the end of the parse holding the most
+        self.modules = {}
+        self._largest = 0
+        # most bytes traced while parsing one sentence, and its length
+        self.peak = (0, 0)
+        self.arcs = 0
+        self.garbage = 0
+        self._open = {}
+        self._closed = set()
+
+    def created(self, arc):
+        """ Records an arc created by the agenda.
+        Args:
+            arc (Arc) : predicted or extended arc
+        """
+        RuleProfile.created(self, arc)
+        self.arcs += 1
+        key = (arc.rule, arc.start)
+        if arc.is_complete():
+            self._closed.add(key)
+        else:
+            self._open[key] = self._open.get(key, 0) + 1
+
+    def finished(self, agenda, chart):
+        """ Sizes the structures of the parse that just ended and counts
+        its garbage arcs.
+        Args:
+            agenda (Agenda) : agenda of the parse, or None if it failed
+                before the agenda was made
+            chart (Chart) : chart of the parse
+        """
+        self.garbage += sum(
+            count for key, count in self._open.items()
+            if key not in self._closed)
+        self._open = {}
+        self._closed = set()
+        seen = set()
+        arcs = []
+        sizes = {'chart': self._sizeof(vars(chart), seen, arcs)}
+        sizes['agenda'] = 0
+        if agenda is not None:
+            sizes['agenda'] = self._sizeof(agenda.agenda, seen, arcs)
+            sizes['agenda'] += self._sizeof(agenda.heap, seen, arcs)
+        sizes['arcs'] = 0
+        sizes['history'] = 0
+        while arcs:
+            arc = arcs.pop()
+            if id(arc) in seen:
+                continue
+            seen.add(id(arc))
+            sizes['arcs'] += sys.getsizeof(arc) + sys.getsizeof(vars(arc))
+            sizes['history'] += self._sizeof(arc.history, seen, arcs)
+        for name, size in sizes.items():
+            self.components[name] = max(self.components.get(name, 0), size)
+        # snapshots are slow, so only the parse holding the most memory
+        # so far is broken down by module
+        if tracemalloc.is_tracing() and \
+                tracemalloc.get_traced_memory()[0] > self._largest:
+            self._largest = tracemalloc.get_traced_memory()[0]
+            self.modules = {}
+            for stat in tracemalloc.take_snapshot().statistics('filename'):
+                filename = stat.traceback[0].filename
+                if os.path.dirname(filename) == _PACKAGE and \
+                        filename != __file__:
+                    self.modules[os.path.basename(filename)] = stat.size
+
+    @staticmethod
+    def _sizeof(obj, seen, arcs):
+        """ Returns the bytes of given object and the containers in it,
+        skipping objects already seen. Arcs are not sized but collected.
+        Args:
+            obj (object) : object to size
+            seen (set of int) : ids of objects already sized
+            arcs (list of Arcs) : list to collect arcs in
+        Returns:
+            int : bytes of object
+        """
+        size = 0
+        stack = [obj]
+        while stack:
+            obj = stack.pop()
+            if isinstance(obj, Arc):
+                arcs.append(obj)
+                continue
+            if id(obj) in seen:
+                continue
+            seen.add(id(obj))
+            size += sys.getsizeof(obj)
+            if isinstance(obj, dict):
+                stack.extend(obj.keys())
+                stack.extend(obj.values())
+            elif isinstance(obj, (list, tuple, set, frozenset)):
+                stack.extend(obj)
+        return size
+
+    def run(self, parser, sentences):
+        """ Parses every given sentence with given parser, tracing the
+        memory of each parse and recording into this profile. Sentences
+        that cannot be parsed are counted as failed.
+        Args:
+            parser (Parser) : parser to profile
+            sentences (iterable of str) : corpus to parse
+        Returns:
+            MemoryProfile : this profile
+        """
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        try:
+            for sentence in sentences:
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+                RuleProfile.run(self, parser, [sentence])
+                peak = tracemalloc.get_traced_memory()[1] - base
+                self.peak = max(self.peak, (peak, len(sentence.split())))
+        finally:
+            if started:
+                tracemalloc.stop()
+        return self
+
+    def __str__(self):
+        """ Returns the memory of this profile as a report.
+        Returns:
+            str : profile as string
+        """
+        output = ['peak:       {:,} bytes ({} words)'.format(*self.peak)]
+        for name in ('agenda', 'chart', 'arcs', 'history'):
+            output.append('{:<11} {:,} bytes'.format(
+                name + ':', self.components.get(name, 0)))
+        for name, size in sorted(
+                self.modules.items(), key=lambda item: -item[1]):
+            output.append('    {:<14} {:,} bytes traced'.format(name, size))
+        output.append('arcs:       {} created, {} garbage'.format(
+            self.arcs, self.garbage))
+        output.append('{} parsed, {} failed'.format(self.parsed, self.failed))
+        return '\n'.join(output)
@@ -14,7 +14,7 @@ by the language. NonTerminal is the grammar, or unspoken rules of language.
 class Rule:
     """ Super class for terminal and nonterminal rules. """
 
-    def __init__(self, *nodes):
+    def __init__(self, *nodes, weight=1.0):
         """ Initializes rule of any length greater than two. Raises
         ValueError if less than two nodes are provided. Assumes the
         first node in nodes is the single parent node, while nodes
@@ -24,6 +24,9 @@ class Rule:
             nodes (list of str) :
                 list of nodes in this rule in the form
                 [parent, child1, child2, ... childn]
+            weight (float) :
+                cost of applying this rule, e.g. a negative log
+                probability; lower is better
         """
         if len(nodes) < 2:
             raise ValueError('Rule must have at least two nodes')
@@ -35,6 +38,7 @@ class Rule:
                     'divisible by whitespace.')
             cleaned.append(node.upper())
         self._rule = tuple(cleaned)
+        self.weight = weight
 
     @property
     def rule(self):
@@ -105,9 +109,9 @@ class Rule:
 
 class NonTerminal(Rule):
 
-    def __init__(self, *nodes):
+    def __init__(self, *nodes, weight=1.0):
         """ Initializes NonTerminal rule with super class. """
-        Rule.__init__(self, *nodes)
+        Rule.__init__(self, *nodes, weight=weight)
 
     @property
     def is_sentence(self):
@@ -152,11 +156,11 @@ class NonTerminal(Rule):
 
 class Terminal(Rule):
 
-    def __init__(self, *nodes):
+    def __init__(self, *nodes, weight=1.0):
         """ Initializes Terminal rule with super class.
         Raises ValueError if there is not exactly one token
         and one part of speech. """
-        Rule.__init__(self, *nodes)
+        Rule.__init__(self, *nodes, weight=weight)
         if len(self.rule) != 2:
             raise ValueError(
                 'Terminal must consist of one token and one part of speech.')
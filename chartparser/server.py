@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+
+"""
+Kathryn Egan
+
+The ParseServer loads a grammar and lexicon once into a pool of worker
+processes and answers parse requests over TCP or a Unix socket. Requests
+and responses are newline-delimited JSON objects:
+
+    {"id": 1, "sentence": "the dog chased the cat"}
+    {"id": 1, "parse": "[.S ...]"}
+    {"id": 2, "error": "no parse"}
+
+A connection may send many requests without waiting for answers. Responses
+carry the id of their request and are written as soon as each parse
+finishes, so they may arrive out of order. The ParseClient sends requests
+this way and matches responses back to them.
+"""
+import asyncio
+import itertools
+import json
+from concurrent.futures import ProcessPoolExecutor
+from chartparser.language import Grammar, Lexicon
+from chartparser.parser import Parser, ParseCancelled, Budget
+
+# parser loaded once in each worker process
+_parser = None
+
+
+def _load(grammar, lexicon):
+    """ Loads the parser for this worker process.
+    Args:
+        grammar (str) : path to grammar file
+        lexicon (str) : path to lexicon file
+    """
+    global _parser
+    _parser = Parser(Grammar(), Lexicon())
+    with open(grammar) as f:
+        _parser.grammar.load(f)
+    with open(lexicon) as f:
+        _parser.lexicon.load(f)
+
+
+def _parse(sentence, deadline):
+    """ Parses given sentence in this worker process.
+    Args:
+        sentence (str) : sentence to parse
+        deadline (Budget) : time by which the parse must finish, or None
+    Returns:
+        dict : response with either a parse or an error
+    """
+    try:
+        return {'parse': _parser.parse(sentence, cancel=deadline)}
+    except ParseCancelled:
+        return {'error': 'timeout'}
+    except KeyError:
+        return {'error': 'unknown words or punctuation'}
+    except (IndexError, ValueError):
+        return {'error': 'no parse'}
+
+
+class ParseServer:
+
+    def __init__(
+            self, grammar, lexicon, workers=None, concurrency=64,
+            timeout=10.0):
+        """ Initializes server for the given grammar and lexicon files.
+        Args:
+            grammar (str) : path to grammar file
+            lexicon (str) : path to lexicon file
+            workers (int) : number of worker processes, default one per CPU
+            concurrency (int) :
+                maximum number of requests parsed or queued at once across
+                all connections; connections are not read while it is
+                reached
+            timeout (float) : seconds each parse may take, or None
+        """
+        self.grammar = grammar
+        self.lexicon = lexicon
+        self.workers = workers
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self._pool = None
+        self._slots = None
+        self._server = None
+
+    async def start(self, host='127.0.0.1', port=8765, path=None):
+        """ Starts the worker processes and listens for connections on the
+        given Unix socket path, or on the given host and port otherwise.
+        Args:
+            host (str) : host to listen on
+            port (int) : port to listen on, 0 for any free port
+            path (str) : path of Unix socket to listen on
+        Returns:
+            asyncio.AbstractServer : server accepting connections
+        """
+        self._pool = ProcessPoolExecutor(
+            self.workers, initializer=_load,
+            initargs=(self.grammar, self.lexicon))
+        self._slots = asyncio.Semaphore(self.concurrency)
+        if path is not None:
+            self._server = await asyncio.start_unix_server(
+                self._handle, path=path)
+        else:
+            self._server = await asyncio.start_server(
+                self._handle, host=host, port=port)
+        return self._server
+
+    async def close(self):
+        """ Stops accepting connections and shuts down the workers. """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+
+    async def _handle(self, reader, writer):
+        """ Reads requests from one connection until it closes, parsing
+        each as soon as a slot is free.
+        Args:
+            reader (asyncio.StreamReader) : incoming requests
+            writer (asyncio.StreamWriter) : outgoing responses
+        """
+        lock = asyncio.Lock()
+        pending = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                # wait for a slot before reading on, which pushes back on
+                # clients sending faster than requests are parsed
+                await self._slots.acquire()
+                task = asyncio.ensure_future(
+                    self._respond(line, writer, lock))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.gather(*pending)
+        finally:
+            writer.close()
+
+    async def _respond(self, line, writer, lock):
+        """ Parses one request and writes its response.
+        Args:
+            line (bytes) : request as a line of JSON
+            writer (asyncio.StreamWriter) : outgoing responses
+            lock (asyncio.Lock) : lock for writing to this connection
+        """
+        try:
+            response = await self._answer(line)
+        finally:
+            self._slots.release()
+        async with lock:
+            writer.write(json.dumps(response).encode('utf-8') + b'\n')
+            try:
+                await writer.drain()
+            except ConnectionError:
+                pass
+
+    async def _answer(self, line):
+        """ Returns the response to one request.
+        Args:
+            line (bytes) : request as a line of JSON
+        Returns:
+            dict : response with either a parse or an error
+        """
+        try:
+            request = json.loads(line)
+        except ValueError:
+            request = None
+        if not isinstance(request, dict):
+            return {'id': None, 'error': 'bad request'}
+        response = {'id': request.get('id')}
+        sentence = request.get('sentence')
+        if not isinstance(sentence, str):
+            response['error'] = 'bad request'
+            return response
+        # the timeout covers time spent waiting for a worker
+        deadline = None if self.timeout is None else Budget(
+            seconds=self.timeout)
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._pool, _parse, sentence, deadline)
+        # workers stop themselves at the deadline; this only guards
+        # against a worker that never answers
+        limit = None if self.timeout is None else self.timeout + 1
+        try:
+            response.update(await asyncio.wait_for(future, limit))
+        except asyncio.TimeoutError:
+            response['error'] = 'timeout'
+        return response
+
+
+class ParseClient:
+
+    def __init__(self, reader, writer):
+        """ Initializes client on an open connection to a ParseServer.
+        Use ParseClient.connect to open the connection.
+        Args:
+            reader (asyncio.StreamReader) : incoming responses
+            writer (asyncio.StreamWriter) : outgoing requests
+        """
+        self._reader = reader
+        self._writer = writer
+        self._ids = itertools.count()
+        self._waiting = {}
+        self._listener = asyncio.ensure_future(self._listen())
+
+    @classmethod
+    async def connect(cls, host='127.0.0.1', port=8765, path=None):
+        """ Connects to a ParseServer on the given Unix socket path, or on
+        the given host and port otherwise.
+        Args:
+            host (str) : host of server
+            port (int) : port of server
+            path (str) : path of Unix socket of server
+        Returns:
+            ParseClient : connected client
+        """
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def parse(self, sentence):
+        """ Sends given sentence to the server and waits for its response.
+        Any number of parses may be awaited at once on one client.
+        Args:
+            sentence (str) : sentence to parse
+        Returns:
+            dict : response with either a parse or an error
+        """
+        request = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[request] = future
+        message = {'id': request, 'sentence': sentence}
+        self._writer.write(json.dumps(message).encode('utf-8') + b'\n')
+        await self._writer.drain()
+        return await future
+
+    async def close(self):
+        """ Closes the connection. """
+        self._writer.close()
+        await self._listener
+
+    async def _listen(self):
+        """ Matches responses from the server to waiting requests. """
+        while True:
+            line = await self._reader.readline()
+            if not line:
+                break
+            response = json.loads(line)
+            future = self._waiting.pop(response.pop('id'), None)
+            if future is not None and not future.done():
+                future.set_result(response)
+        for future in self._waiting.values():
+            if not future.done():
+                future.set_exception(ConnectionError('Connection closed.'))
+        self._waiting.clear()
@@ -0,0 +1,83 @@
+"""
+Kathryn Egan
+
+Tests the NumPy recognizer against the chart parser. Skipped if
+NumPy is not installed.
+"""
+import pytest
+from io import StringIO
+from chartparser.parser import Parser
+from chartparser.language import Grammar
+from chartparser.rule import NonTerminal
+from chartparser.tests.test_parser import (
+    complex_grammar, complex_lexicon, complex_sentence,
+    simple_grammar, simple_lexicon, simple_sentence)
+
+numpy = pytest.importorskip('numpy')
+from chartparser.cky import Recognizer  # noqa: E402
+
+
+def test_recognize():
+    recognizer = Recognizer(simple_grammar, simple_lexicon)
+    assert recognizer.recognize(Parser.tokenize(simple_sentence))
+    assert not recognizer.recognize(['I', 'I'])
+    assert not recognizer.recognize(['I', 'SNORE'])
+    assert not recognizer.recognize([])
+
+
+def test_recognize_nary():
+    recognizer = Recognizer(complex_grammar, complex_lexicon)
+    assert recognizer.recognize(Parser.tokenize(complex_sentence))
+    assert recognizer.recognize(
+        Parser.tokenize('the five-string guitar can play'))
+    assert not recognizer.recognize(
+        Parser.tokenize('the five-string play'))
+
+
+def test_score():
+    recognizer = Recognizer(simple_grammar, simple_lexicon)
+    # two terminals, NP --> PN, VP --> V and S --> NP VP
+    assert recognizer.score(Parser.tokenize(simple_sentence)) == 5.0
+    assert recognizer.score(['SLEEP', 'I']) == numpy.inf
+
+    grammar = Grammar()
+    grammar.load(StringIO(str(simple_grammar)))
+    grammar.add(NonTerminal('S', 'NP', 'VP', 'VP', weight=0.5))
+    recognizer = Recognizer(grammar, simple_lexicon)
+    assert recognizer.score(['I', 'SLEEP', 'SLEEP']) == 6.5
+
+
+def test_unary_cycle():
+    grammar = Grammar()
+    grammar.load(StringIO("""
+        S --> NP VP
+        NP --> PN
+        PN --> NP
+        VP --> V
+        """))
+    recognizer = Recognizer(grammar, simple_lexicon)
+    assert recognizer.recognize(['I', 'SLEEP'])
+
+
+def test_score_batch():
+    recognizer = Recognizer(complex_grammar, complex_lexicon)
+    sentences = [
+        Parser.tokenize(complex_sentence),
+        ['I', 'PLAY'],
+        ['I', 'SNORE'],
+        [],
+        ['PLAY', 'I']]
+    scores = recognizer.score_batch(sentences)
+    assert scores == [recognizer.score(tokens) for tokens in sentences]
+    assert recognizer.recognize_batch(sentences) == [
+        True, True, False, False, False]
+    assert recognizer.score_batch([]) == []
+
+
+def test_parser_recognize_batch():
+    parser = Parser(complex_grammar, complex_lexicon)
+    sentences = [
+        complex_sentence, 'i play', 'the boy can play', 'play i', 'i i']
+    assert parser.recognize(complex_sentence)
+    assert parser.recognize_batch(sentences, size=2) == [
+        True, True, True, False, False]
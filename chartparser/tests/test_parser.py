@@ -4,14 +4,20 @@ Kathryn Egan
 Only tests the functionality of the parser and its component
 parts. Does not text functionality of GUI.
 """
+import os
 import pytest
 from io import StringIO
-from chartparser.parser import Parser
-from chartparser.language import Grammar, Lexicon
+from chartparser.parser import Parser, ParseCancelled, Budget
+from chartparser.language import Grammar, Lexicon, CompactLexicon, LRUCache
 from chartparser.rule import Terminal, NonTerminal
 from chartparser.arc import Arc
 from chartparser.chart import Chart
 from chartparser.agenda import Agenda
+from chartparser.export import ChartWriter, ChartReader
+from chartparser.kbest import KBest
+from chartparser.ambiguity import Ambiguity
+from chartparser.generate import Generator
+from chartparser.constraints import Constraints
 
 
 ###############
@@ -251,6 +257,26 @@ def test_lexicon_len():
     assert len(lexicon) == 2
 
 
+def test_lexicon_extend():
+    lexicon = Lexicon()
+    lexicon.extend([Terminal('N', 'HORSE'), 'eats : v', ('horse', ' x ')])
+    assert lexicon['HORSE'] == {Terminal('N', 'HORSE'), Terminal('X', 'HORSE')}
+    assert lexicon.version == 1
+    with pytest.raises(ValueError):
+        lexicon.extend([('cow', 'N'), ('eats', 'V')])
+    with pytest.raises(ValueError):
+        lexicon.extend([('cow', 'N'), 'COW : n'])
+    with pytest.raises(ValueError):
+        lexicon.extend([('cow',)])
+    assert 'COW' not in lexicon.lexicon
+    assert lexicon.version == 1
+    frozen = Lexicon.from_rules(str(complex_lexicon).splitlines())
+    assert frozen.frozen
+    assert str(frozen) == str(complex_lexicon)
+    with pytest.raises(TypeError):
+        frozen.extend([('cow', 'N')])
+
+
 def test_print_lexicon():
     lexicon = Lexicon()
     lexicon.load(StringIO(test_lex))
@@ -285,6 +311,27 @@ def test_grammar_add():
         NonTerminal('NP', 'N'), NonTerminal('NP', 'N', 'Y')}
 
 
+def test_grammar_extend():
+    grammar = Grammar()
+    grammar.extend([
+        NonTerminal('NP', 'N'), 'vp --> v np', ('NP', 'n y'),
+        ('S', ['NP', 'VP'], 2.0)])
+    assert grammar['N'] == {
+        NonTerminal('NP', 'N'), NonTerminal('NP', 'N', 'Y')}
+    assert [rule.weight for rule in grammar['NP']] == [2.0]
+    assert grammar.version == 1
+    with pytest.raises(ValueError):
+        grammar.extend(['VP --> V', 'VP --> V NP'])
+    with pytest.raises(ValueError):
+        grammar.extend(['VP --> V', ('vp', 'v')])
+    with pytest.raises(ValueError):
+        grammar.extend([Terminal('N', 'DOG')])
+    assert grammar.version == 1
+    frozen = Grammar.from_rules(test_gram.strip().splitlines())
+    assert frozen.frozen
+    assert len(frozen) == 5
+
+
 test_gram = """
     S --> NP VP
     NP --> DT N
@@ -327,6 +374,107 @@ def test_grammar_str():
     assert result == answer
 
 
+def test_grammar_min_yields():
+    assert complex_grammar.min_yields() == {'S': 2, 'NP': 1, 'VP': 1}
+    grammar = Grammar.from_rules([
+        'S --> XP VP', 'XP --> NP', 'NP --> DT ADJ N', 'NP --> DT N',
+        'VP --> V', 'X --> X Y'])
+    assert grammar.min_yields()['S'] == 3
+    assert grammar.min_yields()['X'] == float('inf')
+    assert grammar.min_yields() is grammar.min_yields(())
+    # a parent that is also a part of speech yields one word, and so
+    # does every parent above it
+    yields = grammar.min_yields({'NP', 'V'})
+    assert yields['NP'] == yields['XP'] == 1
+    assert yields['S'] == 2
+    assert grammar.min_yields()['S'] == 3
+    # parts of speech that are not parents share the yields without them
+    assert grammar.min_yields({'DT', 'N'}) is grammar.min_yields()
+    assert grammar.min_yields({'NP', 'V', 'DT'}) is yields
+
+
+def test_lru_cache():
+    cache = LRUCache(2)
+    assert cache.get('a', lambda: 1) == 1
+    assert cache.get('b', lambda: 2) == 2
+    assert cache.get('a', lambda: 3) == 1
+    assert cache.get('c', lambda: 4) == 4
+    assert len(cache) == 2
+    assert 'a' in cache and 'b' not in cache
+    with pytest.raises(ValueError):
+        LRUCache(0)
+    # tag sets differing only in parts of speech that are not parents
+    # share one cached entry
+    grammar = Grammar.from_rules(['S --> NP VP', 'NP --> N', 'VP --> V'])
+    for tag in range(Grammar.YIELDS_CACHED + 1):
+        grammar.min_yields({'N', 'V', 'TAG{}'.format(tag)})
+    assert len(grammar._cached('min_yields', None)) == 1
+
+
+def test_snapshot():
+    grammar = Grammar()
+    grammar.load(StringIO(test_gram))
+    version = grammar.version
+    snapshot = grammar.snapshot()
+    assert snapshot.frozen
+    assert snapshot.snapshot() is snapshot
+    grammar.add(NonTerminal('NP', 'ADJ', 'N'))
+    assert grammar.version == version + 1
+    assert 'ADJ' in grammar
+    assert 'ADJ' not in snapshot
+    assert len(snapshot) == 5
+    # adding an existing rule publishes nothing
+    grammar.add(NonTerminal('NP', 'ADJ', 'N'))
+    assert grammar.version == version + 1
+    with pytest.raises(TypeError):
+        snapshot.add(NonTerminal('NP', 'ADJ', 'N'))
+    with pytest.raises(TypeError):
+        snapshot.load(StringIO(test_gram))
+
+
+def test_update():
+    grammar = Grammar()
+    grammar.load(StringIO(test_gram))
+    grammar.update(
+        added=[NonTerminal('NP', 'ADJ', 'N')],
+        removed=[NonTerminal('NP', 'PN'), NonTerminal('NP', 'X')])
+    assert len(grammar) == 5
+    assert 'PN' not in grammar
+    assert grammar['ADJ'] == {NonTerminal('NP', 'ADJ', 'N')}
+    version = grammar.version
+    grammar.update(removed=[NonTerminal('NP', 'PN')])
+    assert grammar.version == version
+
+
+def test_watch(tmp_path):
+    from chartparser.watch import Watcher
+    path = tmp_path / 'grammar.txt'
+    path.write_text(test_gram)
+    grammar = Grammar()
+    watcher = Watcher(grammar, str(path))
+    assert watcher.poll()
+    assert len(grammar) == 5
+    assert not watcher.poll()
+    snapshot = grammar.snapshot()
+
+    path.write_text(test_gram + 'NP --> ADJ N\n')
+    os.utime(str(path), ns=(1, 1))
+    assert watcher.poll()
+    assert len(grammar) == 6
+    assert len(snapshot) == 5
+
+    # touched but unchanged files are not reloaded
+    os.utime(str(path), ns=(2, 2))
+    version = grammar.version
+    assert not watcher.poll()
+    assert grammar.version == version
+
+    path.write_text('S NP VP')
+    with pytest.raises(ValueError):
+        watcher.poll()
+    assert len(grammar) == 6
+
+
 simple_grammar = Grammar()
 simple_grammar.load(StringIO("""
     S --> NP VP
@@ -459,6 +607,33 @@ def test_extend():
         assert arc in agenda
 
 
+def test_agenda_unfinishable():
+    agenda = Agenda(['I', 'I'], simple_lexicon, grammar=simple_grammar)
+    size = len(agenda)
+    # S --> NP VP needs two words, so it is predicted from the first only
+    agenda.predict(simple_grammar, Arc(NonTerminal('NP', 'PN'), 1, 2, 1))
+    assert len(agenda) == size
+    agenda.predict(simple_grammar, Arc(NonTerminal('NP', 'PN'), 0, 1, 1))
+    assert len(agenda) == size + 1
+
+
+def test_agenda_complete():
+    agenda = Agenda(simple_tokens, simple_lexicon)
+    chart = Chart(simple_tokens)
+    pn = Arc(Terminal('PN', 'I'), 0, 1, 1)
+    np = Arc(NonTerminal('NP', 'PN'), 0, 0, 0).get_extended(pn)
+    sleep = Arc(Terminal('V', 'SLEEP'), 1, 2, 1)
+    vp = Arc(NonTerminal('VP', 'V'), 1, 1, 0).get_extended(sleep)
+    for arc in [pn, np, sleep, vp]:
+        chart.add(arc)
+    # S --> NP VP reaches the VP after it was chosen, so it is caught up
+    s = Arc(NonTerminal('S', 'NP', 'VP'), 0, 0, 0)
+    agenda.agenda = [s.get_extended(np)]
+    assert agenda.complete(chart)
+    assert agenda.chart is chart
+    assert Arc(NonTerminal('S', 'NP', 'VP'), 0, 2, 2) in agenda
+
+
 #########
 # PARSE #
 #########
@@ -488,3 +663,878 @@ def test_complex_chartparse():
 
 def test_complex_parse():
     assert complex_parser.parse(complex_sentence) == complex_parse
+
+
+def test_parse_late_extension():
+    # needs VP --> VP NP over an arc found before it was predicted
+    assert complex_parser.parse('i can play i i i') == (
+        '[.S [.NP [.PN I]][.VP [.VP [.VP [.AUX CAN][.VP [.VP [.V PLAY]]'
+        '[.NP [.PN I]]]][.NP [.PN I]]][.NP [.PN I]]]]')
+    assert complex_parser.count_parses('i can play i i i') == 4
+
+
+def test_cancel_parse():
+    import threading
+    cancel = threading.Event()
+    assert complex_parser.parse(complex_sentence, cancel) == complex_parse
+    cancel.set()
+    with pytest.raises(ParseCancelled):
+        complex_parser.parse(complex_sentence, cancel)
+
+
+########
+# BEAM #
+########
+
+
+def test_arc_cost():
+    key = Arc(Terminal('N', 'cat'), start=0, end=1, dot=1)
+    arc = Arc(NonTerminal('NP', 'N', weight=2.5), start=0, end=0, dot=0)
+    assert key.cost == 1.0
+    assert arc.get_extended(key).cost == 3.5
+
+
+def test_chart_beam():
+    chart = Chart(['CAN'], beam=1)
+    assert chart.add(Arc(Terminal('N', 'CAN'), 0, 1, 1))
+    assert not chart.add(Arc(Terminal('N', 'CAN'), 0, 1, 1))
+    assert not chart.add(Arc(Terminal('AUX', 'CAN'), 0, 1, 1))
+    # an arc pruned again is counted once
+    assert not chart.add(Arc(Terminal('AUX', 'CAN'), 0, 1, 1))
+    assert chart.pruned == {(0, 1): 1}
+    assert chart.num_pruned == 1
+
+
+def test_scored_agenda():
+    agenda = Agenda(['CAN'], complex_lexicon, scored=True)
+    agenda._add(Arc(NonTerminal('NP', 'N', weight=0.5), 0, 0, 0))
+    agenda._add(Arc(Terminal('V', 'CAN', weight=0.5), 0, 1, 1))
+    agenda._add(Arc(Terminal('N', 'CAN', weight=0.5), 0, 1, 1))
+    assert len(agenda) == 5
+    # cheapest complete arc first, in the order added among equal costs
+    chosen = [agenda.choose_next().rule for _ in range(4)]
+    assert chosen == [
+        Terminal('V', 'CAN'), Terminal('N', 'CAN'),
+        Terminal('AUX', 'CAN'), Terminal('N', 'CAN')]
+    assert [arc.cost for arc in agenda] == [0.5]
+    with pytest.raises(ValueError):
+        agenda.choose_next()
+
+
+def test_chart_threshold():
+    chart = Chart(['CAN'], threshold=0.5)
+    assert chart.add(Arc(Terminal('N', 'CAN'), 0, 1, 1))
+    assert chart.add(Arc(Terminal('V', 'CAN', weight=1.5), 0, 1, 1))
+    assert not chart.add(Arc(Terminal('AUX', 'CAN', weight=2.0), 0, 1, 1))
+    assert chart.num_pruned == 1
+
+
+def test_beam_parse():
+    parser = Parser(complex_grammar, complex_lexicon, beam=10)
+    parse, chart = parser.parse_chart(complex_sentence)
+    assert parse == complex_parse
+    assert chart.num_pruned == 0
+    parser = Parser(complex_grammar, complex_lexicon, beam=1)
+    with pytest.raises(ValueError):
+        parser.parse(complex_sentence)
+
+
+###########
+# THREADS #
+###########
+
+
+def test_parser_defaults():
+    parser1 = Parser()
+    parser2 = Parser()
+    assert parser1.grammar is not parser2.grammar
+    assert parser1.lexicon is not parser2.lexicon
+    with pytest.raises(AttributeError):
+        parser1.grammar = Grammar()
+
+
+def test_concurrent_parse():
+    from concurrent.futures import ThreadPoolExecutor
+    lexicon = Lexicon()
+    lexicon.load(StringIO(str(complex_lexicon)))
+    parser = Parser(complex_grammar, lexicon)
+
+    def add_words():
+        for i in range(200):
+            lexicon.add(Terminal('N', 'WORD{}'.format(i)))
+
+    with ThreadPoolExecutor(4) as pool:
+        writer = pool.submit(add_words)
+        parses = list(pool.map(parser.parse, [complex_sentence] * 20))
+        writer.result()
+    assert parses == [complex_parse] * 20
+    assert len(lexicon) == len(complex_lexicon) + 200
+
+
+###########
+# PROFILE #
+###########
+
+
+def test_rule_profile():
+    from chartparser.profiling import RuleProfile
+    profile = RuleProfile().run(simple_parser, [simple_sentence, 'i i'])
+    assert profile.parsed == 1
+    assert profile.failed == 1
+    rows = {rule: counts for rule, *counts in profile.rows()}
+    assert rows[NonTerminal('S', 'NP', 'VP')][2] == 1
+    # one predicted and one extended arc per pronoun
+    assert rows[NonTerminal('NP', 'PN')] == [6, 3, 1]
+    assert all(Terminal('PN', 'I') != rule for rule in rows)
+    assert str(profile).splitlines()[-1] == '1 parsed, 1 failed'
+
+
+def test_memory_profile():
+    import tracemalloc
+    from chartparser.profiling import MemoryProfile
+    profile = MemoryProfile().run(simple_parser, [simple_sentence, 'i i'])
+    assert profile.parsed == 1
+    assert profile.failed == 1
+    # the S arcs predicted and half extended from the first 'i' never
+    # complete; the S arc predicted from the second is never made
+    assert profile.arcs == 13
+    assert profile.garbage == 2
+    assert set(profile.components) == {'agenda', 'chart', 'arcs', 'history'}
+    assert all(size > 0 for size in profile.components.values())
+    assert profile.modules['arc.py'] > 0
+    assert 'profiling.py' not in profile.modules
+    assert profile.peak[0] > 0 and profile.peak[1] == 2
+    assert not tracemalloc.is_tracing()
+    assert str(profile).splitlines()[-2] == 'arcs:       13 created, 2 garbage'
+    rows = {rule: counts for rule, *counts in profile.rows()}
+    assert rows[NonTerminal('S', 'NP', 'VP')] == [5, 1, 1]
+
+
+############
+# ANALYSIS #
+############
+
+
+def test_analysis():
+    from chartparser.analysis import Analysis
+    grammar = Grammar()
+    grammar.load(StringIO("""
+        S --> NP VP
+        NP --> PN
+        NP --> NBAR
+        NBAR --> NP
+        VP --> V
+        VP --> V XP
+        XP --> X XP
+        ADJP --> ADJ
+        """))
+    analysis = Analysis(grammar, simple_lexicon)
+    assert analysis.nonproductive == {
+        NonTerminal('VP', 'V', 'XP'), NonTerminal('XP', 'X', 'XP'),
+        NonTerminal('ADJP', 'ADJ')}
+    assert analysis.unreachable == set()
+    assert analysis.cycles == [['NBAR', 'NP']]
+    pruned = analysis.prune()
+    assert len(pruned) == 5
+    assert Parser(pruned, simple_lexicon).parse(simple_sentence) == \
+        simple_parse
+
+    lexicon = Lexicon()
+    lexicon.load(StringIO(str(simple_lexicon) + '\nbig : ADJ'))
+    analysis = Analysis(grammar, lexicon)
+    assert analysis.unreachable == {NonTerminal('ADJP', 'ADJ')}
+    assert 'Unary cycles: 1' in str(analysis)
+
+
+#################
+# UNARY CLOSURE #
+#################
+
+chain_grammar = Grammar()
+chain_grammar.load(StringIO("""
+    S --> NP VP
+    NP --> NBAR
+    NBAR --> N
+    NBAR --> NP
+    VP --> V
+    """))
+chain_lexicon = Lexicon()
+chain_lexicon.load(StringIO("""
+    dogs : N
+    bark : V
+    """))
+
+
+def test_unary_closure():
+    closure = chain_grammar.unary_closure
+    assert closure['N'] == (
+        (NonTerminal('NBAR', 'N'),),
+        (NonTerminal('NBAR', 'N'), NonTerminal('NP', 'NBAR')))
+    # chains stop before repeating a symbol
+    assert closure['NP'] == ((NonTerminal('NBAR', 'NP'),),)
+    assert chain_grammar.snapshot().unary_closure is closure
+
+
+def test_closure_predict():
+    agenda = Agenda(['DOGS', 'BARK'], chain_lexicon, closure=True)
+    current = agenda.choose_next()
+    agenda.predict(chain_grammar, current)
+    my_agenda = [
+        Arc(Terminal('V', 'BARK'), 1, 2, 1),
+        Arc(NonTerminal('NBAR', 'N'), 0, 1, 1),
+        Arc(NonTerminal('NP', 'NBAR'), 0, 1, 1)]
+    for arc in my_agenda:
+        assert arc in agenda
+    for arc in agenda:
+        assert arc in my_agenda
+
+
+def test_closure_parse():
+    parse = '[.S [.NP [.NBAR [.N DOGS]]][.VP [.V BARK]]]'
+    parser = Parser(chain_grammar, chain_lexicon, closure=True)
+    assert parser.parse('dogs bark') == parse
+    parser = Parser(complex_grammar, complex_lexicon, closure=True)
+    assert parser.parse(complex_sentence) == complex_parse
+
+
+###########
+# LATTICE #
+###########
+
+
+def test_lexicon_terminals():
+    assert complex_lexicon.terminals('CAN') == (
+        Terminal('AUX', 'CAN'), Terminal('N', 'CAN'))
+    assert complex_lexicon.terminals('CAN') is \
+        complex_lexicon.snapshot().terminals('CAN')
+    with pytest.raises(KeyError):
+        complex_lexicon.terminals('STRUM')
+
+
+def test_lattice_agenda():
+    agenda = Agenda(
+        ['CAN', 'STRUM'], complex_lexicon, tags=[{'AUX'}, {'V'}])
+    assert list(agenda) == [
+        Arc(Terminal('AUX', 'CAN'), 0, 1, 1),
+        Arc(Terminal('V', 'STRUM'), 1, 2, 1)]
+
+
+def test_parse_lattice():
+    lattice = [(token, None) for token in complex_sentence.split()]
+    lattice[3] = ('can', ['aux'])
+    lattice[4] = ('play', ['V'])
+    assert complex_parser.parse_lattice(lattice) == complex_parse
+    assert complex_parser.parse_lattice([('i', None), ('strum', ['V'])]) == \
+        '[.S [.NP [.PN I]][.VP [.V STRUM]]]'
+    lattice[4] = ('play', ['N'])
+    with pytest.raises(ValueError):
+        complex_parser.parse_lattice(lattice)
+    with pytest.raises(ValueError):
+        complex_parser.parse_lattice([('five string', None)])
+
+
+###################
+# COMPACT LEXICON #
+###################
+
+
+def test_compact_lexicon():
+    lexicon = CompactLexicon()
+    lexicon.load(StringIO(str(complex_lexicon)))
+    assert str(lexicon) == str(complex_lexicon)
+    assert len(lexicon) == len(complex_lexicon)
+    assert list(lexicon) == sorted(complex_lexicon)
+    assert lexicon.terminals('CAN') == complex_lexicon.terminals('CAN')
+    assert lexicon['CAN'] == complex_lexicon['CAN']
+    assert lexicon.tags('CAN') == ('AUX', 'N')
+    assert lexicon.parts_of_speech == complex_lexicon.parts_of_speech
+    assert 'GUITAR' in lexicon
+    assert 'STRUM' not in lexicon
+    with pytest.raises(KeyError):
+        lexicon.terminals('STRUM')
+    with pytest.raises(KeyError):
+        lexicon.tags('ZZZ')
+
+
+def test_compact_lexicon_update():
+    lexicon = CompactLexicon()
+    lexicon.load(StringIO(str(complex_lexicon)))
+    snapshot = lexicon.snapshot()
+    version = lexicon.version
+    lexicon.update(
+        added=[Terminal('V', 'STRUM')], removed=[Terminal('N', 'CAN')])
+    assert lexicon.version == version + 1
+    assert lexicon.tags('STRUM') == ('V',)
+    assert lexicon.tags('CAN') == ('AUX',)
+    assert snapshot.tags('CAN') == ('AUX', 'N')
+    assert 'STRUM' not in snapshot
+    lexicon.add(Terminal('V', 'STRUM'))
+    assert lexicon.version == version + 1
+    with pytest.raises(TypeError):
+        snapshot.add(Terminal('V', 'STRUM'))
+
+
+def test_compact_lexicon_extend():
+    lexicon = CompactLexicon()
+    lexicon.extend([('play', 'V'), 'play : n', Terminal('PN', 'I')])
+    assert lexicon.tags('PLAY') == ('N', 'V')
+    with pytest.raises(ValueError):
+        lexicon.extend([('I', 'PN')])
+    frozen = CompactLexicon.from_rules(str(complex_lexicon).splitlines())
+    assert frozen.frozen
+    assert str(frozen) == str(complex_lexicon)
+
+
+def test_compact_lexicon_weights():
+    lexicon = CompactLexicon()
+    lexicon.extend([('can', 'V', 2.5), ('can', 'aux'), ('play', 'V', 0.5)])
+    assert [t.weight for t in lexicon.terminals('CAN')] == [1.0, 2.5]
+    lexicon.update(
+        added=[Terminal('N', 'CAN', weight=4.0)],
+        removed=[Terminal('V', 'PLAY')])
+    assert {t.pos: t.weight for t in lexicon.terminals('CAN')} == {
+        'AUX': 1.0, 'N': 4.0, 'V': 2.5}
+    # a part of speech left without entries is dropped
+    assert 'PLAY' not in lexicon
+    lexicon.update(removed=[Terminal('AUX', 'CAN')])
+    assert lexicon.parts_of_speech == {'N', 'V'}
+    assert lexicon.tags('CAN') == ('N', 'V')
+    frozen = CompactLexicon.from_rules([('strum', 'V', 3.0)])
+    assert frozen.terminals('STRUM')[0].weight == 3.0
+
+
+def test_compact_lexicon_threads():
+    from concurrent.futures import ThreadPoolExecutor
+    lexicon = CompactLexicon()
+
+    def add_words(thread):
+        for i in range(150):
+            word = 'WORD{}X{}'.format(thread, i)
+            lexicon.update(added=[Terminal('N', word)])
+
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(add_words, range(4)))
+    assert len(lexicon) == 600
+    assert lexicon.version == 600
+
+
+def test_compact_lexicon_parse():
+    lexicon = CompactLexicon()
+    lexicon.load(StringIO(str(complex_lexicon)))
+    parser = Parser(complex_grammar, lexicon)
+    assert parser.parse(complex_sentence) == complex_parse
+    with pytest.raises(KeyError):
+        parser.parse('I strum')
+
+
+##########
+# EXPORT #
+##########
+
+
+def test_chart_derivations():
+    chart = complex_parser._chartparse(*complex_tokens, exhaustive=True)
+    derivations = chart.derivations(chart.sentence)
+    assert len(derivations) == 2
+    assert derivations[0][0] is derivations[1][0]
+    assert {arc.rule for _, arc in derivations} == {
+        NonTerminal('VP', 'AUX', 'VP'), NonTerminal('VP', 'VP', 'NP')}
+    assert chart.derivations(chart.sentence)[0] == \
+        tuple(chart.sentence.history)
+    for arc in chart:
+        if arc.rule.is_terminal:
+            assert chart.derivations(arc) == [()]
+    # the chart for the first parse only keeps each arc's own history
+    chart = complex_parser._chartparse(*complex_tokens)
+    assert not chart.packed
+    assert chart.derivations(chart.sentence) == [
+        tuple(chart.sentence.history)]
+
+
+def test_chart_export():
+    f = StringIO()
+    writer = ChartWriter(f).run(
+        complex_parser, [complex_sentence, 'i sleep', 'the boy can play'])
+    assert (writer.sentences, writer.parsed, writer.failed) == (3, 2, 1)
+    f.seek(0)
+    forests = iter(ChartReader(f))
+    forest = next(forests)
+    chart = complex_parser._chartparse(*complex_tokens, exhaustive=True)
+    assert forest.tokens == complex_tokens
+    assert forest.tree() == complex_parser._backtrace(chart)
+    assert [(arc.rule, arc.start, arc.end) for arc in forest] == \
+        [(arc.rule, arc.start, arc.end) for arc in chart]
+    for arc, other in zip(forest, chart):
+        assert arc.cost == other.cost
+        assert [[(child.rule, child.start) for child in children]
+                for children in forest.derivations(arc)] == \
+            [[(child.rule, child.start) for child in children]
+             for children in chart.derivations(other)]
+    forest = next(forests)
+    assert forest.tokens == ['I', 'SLEEP']
+    assert not forest.is_sentence
+    assert forest.sentence is None
+    forest = next(forests)
+    assert forest.tree() == \
+        '[.S [.NP [.DT THE][.N BOY]][.VP [.AUX CAN][.VP [.V PLAY]]]]'
+    with pytest.raises(StopIteration):
+        next(forests)
+    with pytest.raises(ValueError):
+        list(ChartReader(StringIO('{"what": 1}\n')))
+
+
+###########
+# PARTIAL #
+###########
+
+
+def test_chart_cover():
+    chart = Chart(['THE', 'BOY', 'SLEPT'])
+    chart.add(Arc(Terminal('DT', 'THE'), 0, 1, 1))
+    chart.add(Arc(Terminal('N', 'BOY'), 1, 2, 1))
+    chart.add(Arc(Terminal('V', 'SLEPT'), 2, 3, 1))
+    chart.add(Arc(NonTerminal('NP', 'DT', 'N'), 0, 2, 2))
+    chart.add(Arc(NonTerminal('VP', 'V'), 2, 3, 1))
+    assert [arc.rule for arc in chart.cover()] == [
+        NonTerminal('NP', 'DT', 'N'), NonTerminal('VP', 'V')]
+    with pytest.raises(ValueError):
+        Chart(['THE', 'BOY']).cover()
+
+
+def test_parse_partial():
+    assert complex_parser.parse_partial(complex_sentence) == [complex_parse]
+    assert complex_parser.parse_partial('the little boy can play the') == [
+        '[.S [.NP [.DT THE][.ADJ LITTLE][.N BOY]]'
+        '[.VP [.AUX CAN][.VP [.V PLAY]]]]',
+        '[.DT THE]']
+    assert complex_parser.parse_partial('the boy the guitar') == [
+        '[.NP [.DT THE][.N BOY]]', '[.NP [.DT THE][.N GUITAR]]']
+    with pytest.raises(KeyError):
+        complex_parser.parse_partial('the boy strums')
+
+
+##########
+# K-BEST #
+##########
+
+
+def test_parse_kbest():
+    parses = list(complex_parser.parse_kbest(complex_sentence))
+    assert len(parses) == 2
+    assert complex_parse in [parse for parse, _ in parses]
+    assert [cost for _, cost in parses] == [13.0, 13.0]
+    assert list(complex_parser.parse_kbest(simple_sentence.replace(
+        'sleep', 'play'))) == [('[.S [.NP [.PN I]][.VP [.V PLAY]]]', 5.0)]
+    assert len(list(complex_parser.parse_kbest(complex_sentence, 1))) == 1
+    with pytest.raises(ValueError):
+        complex_parser.parse_kbest('the boy the guitar')
+
+
+def test_kbest_order():
+    grammar = Grammar()
+    grammar.load(StringIO("""
+        S --> NP VP
+        NP --> DT N
+        VP --> V NP
+        VP --> VP PP
+        PP --> P NP
+        """))
+    grammar.add(NonTerminal('NP', 'NP', 'PP', weight=3.0))
+    lexicon = Lexicon()
+    lexicon.load(StringIO("""
+        the : DT
+        man : N
+        dog : N
+        river : N
+        saw : V
+        by : P
+        """))
+    parser = Parser(grammar, lexicon)
+    assert list(parser.parse_kbest('the man saw the dog by the river')) == [
+        ('[.S [.NP [.DT THE][.N MAN]][.VP [.VP [.V SAW][.NP [.DT THE]'
+         '[.N DOG]]][.PP [.P BY][.NP [.DT THE][.N RIVER]]]]]', 15.0),
+        ('[.S [.NP [.DT THE][.N MAN]][.VP [.V SAW][.NP [.NP [.DT THE]'
+         '[.N DOG]][.PP [.P BY][.NP [.DT THE][.N RIVER]]]]]]', 17.0)]
+
+
+def test_kbest_forest():
+    f = StringIO()
+    ChartWriter(f).run(complex_parser, [complex_sentence])
+    f.seek(0)
+    forest, = ChartReader(f)
+    chart = complex_parser._chartparse(*complex_tokens, exhaustive=True)
+    assert list(KBest(forest)) == list(KBest(chart))
+
+
+def test_kbest_cycle():
+    grammar = Grammar()
+    grammar.load(StringIO("""
+        S --> NP VP
+        NP --> PN
+        NP --> NBAR
+        NBAR --> NP
+        VP --> V
+        """))
+    parser = Parser(grammar, simple_lexicon)
+    with pytest.raises(ValueError):
+        parser.parse_kbest(simple_sentence)
+
+
+#############
+# AMBIGUITY #
+#############
+
+
+def test_count_parses():
+    assert complex_parser.count_parses(complex_sentence) == 2
+    assert complex_parser.count_parses('i play') == 1
+    assert complex_parser.count_parses('the boy the guitar') == 0
+    with pytest.raises(KeyError):
+        complex_parser.count_parses('the boy strums')
+
+
+def test_ambiguity_spans():
+    ambiguity = complex_parser.ambiguity(complex_sentence)
+    spans = ambiguity.spans()
+    assert spans[(0, 7)] == (1, 2)
+    assert spans[(3, 7)] == (2, 2)
+    assert spans[(3, 4)] == (2, 2)
+    assert spans[(0, 3)] == (1, 1)
+    assert str(ambiguity).splitlines()[:3] == [
+        '2 parses',
+        '    0-7 THE LITTLE BOY CAN PLAY THE GUITAR: 1 arcs, 2 parses',
+        '    3-7 CAN PLAY THE GUITAR: 2 arcs, 2 parses']
+
+
+def test_count_parses_catalan():
+    grammar = Grammar()
+    grammar.load(StringIO("""
+        S --> S S
+        S --> A
+        """))
+    lexicon = Lexicon()
+    lexicon.load(StringIO('a : A'))
+    parser = Parser(grammar, lexicon)
+    # the number of binary bracketings of n words is a Catalan number
+    assert [parser.count_parses(' '.join('a' * n)) for n in range(1, 8)] == [
+        1, 1, 2, 5, 14, 42, 132]
+
+
+def test_ambiguity_large():
+    size = 40
+    chart = Chart(['A'] * size, packed=True)
+    top = {}
+    for i in range(size):
+        terminal = Arc(Terminal('A', 'A'), i, i + 1, 1)
+        chart.add(terminal)
+        top[(i, i + 1)] = Arc(NonTerminal('S', 'A'), i, i + 1, 1, [terminal])
+        chart.add(top[(i, i + 1)])
+    for width in range(2, size + 1):
+        for i in range(size - width + 1):
+            for k in range(i + 1, i + width):
+                arc = Arc(
+                    NonTerminal('S', 'S', 'S'), i, i + width, 2,
+                    [top[(i, k)], top[(k, i + width)]])
+                chart.add(arc)
+                top.setdefault((i, i + width), arc)
+    # beyond what fits in 64 bits
+    assert Ambiguity(chart).count == 680425371729975800390
+
+
+#############
+# GENERATOR #
+#############
+
+
+def test_generator():
+    generator = Generator(
+        complex_grammar, complex_lexicon, seed=3, min_length=3, max_length=6)
+    sentences = [generator.generate() for _ in range(20)]
+    again = Generator(
+        complex_grammar, complex_lexicon, seed=3, min_length=3, max_length=6)
+    assert [again.generate() for _ in range(20)] == sentences
+    for sentence, parse in sentences:
+        assert 3 <= len(sentence.split()) <= 6
+        assert sentence == sentence.lower()
+        assert parse in [tree for tree, _ in complex_parser.parse_kbest(
+            sentence)]
+    f = StringIO()
+    Generator(complex_grammar, complex_lexicon, seed=3).write(f, 5)
+    assert len(f.getvalue().splitlines()) == 5
+    with pytest.raises(ValueError):
+        Generator(complex_grammar, complex_lexicon, max_depth=1)
+    with pytest.raises(ValueError):
+        Generator(complex_grammar, complex_lexicon, max_length=1).generate(10)
+
+
+def test_generator_max_parses():
+    generator = Generator(
+        complex_grammar, complex_lexicon, seed=3, min_length=5,
+        max_length=8, max_parses=1)
+    for _ in range(10):
+        sentence, _ = generator.generate()
+        assert complex_parser.count_parses(sentence) == 1
+
+
+def test_generated_parse():
+    generator = Generator(complex_grammar, complex_lexicon, seed=0)
+    for _ in range(50):
+        sentence, _ = generator.generate()
+        complex_parser.parse(sentence)
+
+
+############
+# BACKENDS #
+############
+
+
+def backends():
+    from chartparser import core
+    names = ['python']
+    if core.compiled() is not None:
+        names.append('native')
+    return names
+
+
+@pytest.mark.parametrize('backend', backends())
+def test_backend(backend):
+    parser = Parser(simple_grammar, simple_lexicon, backend=backend)
+    assert parser.backend == backend
+    assert parser.parse(simple_sentence) == simple_parse
+    parser = Parser(complex_grammar, complex_lexicon, backend=backend)
+    assert parser.parse(complex_sentence) == complex_parse
+    assert parser.parse('i can play i i i') == \
+        complex_parser.parse('i can play i i i')
+    lattice = [(token, None) for token in complex_sentence.split()]
+    lattice[3] = ('can', ['aux'])
+    assert parser.parse_lattice(lattice) == complex_parse
+    generator = Generator(complex_grammar, complex_lexicon, seed=1)
+    for _ in range(30):
+        sentence, _ = generator.generate()
+        assert parser.parse(sentence) == complex_parser.parse(sentence)
+    with pytest.raises(KeyError):
+        parser.parse('the five string')
+    with pytest.raises(ValueError):
+        parser.parse('the the')
+    # profiled parses run over arcs
+    from chartparser.profiling import RuleProfile
+    profile = RuleProfile().run(parser, [complex_sentence])
+    assert profile.parsed == 1
+
+
+def test_backend_tagged_parent():
+    # every backend finds a parse exactly when the recognizer does, where
+    # a parent is also a part of speech and so are the parents above it
+    pytest.importorskip('numpy')
+    grammar = Grammar.from_rules([
+        'S --> XP VP', 'XP --> NP', 'NP --> DT N', 'VP --> V'])
+    lexicon = Lexicon.from_rules([
+        ('it', 'NP'), ('the', 'DT'), ('dog', 'N'), ('sleeps', 'V')])
+    sentences = [
+        'it sleeps', 'the dog sleeps', 'it', 'sleeps it', 'it it sleeps']
+    for backend in ['arcs'] + backends():
+        parser = Parser(grammar, lexicon, backend=backend)
+        for sentence in sentences:
+            if parser.recognize(sentence):
+                assert parser.parse(sentence)
+            else:
+                with pytest.raises(ValueError):
+                    parser.parse(sentence)
+    parser = Parser(grammar, lexicon)
+    assert parser.parse('it sleeps') == \
+        '[.S [.XP [.NP IT]][.VP [.V SLEEPS]]]'
+    assert parser.count_parses('it sleeps') == 1
+
+
+def test_backend_options():
+    with pytest.raises(ValueError):
+        Parser(simple_grammar, simple_lexicon, backend='fortran')
+    with pytest.raises(ValueError):
+        Parser(simple_grammar, simple_lexicon, beam=2, backend='python')
+    with pytest.raises(ValueError):
+        Parser(simple_grammar, simple_lexicon, closure=True, backend='python')
+    assert simple_parser.backend == 'arcs'
+
+
+###########
+# PACKAGE #
+###########
+
+
+def test_package_lazy():
+    import subprocess
+    import sys
+    code = (
+        'import sys, chartparser; '
+        'before = {m for m in sys.modules if m.startswith("chartparser.")}; '
+        'chartparser.Parser; '
+        'print(sorted(before), "tkinter" in sys.modules, '
+        '"numpy" in sys.modules, "chartparser.gui" in sys.modules)')
+    output = subprocess.run(
+        [sys.executable, '-c', code], check=True, capture_output=True,
+        text=True, cwd=os.path.dirname(os.path.dirname(
+            os.path.dirname(os.path.abspath(__file__))))).stdout
+    assert output.split() == ['[]', 'False', 'False', 'False']
+
+
+def test_package_api():
+    import chartparser
+    assert chartparser.Parser is Parser
+    assert 'load_grammar' in dir(chartparser)
+    with pytest.raises(AttributeError):
+        chartparser.Recognizer
+    grammar = chartparser.load_grammar(StringIO('S --> NP VP\nNP --> PN\n'))
+    assert len(grammar['NP']) == 1
+    path = os.path.join(
+        os.path.dirname(chartparser.__file__), 'data', 'sample_lexicon.txt')
+    lexicon = chartparser.load_lexicon(path)
+    assert lexicon.terminals('I')
+
+
+#########
+# ASYNC #
+#########
+
+
+def test_budget():
+    budget = Budget(steps=2)
+    assert not budget.tick()
+    assert not budget.tick()
+    assert not budget.is_set()
+    assert budget.tick()
+    # asking does not take a step
+    assert budget.is_set()
+    assert budget.taken == 3
+    with pytest.raises(ParseCancelled):
+        complex_parser.parse(complex_sentence, cancel=Budget(steps=5))
+    with pytest.raises(ParseCancelled):
+        complex_parser.parse(complex_sentence, cancel=Budget(seconds=-1))
+    budget = Budget()
+    assert complex_parser.parse(complex_sentence, cancel=budget) == \
+        complex_parse
+    assert budget.taken > 5
+    budget.set()
+    assert budget.is_set()
+
+
+def test_parse_async():
+    import asyncio
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+
+    async def run():
+        parse = await complex_parser.parse_async(complex_sentence)
+        with pytest.raises(ValueError):
+            await complex_parser.parse_async('the the')
+        with pytest.raises(ParseCancelled):
+            await complex_parser.parse_async(
+                complex_sentence, cancel=Budget(steps=1))
+        with pytest.raises(TypeError):
+            await complex_parser.parse_async(
+                complex_sentence, cancel=object())
+        return parse
+
+    assert asyncio.run(run()) == complex_parse
+
+    # cancelling the await sets the flag, so the parse waiting for the
+    # only thread of the executor stops as soon as it starts
+    async def cancelled(executor, budget):
+        blocker = threading.Event()
+        executor.submit(blocker.wait)
+        task = asyncio.ensure_future(complex_parser.parse_async(
+            complex_sentence, cancel=budget, executor=executor))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        blocker.set()
+
+    budget = Budget()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        asyncio.run(cancelled(executor, budget))
+    assert budget.is_set()
+
+
+def test_parse_stream():
+    import asyncio
+    sentences = [complex_sentence, 'the the', 'i play', 'zzz'] * 3
+
+    async def produce():
+        for sentence in sentences:
+            await asyncio.sleep(0)
+            yield sentence
+
+    async def run(source, **options):
+        return [item async for item in complex_parser.parse_stream(
+            source, **options)]
+
+    results = asyncio.run(run(produce(), concurrency=2))
+    assert [sentence for sentence, _ in results] == sentences
+    assert results[0][1] == complex_parse
+    assert results[2][1] == complex_parser.parse('i play')
+    assert isinstance(results[1][1], ValueError)
+    assert isinstance(results[3][1], KeyError)
+    results = asyncio.run(run(sentences, ordered=False, concurrency=3))
+    assert sorted(map(str, results)) == sorted(
+        map(str, asyncio.run(run(sentences))))
+    results = asyncio.run(run([complex_sentence], steps=5))
+    assert isinstance(results[0][1], ParseCancelled)
+    with pytest.raises(ValueError):
+        asyncio.run(run(sentences, concurrency=0))
+
+
+###############
+# CONSTRAINTS #
+###############
+
+
+def test_constraints_const():
+    constraints = Constraints(required=[(1, 3, 'vp')], brackets=[(3, 5)])
+    assert constraints.required == {(1, 3)}
+    assert constraints.labels == {(1, 3): {'VP'}}
+    assert constraints.brackets == {(1, 3), (3, 5)}
+    with pytest.raises(ValueError):
+        Constraints(required=[(2, 2)])
+    with pytest.raises(ValueError):
+        Constraints(required=[(0, 2)], brackets=[(1, 3)])
+    with pytest.raises(ValueError):
+        complex_parser.parse(complex_sentence, constraints=Constraints(
+            brackets=[(5, 8)]))
+
+
+def test_constrained_parse():
+    sentence = 'i can play the guitar'
+    # can play | the guitar
+    first = '[.S [.NP [.PN I]][.VP [.VP [.AUX CAN][.VP [.V PLAY]]]' \
+        '[.NP [.DT THE][.N GUITAR]]]]'
+    # can | play the guitar
+    second = '[.S [.NP [.PN I]][.VP [.AUX CAN][.VP [.VP [.V PLAY]]' \
+        '[.NP [.DT THE][.N GUITAR]]]]]'
+    assert complex_parser.count_parses(sentence) == 2
+    constraints = Constraints(required=[(2, 5)])
+    assert complex_parser.parse(sentence, constraints=constraints) == second
+    assert complex_parser.count_parses(sentence, constraints=constraints) == 1
+    constraints = Constraints(brackets=[(2, 5)])
+    assert [parse for parse, _ in complex_parser.parse_kbest(
+        sentence, constraints=constraints)] == [second]
+    constraints = Constraints(required=[(1, 3, 'VP')])
+    assert complex_parser.parse(sentence, constraints=constraints) == first
+    constraints = Constraints(required=[(1, 3, 'NP')])
+    assert complex_parser.count_parses(sentence, constraints=constraints) == 0
+    with pytest.raises(ValueError):
+        complex_parser.parse(sentence, constraints=constraints)
+    # a span inside a ternary rule is not a constituent of it
+    parser = Parser(Grammar.from_rules([
+        'S --> NP VP', 'NP --> PN', 'VP --> V NP NP', 'VP --> V NP']),
+        complex_lexicon)
+    assert parser.parse('i play i i') == \
+        '[.S [.NP [.PN I]][.VP [.V PLAY][.NP [.PN I]][.NP [.PN I]]]]'
+    with pytest.raises(ValueError):
+        parser.parse('i play i i', constraints=Constraints(required=[(1, 3)]))
+
+
+def test_constrained_closure():
+    parser = Parser(complex_grammar, complex_lexicon, closure=True)
+    constraints = Constraints(required=[(2, 5, 'VP')])
+    assert parser.parse('i can play the guitar', constraints=constraints) == \
+        complex_parser.parse('i can play the guitar', constraints=constraints)
@@ -0,0 +1,49 @@
+"""
+Kathryn Egan
+
+Tests the parse server and client over a local TCP connection.
+"""
+import asyncio
+from chartparser.server import ParseServer, ParseClient
+from chartparser.tests.test_parser import (
+    complex_grammar, complex_lexicon, complex_sentence, complex_parse)
+
+
+def test_server(tmp_path):
+    grammar = tmp_path / 'grammar.txt'
+    grammar.write_text(str(complex_grammar))
+    lexicon = tmp_path / 'lexicon.txt'
+    lexicon.write_text(str(complex_lexicon))
+    server = ParseServer(
+        str(grammar), str(lexicon), workers=1, concurrency=2)
+
+    async def run():
+        listener = await server.start(port=0)
+        port = listener.sockets[0].getsockname()[1]
+        try:
+            client = await ParseClient.connect(port=port)
+            responses = await asyncio.gather(
+                client.parse(complex_sentence),
+                client.parse('boy the'),
+                client.parse('i snore'),
+                client.parse(complex_sentence))
+            await client.close()
+            reader, writer = await asyncio.open_connection(
+                '127.0.0.1', port)
+            writer.write(b'not json\n{"id": 3}\n')
+            await writer.drain()
+            bad = [await reader.readline(), await reader.readline()]
+            writer.close()
+        finally:
+            await server.close()
+        return responses, bad
+
+    responses, bad = asyncio.run(run())
+    assert responses == [
+        {'parse': complex_parse},
+        {'error': 'no parse'},
+        {'error': 'unknown words or punctuation'},
+        {'parse': complex_parse}]
+    assert sorted(bad) == [
+        b'{"id": 3, "error": "bad request"}\n',
+        b'{"id": null, "error": "bad request"}\n']
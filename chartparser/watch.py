@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+
+"""
+Kathryn Egan
+
+The Watcher keeps a grammar or lexicon in sync with the file it was loaded
+from. The file is only read when its modification time or size changes and
+is only reloaded when its contents hash differently. Reloading applies the
+difference between the old and new rules as a single update of the language,
+so parses already running keep the version they started with.
+"""
+import hashlib
+import os
+import threading
+from io import StringIO
+
+
+class Watcher:
+
+    def __init__(self, language, path, interval=1.0):
+        """ Initializes watcher for given language and file. Nothing is
+        read until the watcher is polled or started.
+        Args:
+            language (Language) : grammar or lexicon to keep in sync
+            path (str) : path to grammar or lexicon file
+            interval (float) : seconds between checks of the file
+        """
+        self.language = language
+        self.path = path
+        self.interval = interval
+        self.error = None
+        self._stamp = None
+        self._digest = None
+        self._rules = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def poll(self):
+        """ Checks the file once and updates the language if the file
+        has changed. Raises ValueError if the changed file cannot be read,
+        in which case the language keeps its current rules.
+        Returns:
+            bool : True if the language was updated, False otherwise
+        """
+        stat = os.stat(self.path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp == self._stamp:
+            return False
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        # a file is not re-read until it changes again, even if invalid
+        self._stamp = stamp
+        digest = hashlib.sha1(data).hexdigest()
+        if digest == self._digest:
+            return False
+        rules = set(self.language.read(StringIO(data.decode('utf-8'))))
+        if self._rules is None:
+            self.language._replace(rules)
+        else:
+            self.language.update(
+                added=rules - self._rules, removed=self._rules - rules)
+        self._digest = digest
+        self._rules = rules
+        return True
+
+    def start(self):
+        """ Starts polling the file on a background thread. Errors from
+        reading the file are kept in the error attribute. """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """ Stops polling the file and waits for the thread to finish. """
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        """ Polls the file every interval until stopped. """
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except (OSError, ValueError) as e:
+                self.error = e
+            else:
+                self.error = None
@@ -1,6 +1,39 @@
 #!usr/bin/env python
 
+import sys
 from setuptools import setup
+from setuptools.command.build_ext import build_ext
+from setuptools.errors import CCompilerError, ExecError, PlatformError
+
+try:
+    # the compiled core is optional, the parser runs without it
+    from Cython.Build import cythonize
+    ext_modules = cythonize('chartparser/_speedups.pyx')
+except ImportError:
+    ext_modules = []
+
+
+class optional_build_ext(build_ext):
+    """ Builds the compiled core where a C compiler is available and
+    otherwise installs the parser without it. """
+
+    def run(self):
+        try:
+            build_ext.run(self)
+        except PlatformError as e:
+            self._skip(e)
+
+    def build_extension(self, ext):
+        try:
+            build_ext.build_extension(self, ext)
+        except (CCompilerError, ExecError, PlatformError) as e:
+            self._skip(e)
+
+    @staticmethod
+    def _skip(error):
+        sys.stderr.write(
+            'warning: not building the compiled core, backend=\'native\' '
+            'is unavailable: {}\n'.format(error))
 
 
 setup(
@@ -8,12 +41,15 @@ setup(
     version='0.2.0',
     author='Kathryn Egan',
     packages=['chartparser'],
-    scripts=['bin/run.py'],
+    ext_modules=ext_modules,
+    cmdclass={'build_ext': optional_build_ext},
+    scripts=['bin/run.py', 'bin/loadtest.py', 'bin/benchmark.py'],
     package_data={'chartparser': [
         'data/sample_grammar.txt',
         'data/sample_lexicon.txt']},
     description='Chart parser with GUI',
     long_description=open('README.md').read(),
     install_requires=['pytest'],
+    extras_require={'numpy': ['numpy']},
     license='LICENSE.txt',
 )